@@ -0,0 +1,356 @@
+import argparse
+import hashlib
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# -------------------------
+# Журнал ответов
+# -------------------------
+# Каждый ответ игрока — запись фиксированной длины (RECORD) в конце
+# файла-журнала: время, игрок, категория, вопрос, выбранный вариант,
+# верно ли, сколько думал. Бот копит записи в памяти и дописывает их пачкой
+# по таймеру (как очки в storage.py), журнал только растёт.
+#
+# Файл начинается с заголовка (HEADER): magic, версия формата и длина
+# записи. В журнал без него или с другой версией AnswerLog не дописывает:
+# записи другой длины сдвинули бы все последующие. Такой файл надо
+# переименовать — бот начнёт новый.
+#
+# Категория и вопрос пишутся ключами — хешами названия категории и текста
+# вопроса (как в rating.py), а не позиционными id банка: id сдвигаются при
+# правке паков, и старые записи стали бы относиться к чужим вопросам.
+#
+# Агрегация читает журнал кусками по CHUNK_EVENTS записей, так что память
+# не зависит от его размера, и считает точность по вопросам и статистику
+# по категориям. С NumPy куски разбираются векторно (np.memmap + unique + bincount),
+# без него — struct.iter_unpack, медленнее, но с тем же результатом.
+#
+#   python analytics.py answers.log [answers.log.1 ...] [--top 10]
+
+# время (unix, с), user_id, ключ категории, ключ вопроса, вариант, верно, задержка (мс)
+RECORD = struct.Struct("<IqIQBBI")
+# Версия 2: ключи категории и вопроса вместо id банка, запись 30 байт вместо 24
+MAGIC = b"QLOG"
+VERSION = 2
+# magic, версия, длина записи
+HEADER = struct.Struct("<4sHH")
+# Вариант, которого нет среди кнопок (ответ набран вручную)
+NO_OPTION = 255
+CHUNK_EVENTS = 1 << 20
+# Границы корзин задержки ответа (мс) для медианы по категориям
+LATENCY_EDGES_MS = (
+    500, 1000, 1500, 2000, 3000, 4000, 5000, 7500, 10000,
+    15000, 20000, 30000, 60000, 120000, 300000,
+)
+
+
+# -------------------------
+# Ключи
+# -------------------------
+@lru_cache(maxsize=256)
+def category_key(title):
+    """Ключ категории: CRC32 названия."""
+    return zlib.crc32(title.encode("utf-8"))
+
+
+@lru_cache(maxsize=16384)
+def question_key(category_title, text):
+    """Ключ вопроса: 64 бита BLAKE2b от названия категории и текста вопроса."""
+    digest = hashlib.blake2b(f"{category_title}\n{text}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def read_header(path):
+    """Проверить заголовок журнала path; ValueError — это не журнал ответов текущего формата."""
+    with open(path, "rb") as f:
+        head = f.read(HEADER.size)
+    if len(head) < HEADER.size:
+        raise ValueError(f"{path}: нет заголовка журнала ответов")
+    magic, version, record_size = HEADER.unpack(head)
+    if magic != MAGIC:
+        raise ValueError(f"{path}: не журнал ответов (или журнал старого формата без заголовка)")
+    if version != VERSION or record_size != RECORD.size:
+        raise ValueError(f"{path}: журнал ответов версии {version}, а нужна {VERSION}")
+
+
+# -------------------------
+# Запись
+# -------------------------
+class AnswerLog:
+    """
+    Буферизованный журнал ответов (только дозапись).
+
+    record() вызывается из обработчиков и лишь упаковывает запись в буфер;
+    flush() дописывает накопленное в файл одним write и вызывается
+    из отдельного потока (asyncio.to_thread). Новый файл начинается
+    с заголовка; в существующий без подходящего заголовка не дописывает
+    (ValueError).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._buffer = bytearray()
+        if os.path.exists(path) and os.path.getsize(path):
+            read_header(path)
+        self._file = open(path, "ab")
+        if not self._file.tell():
+            self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+            self._file.flush()
+
+    def record(self, user_id, category_title, question_text, option, correct, latency):
+        """Записать ответ; option=None — ответ не совпал ни с одной кнопкой, latency — в секундах."""
+        packed = RECORD.pack(
+            int(time.time()),
+            user_id,
+            category_key(category_title),
+            question_key(category_title, question_text),
+            option if option is not None and 0 <= option < NO_OPTION else NO_OPTION,
+            correct,
+            min(int(latency * 1000), 0xFFFFFFFF) if latency > 0 else 0,
+        )
+        with self._lock:
+            self._buffer += packed
+
+    def pending(self):
+        """Сколько записей ждут сброса."""
+        with self._lock:
+            return len(self._buffer) // RECORD.size
+
+    def flush(self):
+        """Дописать буфер в файл. Возвращает число записей."""
+        with self._lock:
+            data, self._buffer = self._buffer, bytearray()
+        if not data:
+            return 0
+        self._file.write(data)
+        self._file.flush()
+        return len(data) // RECORD.size
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+# -------------------------
+# Агрегация
+# -------------------------
+class Totals:
+    """Итоги по журналу: словари по ключу вопроса и ключу категории."""
+
+    def __init__(self):
+        self.events = 0
+        self.question_answers = {}
+        self.question_correct = {}
+        self.question_latency_ms = {}
+        self.category_answers = {}
+        self.category_correct = {}
+        # {категория: [корзина LATENCY_EDGES_MS (+ последняя — больше всех)]}
+        self.category_latency_hist = {}
+
+    def add(self, questions, categories):
+        """
+        Прибавить итоги куска: questions = (ключи, ответы, верные, сумма задержек)
+        и categories = (ключи, ответы, верные, гистограммы) — последовательности
+        одной длины, i-й элемент относится к i-му ключу.
+        """
+        keys, answers, correct, latency = questions
+        for i, key in enumerate(keys):
+            key = int(key)
+            self.question_answers[key] = self.question_answers.get(key, 0) + int(answers[i])
+            self.question_correct[key] = self.question_correct.get(key, 0) + int(correct[i])
+            self.question_latency_ms[key] = self.question_latency_ms.get(key, 0) + int(latency[i])
+            self.events += int(answers[i])
+
+        keys, answers, correct, hists = categories
+        for i, key in enumerate(keys):
+            key = int(key)
+            self.category_answers[key] = self.category_answers.get(key, 0) + int(answers[i])
+            self.category_correct[key] = self.category_correct.get(key, 0) + int(correct[i])
+            hist = self.category_latency_hist.setdefault(key, [0] * (len(LATENCY_EDGES_MS) + 1))
+            for bucket, count in enumerate(hists[i]):
+                hist[bucket] += int(count)
+
+
+def _event_count(path):
+    read_header(path)
+    return (os.path.getsize(path) - HEADER.size) // RECORD.size
+
+
+def aggregate_numpy(paths, chunk_events=CHUNK_EVENTS):
+    import numpy as np
+
+    dtype = np.dtype([
+        ("time", "<u4"), ("user", "<i8"), ("category", "<u4"), ("question", "<u8"),
+        ("option", "u1"), ("correct", "u1"), ("latency_ms", "<u4"),
+    ])
+    assert dtype.itemsize == RECORD.size
+    edges = np.array(LATENCY_EDGES_MS, dtype=np.uint32)
+    buckets = len(edges) + 1
+    totals = Totals()
+    for path in paths:
+        count = _event_count(path)
+        if not count:
+            continue
+        # Недописанный хвост (если бот пишет прямо сейчас) отбрасывается
+        events = np.memmap(path, dtype=dtype, mode="r", offset=HEADER.size, shape=(count,))
+        for start in range(0, count, chunk_events):
+            chunk = events[start:start + chunk_events]
+            # Ключи — хеши: сначала сжимаем их в плотные номера, потом bincount
+            question_keys, question = np.unique(chunk["question"], return_inverse=True)
+            category_keys, category = np.unique(chunk["category"], return_inverse=True)
+            correct = chunk["correct"].astype(np.float64)
+            latency = chunk["latency_ms"]
+            bucket = np.searchsorted(edges, latency, side="right")
+            n_categories = len(category_keys)
+            totals.add(
+                (
+                    question_keys,
+                    np.bincount(question),
+                    np.bincount(question, weights=correct),
+                    np.bincount(question, weights=latency.astype(np.float64)),
+                ),
+                (
+                    category_keys,
+                    np.bincount(category),
+                    np.bincount(category, weights=correct),
+                    np.bincount(category * buckets + bucket, minlength=n_categories * buckets)
+                    .reshape(n_categories, buckets),
+                ),
+            )
+        del events
+    return totals
+
+
+def aggregate_python(paths, chunk_events=CHUNK_EVENTS):
+    import bisect
+
+    totals = Totals()
+    for path in paths:
+        count = _event_count(path)
+        with open(path, "rb") as f:
+            f.seek(HEADER.size)
+            while count:
+                size = min(count, chunk_events)
+                count -= size
+                data = f.read(size * RECORD.size)
+                q_answers, q_correct, q_latency = {}, {}, {}
+                c_answers, c_correct, c_hist = {}, {}, {}
+                for _, _, category, question, _, correct, latency in RECORD.iter_unpack(data):
+                    q_answers[question] = q_answers.get(question, 0) + 1
+                    q_correct[question] = q_correct.get(question, 0) + correct
+                    q_latency[question] = q_latency.get(question, 0) + latency
+                    c_answers[category] = c_answers.get(category, 0) + 1
+                    c_correct[category] = c_correct.get(category, 0) + correct
+                    hist = c_hist.get(category)
+                    if hist is None:
+                        hist = c_hist[category] = [0] * (len(LATENCY_EDGES_MS) + 1)
+                    hist[bisect.bisect_right(LATENCY_EDGES_MS, latency)] += 1
+
+                questions, categories = list(q_answers), list(c_answers)
+                totals.add(
+                    (
+                        questions,
+                        [q_answers[key] for key in questions],
+                        [q_correct[key] for key in questions],
+                        [q_latency[key] for key in questions],
+                    ),
+                    (
+                        categories,
+                        [c_answers[key] for key in categories],
+                        [c_correct[key] for key in categories],
+                        [c_hist[key] for key in categories],
+                    ),
+                )
+    return totals
+
+
+def aggregate(paths, chunk_events=CHUNK_EVENTS):
+    """Итоги по журналам: векторно, если есть NumPy, иначе построчно."""
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        logger.warning("NumPy не установлен — агрегируем без него (медленнее)")
+        return aggregate_python(paths, chunk_events)
+    return aggregate_numpy(paths, chunk_events)
+
+
+def median_from_hist(hist):
+    """Верхняя граница корзины, в которую попадает медиана (мс); None — нет данных."""
+    total = sum(hist)
+    if not total:
+        return None
+    seen = 0
+    for bucket, count in enumerate(hist):
+        seen += count
+        if seen * 2 >= total:
+            return LATENCY_EDGES_MS[bucket] if bucket < len(LATENCY_EDGES_MS) else float("inf")
+
+
+# -------------------------
+# Отчёт
+# -------------------------
+def report(totals, bank=None, top=10, min_answers=20):
+    """Текст отчёта; bank (QuestionBank) нужен для названий категорий и текстов вопросов."""
+    titles, texts = {}, {}
+    if bank:
+        for category in bank.categories.values():
+            titles[category_key(category.title)] = category.title
+            for question in category.questions:
+                texts[question_key(category.title, question.text)] = question.text
+
+    lines = [f"Ответов: {totals.events}", "", "Категории:"]
+    # Сначала известные банку категории по названию, потом неизвестные по ключу
+    for key in sorted(totals.category_answers, key=lambda key: (key not in titles, titles.get(key, ""), key)):
+        answers = totals.category_answers[key]
+        median = median_from_hist(totals.category_latency_hist[key])
+        median = "более 5 мин" if median == float("inf") else f"≤ {median / 1000:g} с"
+        lines.append(
+            f"  {titles.get(key, f'#{key:08x}')}: {answers} ответов, "
+            f"верно {totals.category_correct[key] / answers:.1%}, медиана времени {median}"
+        )
+
+    rated = [
+        (totals.question_correct[key] / answers, answers, key)
+        for key, answers in totals.question_answers.items()
+        if answers >= min_answers
+    ]
+    rated.sort()
+    for header, chosen in (("Самые трудные вопросы:", rated[:top]), ("Самые лёгкие вопросы:", rated[::-1][:top])):
+        lines += ["", header]
+        for accuracy, answers, key in chosen:
+            latency = totals.question_latency_ms[key] / answers / 1000
+            text = texts.get(key, f"вопрос #{key:016x}")
+            lines.append(f"  {accuracy:6.1%} из {answers}, в среднем {latency:.1f} с — {text}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Статистика по журналу ответов викторины")
+    parser.add_argument("paths", nargs="+", help="файлы журнала (у каждого воркера свой)")
+    parser.add_argument("--packs", default=os.environ.get(
+        "QUESTION_PACKS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "packs")
+    ), help="каталог паков — для названий категорий и текстов вопросов")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--min-answers", type=int, default=20, help="не оценивать вопросы с меньшим числом ответов")
+    args = parser.parse_args()
+
+    from question_bank import QuestionBank
+
+    bank = QuestionBank.load(args.packs) if os.path.isdir(args.packs) else None
+    try:
+        totals = aggregate(args.paths)
+    except ValueError as exc:
+        parser.error(str(exc))
+    print(report(totals, bank, args.top, args.min_answers))
+
+
+if __name__ == "__main__":
+    main()
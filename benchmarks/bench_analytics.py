@@ -0,0 +1,117 @@
+"""
+Журнал ответов: цена записи в обработчике и скорость агрегации.
+
+1. AnswerLog.record — сколько добавляет к обработке ответа.
+2. Журнал из EVENTS записей (кусок из BASE записей, размноженный
+   копированием) агрегируется по кускам: с NumPy и без — и итоги
+   сравниваются на первых PYTHON_EVENTS записях. Пиковая память считается
+   отдельным прогоном через tracemalloc: отображённый файл (memmap) в неё
+   не входит, что и нужно — в памяти процесса держится только текущий кусок.
+
+    python benchmarks/bench_analytics.py [--events 100000000] [--python-events 2000000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import analytics  # noqa: E402
+from analytics import HEADER, RECORD, AnswerLog, aggregate_numpy, aggregate_python, report  # noqa: E402
+
+BASE = 1_000_000
+
+
+def write_base(path, rng):
+    """BASE записей через AnswerLog.record; возвращает время одной записи (с)."""
+    log = AnswerLog(path)
+    # 20 категорий по 500 вопросов; у каждого вопроса своя «трудность»
+    difficulty = [rng.random() for _ in range(10_000)]
+    titles = [f"Категория {i}" for i in range(20)]
+    texts = [f"Вопрос {i}: кто выиграл чемпионат мира по волейболу?" for i in range(10_000)]
+    events = []
+    for _ in range(BASE):
+        question = rng.randrange(10_000)
+        option = rng.randrange(4)
+        events.append((rng.randrange(1, 10**6), titles[question // 500], texts[question], option,
+                       rng.random() > difficulty[question], rng.expovariate(1 / 6)))
+    start = time.perf_counter()
+    for event in events:
+        log.record(*event)
+    elapsed = time.perf_counter() - start
+    log.close()
+    return elapsed / BASE
+
+
+def grow(path, events):
+    with open(path, "rb") as f:
+        base = f.read()
+    with open(path, "ab") as f:
+        written = BASE
+        while written < events:
+            part = min(BASE, events - written)
+            f.write(base[HEADER.size:HEADER.size + part * RECORD.size])
+            written += part
+
+
+def measure(function, paths, chunk):
+    start = time.perf_counter()
+    totals = function(paths, chunk)
+    elapsed = time.perf_counter() - start
+    # Память — отдельным прогоном: под tracemalloc всё заметно медленнее
+    tracemalloc.start()
+    function(paths, chunk)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return totals, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=100_000_000)
+    parser.add_argument("--python-events", type=int, default=2_000_000)
+    parser.add_argument("--chunk", type=int, default=analytics.CHUNK_EVENTS)
+    args = parser.parse_args()
+
+    try:
+        import numpy  # noqa: F401
+        have_numpy = True
+    except ImportError:
+        have_numpy = False
+        print("NumPy не установлен — только построчная агрегация")
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "answers.log")
+        per_record = write_base(path, rng)
+        print(f"AnswerLog.record: {per_record * 1e6:.2f} мкс на ответ")
+
+        small = os.path.join(tmp, "small.log")
+        with open(path, "rb") as src, open(small, "wb") as dst:
+            dst.write(src.read(HEADER.size + min(args.python_events, BASE) * RECORD.size))
+        grow(small, args.python_events)
+        python_totals, elapsed, peak = measure(aggregate_python, [small], args.chunk)
+        print(f"без NumPy: {args.python_events} записей за {elapsed:.1f} с "
+              f"({args.python_events / elapsed / 1e6:.2f} млн/с), пик памяти {peak / 2**20:.0f} МБ")
+        if not have_numpy:
+            return
+
+        numpy_totals, elapsed, peak = measure(aggregate_numpy, [small], args.chunk)
+        same = report(numpy_totals, top=50) == report(python_totals, top=50)
+        print(f"с NumPy:   {args.python_events} записей за {elapsed:.2f} с, итоги совпадают: {'да' if same else 'НЕТ'}")
+        os.remove(small)
+
+        grow(path, args.events)
+        size = os.path.getsize(path)
+        numpy_totals, elapsed, peak = measure(aggregate_numpy, [path], args.chunk)
+        print(f"с NumPy:   {args.events} записей ({size / 2**30:.1f} ГБ) за {elapsed:.1f} с "
+              f"({args.events / elapsed / 1e6:.1f} млн/с), пик памяти {peak / 2**20:.0f} МБ")
+        assert numpy_totals.events == args.events
+
+
+if __name__ == "__main__":
+    main()
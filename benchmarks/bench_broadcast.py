@@ -0,0 +1,142 @@
+"""
+Рассылка вопроса дня (broadcast.py) по RECIPIENTS синтетическим игрокам
+через фейковый Bot API.
+
+1. Рассылка прерывается (отмена задачи, как при остановке бота) после
+   INTERRUPT_AT доли получателей и запускается заново с тем же именем —
+   продолжается с контрольной точки. Проверяется, что сообщение получил
+   каждый не заблокировавший бота игрок и сколько получили его дважды
+   (не больше страницы, прерванной посередине).
+2. Часть игроков (BLOCKED_SHARE) заблокировала бота — 403 отмечает их
+   в blocked_users; каждый FLOOD_EVERY-й sendMessage отвечает 429.
+3. Следующая рассылка не пишет заблокировавшим. Пиковая память
+   рассылки (tracemalloc, на первых 50 страницах) сравнивается с размером
+   списка всех получателей.
+
+Темп не ограничен (rate огромный) — меряется цена самого движка; при
+настоящем лимите Telegram в 30 сообщений/с миллион получателей — это
+около 9 часов.
+
+    python benchmarks/bench_broadcast.py [--recipients 1000000] [--concurrency 64]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from broadcast import Broadcast  # noqa: E402
+from fakebot import FakeRequest  # noqa: E402
+from storage import SQLiteScoreStore  # noqa: E402
+from telegram import Bot  # noqa: E402
+
+# user_id одной длины: порядок строк совпадает с порядком чисел
+FIRST_ID = 1_000_000_000
+
+
+async def broadcast(store, request, name, args, interrupt_after=None):
+    async with Bot("1:fake", request=request) as bot:
+        engine = Broadcast(bot, store, name, "Вопрос дня:\n...", rate=10**9,
+                           concurrency=args.concurrency, chunk_size=args.chunk)
+        task = asyncio.create_task(engine.run())
+        if interrupt_after is not None:
+            while not task.done() and not interrupt_after():
+                await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            return engine.stats()
+        return await task
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipients", type=int, default=1_000_000)
+    parser.add_argument("--blocked-share", type=float, default=0.02)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--chunk", type=int, default=1000)
+    parser.add_argument("--interrupt-at", type=float, default=0.4)
+    parser.add_argument("--flood-every", type=int, default=200_000)
+    args = parser.parse_args()
+    total = args.recipients
+    every = round(1 / args.blocked_share) if args.blocked_share else 0
+
+    def is_blocked(chat_id):
+        return bool(every) and chat_id % every == 0
+
+    blocked_total = sum(is_blocked(FIRST_ID + i) for i in range(total))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteScoreStore(os.path.join(tmp, "scores.db"))
+        start = time.perf_counter()
+        for i in range(total):
+            store.set_username(str(FIRST_ID + i), f"Игрок {i}")
+        store.flush()
+        print(f"игроков: {total} (записаны за {time.perf_counter() - start:.1f} с), "
+              f"заблокировали бота: {blocked_total}")
+
+        deliveries = bytearray(total)
+        delivered = 0
+        forbidden = 0
+
+        def on_send(chat_id):
+            nonlocal delivered
+            delivered += 1
+            deliveries[chat_id - FIRST_ID] = min(255, deliveries[chat_id - FIRST_ID] + 1)
+
+        def blocked(chat_id):
+            nonlocal forbidden
+            if is_blocked(chat_id):
+                forbidden += 1
+                return True
+            return False
+
+        request = FakeRequest(record=False, flood_every=args.flood_every, blocked=blocked, on_send=on_send)
+
+        start = time.perf_counter()
+        asyncio.run(broadcast(store, request, "daily:1", args,
+                              interrupt_after=lambda: delivered >= args.interrupt_at * total))
+        first = time.perf_counter() - start
+        checkpoint = store.load_broadcast("daily:1") or {"last_user_id": "нет", "sent": 0}
+        print(f"прервана после {delivered} сообщений за {first:.1f} с; "
+              f"контрольная точка: {checkpoint['last_user_id']}, отправлено {checkpoint['sent']}")
+
+        start = time.perf_counter()
+        stats = asyncio.run(broadcast(store, request, "daily:1", args))
+        second = time.perf_counter() - start
+        elapsed = first + second
+        missing = sum(1 for i in range(total) if not deliveries[i] and not is_blocked(FIRST_ID + i))
+        twice = sum(1 for count in deliveries if count > 1)
+        print(f"продолжена и завершена за {second:.1f} с: {stats}")
+        print(f"всего {elapsed:.1f} с ({total / elapsed:,.0f} получателей/с); не получили: {missing}, "
+              f"получили дважды: {twice} (страница — {args.chunk}); 429: {request.flooded}")
+        assert missing == 0
+        assert twice <= args.chunk
+
+        forbidden = 0
+        start = time.perf_counter()
+        stats = asyncio.run(broadcast(store, request, "daily:2", args))
+        elapsed = time.perf_counter() - start
+        print(f"следующая рассылка: {stats}, 403: {forbidden}, {elapsed:.1f} с")
+        assert forbidden == 0 and stats["sent"] == total - blocked_total
+
+        # Память выходит на плато с первых страниц, а под tracemalloc всё
+        # заметно медленнее — поэтому только начало ещё одной рассылки
+        delivered = 0
+        tracemalloc.start()
+        asyncio.run(broadcast(store, request, "daily:3", args,
+                              interrupt_after=lambda: delivered >= min(total, 50 * args.chunk)))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        # Для сравнения — если бы получателей собирали списком целиком
+        everyone = store.recipients_after("", total + 1)
+        listed = sys.getsizeof(everyone) + sum(sys.getsizeof(user_id) for user_id in everyone)
+        store.close()
+    print(f"пик памяти рассылки {peak / 2**20:.1f} МБ (список всех получателей — {listed / 2**20:.0f} МБ)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Холодный старт: время от запуска процесса `python bot.py` до ответа
+на первый апдейт (time-to-first-update).
+
+Бенчмарк заполняет хранилище очков (PLAYERS игроков) и состояние бота
+(SESSIONS сессий посреди викторины, со снимком разговоров — как после
+штатной остановки), поднимает фейковый Bot API по HTTP (ответы как
+у FakeRequest) и RUNS раз запускает bot.py как есть, в polling-режиме
+с BOT_API_URL на фейк. Каждый прогон — на свежей копии файлов. Первый
+getUpdates отдаёт /start нового игрока; время до первого sendMessage —
+и есть метрика. Потом боту отправляется SIGTERM.
+
+Выводятся медиана и разброс, фазы запуска из лога бота (startup.py)
+и самые дорогие импорты из отдельного прогона с -X importtime (под ним
+импорты заметно медленнее, поэтому в медиану он не входит).
+С --max-ms бенчмарк завершается с кодом 1, если медиана больше, —
+для отслеживания регрессий.
+
+    python benchmarks/bench_cold_start.py [--players 100000] [--sessions 50000] [--runs 5] [--max-ms 0]
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import shutil
+import signal
+import statistics
+import sys
+import tempfile
+import types
+import urllib.parse
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import bot  # noqa: E402
+from fakebot import FakeRequest, text_update  # noqa: E402
+from persistence import SQLitePersistence  # noqa: E402
+from storage import SQLiteScoreStore  # noqa: E402
+from webhook import HTTPServer  # noqa: E402
+
+TOKEN = "1:fake"
+API_METHODS = (
+    "getMe", "deleteWebhook", "getUpdates", "sendMessage", "editMessageText",
+    "answerCallbackQuery", "setWebhook",
+)
+NEW_PLAYER = 2_000_000_000
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)$")
+
+
+def fill(tmp, players, sessions):
+    store = SQLiteScoreStore(os.path.join(tmp, "scores.db"))
+    for i in range(players):
+        store.set_username(str(i + 1), f"Игрок {i}")
+        store.add_score(str(i + 1), i % 100)
+    store.flush()
+    store.close()
+
+    category = next(iter(bot.question_bank.categories.values()))
+    persistence = SQLitePersistence(os.path.join(tmp, "state.db"))
+    users, conversations = {}, {}
+    for user_id in range(1, sessions + 1):
+        users[user_id] = {
+            "username": f"Игрок {user_id}",
+            "category": category.id,
+            "order": bot.question_bank.new_order(category),
+            "current_question_index": 3,
+            "score_this_round": 1,
+        }
+        conversations[("quiz", f"[{user_id}, {user_id}]")] = bot.ASK_QUESTION
+    persistence._write_batch(users, {}, {}, conversations)
+    persistence._conversation_names.add("quiz")
+    persistence.save_snapshots()
+    persistence._conn.close()
+
+
+class FakeBotAPI:
+    """Bot API по HTTP: первый getUpdates отдаёт /start, остальное отвечает FakeRequest."""
+
+    def __init__(self):
+        self.request = FakeRequest(record=False)
+        self.server = HTTPServer({f"/bot{TOKEN}/{method}": self._route(method) for method in API_METHODS})
+        self.answered = None
+        self._updates = []
+
+    def expect_first_update(self):
+        self.answered = asyncio.Event()
+        self._updates = [text_update(NEW_PLAYER, "/start")]
+
+    def _route(self, method):
+        async def handle(http_method, headers, body):
+            if headers.get("content-type", "").startswith("application/json"):
+                params = json.loads(body or b"{}")
+            else:
+                params = {key: values[-1] for key, values in urllib.parse.parse_qs(body.decode()).items()}
+            if method == "getUpdates":
+                if self._updates:
+                    result = [self._updates.pop()]
+                else:
+                    # Вместо long polling — короткая пауза
+                    await asyncio.sleep(0.05)
+                    result = []
+                return 200, "application/json", json.dumps({"ok": True, "result": result}).encode()
+            _, payload = await self.request.do_request(method, "POST", types.SimpleNamespace(parameters=params))
+            if method == "sendMessage" and self.answered is not None:
+                self.answered.set()
+            return 200, "application/json", payload
+
+        return handle
+
+
+async def start_bot(api, port, run_dir, importtime=False):
+    """Запустить bot.py, дождаться ответа на /start. Возвращает (секунды, stderr)."""
+    env = {key: value for key, value in os.environ.items() if key != "DATABASE_URL"}
+    env.update(
+        BOT_TOKEN=TOKEN,
+        BOT_API_URL=f"http://127.0.0.1:{port}/bot",
+        BOT_MODE="polling",
+        WORKERS="1",
+        METRICS_PORT="0",
+        SCORES_DB=os.path.join(run_dir, "scores.db"),
+        BOT_STATE_DB=os.path.join(run_dir, "state.db"),
+        ANSWER_LOG=os.path.join(run_dir, "answers.log"),
+    )
+    flags = ["-X", "importtime"] if importtime else []
+    api.expect_first_update()
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, *flags, os.path.join(ROOT, "bot.py"),
+        cwd=run_dir, env=env, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+    )
+    stderr = asyncio.create_task(process.stderr.read())
+    waiter = asyncio.create_task(api.answered.wait())
+    await asyncio.wait([waiter, asyncio.create_task(process.wait())], return_when=asyncio.FIRST_COMPLETED)
+    elapsed = loop.time() - started
+    if not waiter.done():
+        output = (await stderr).decode()
+        raise RuntimeError(f"бот завершился, не ответив:\n{output[-3000:]}")
+    process.send_signal(signal.SIGTERM)
+    await process.wait()
+    return elapsed, (await stderr).decode()
+
+
+def top_imports(stderr, count=8):
+    """[(модуль, мс)] — самые дорогие импорты верхнего уровня и сумма по всем."""
+    imports = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match and len(match.group(3)) == 1:
+            imports.append((match.group(4), int(match.group(2)) / 1000))
+    imports.sort(key=lambda item: item[1], reverse=True)
+    return imports[:count], sum(ms for _, ms in imports)
+
+
+async def run(args, tmp):
+    api = FakeBotAPI()
+    port = await api.server.start("127.0.0.1", 0)
+    try:
+        timings, phases = [], None
+        for i in range(args.runs + 1):
+            importtime = i == args.runs
+            run_dir = os.path.join(tmp, f"run{i}")
+            os.makedirs(run_dir)
+            for name in ("scores.db", "state.db"):
+                shutil.copy(os.path.join(tmp, name), run_dir)
+            elapsed, stderr = await start_bot(api, port, run_dir, importtime)
+            if importtime:
+                imports, total = top_imports(stderr)
+                print(f"-X importtime: импорты {total:.0f} мс, первый апдейт через {elapsed * 1000:.0f} мс")
+                for name, ms in imports:
+                    print(f"    {name:<20} {ms:7.1f} мс")
+            else:
+                timings.append(elapsed)
+                found = re.search(r"Запуск: (.*)", stderr)
+                phases = found.group(1) if found else phases
+            shutil.rmtree(run_dir)
+    finally:
+        await api.server.stop()
+    return timings, phases
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=100_000)
+    parser.add_argument("--sessions", type=int, default=50_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=0, help="порог медианы; 0 — не проверять")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fill(tmp, args.players, args.sessions)
+        print(f"игроков: {args.players}, сессий: {args.sessions}, прогонов: {args.runs}")
+        timings, phases = asyncio.run(run(args, tmp))
+
+    median = statistics.median(timings)
+    print(f"фазы последнего прогона: {phases}")
+    print(f"time-to-first-update: медиана {median * 1000:.0f} мс "
+          f"(от {min(timings) * 1000:.0f} до {max(timings) * 1000:.0f} мс)")
+    if args.max_ms and median * 1000 > args.max_ms:
+        print(f"медиана больше порога {args.max_ms:.0f} мс")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Групповой раунд под нагрузкой.
+
+MEMBERS участников группы отвечают на каждый вопрос раунда (каждый жмёт
+кнопку дважды — второе нажатие должно отклоняться) через настоящие
+обработчики и фейковый Bot API. Меряется пропускная способность
+обработки нажатий и задержка одного нажатия; в конце проверяется, что
+очки начислены верно, а в хранилище ушло по одному изменению на игрока,
+а не на каждое нажатие.
+
+    python benchmarks/bench_group_round.py [--members 5000] [--questions 3]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import bot  # noqa: E402
+from fakebot import FakeRequest, callback_update, text_update  # noqa: E402
+from storage import SQLiteScoreStore  # noqa: E402
+from telegram import Update  # noqa: E402
+from webhook import running  # noqa: E402
+
+CHAT_ID = -100123
+
+
+def last_question(request):
+    """(message_id, [callback_data кнопок]) последнего вопроса с кнопками."""
+    message_id = request.counts.get("sendMessage", 0)
+    for method, params, _ in reversed(request.calls):
+        if method == "sendMessage" and "reply_markup" in params:
+            markup = params["reply_markup"]
+            markup = json.loads(markup) if isinstance(markup, str) else markup
+            return message_id, [row[0]["callback_data"] for row in markup["inline_keyboard"]]
+    raise RuntimeError("вопрос не отправлен")
+
+
+async def play(members, questions, seed):
+    rng = random.Random(seed)
+    # Меряем сами нажатия, без ограничения частоты
+    bot.throttle = None
+    request = FakeRequest()
+    application = bot.build_application("1:fake", request=request)
+    latencies = []
+    answered = 0
+    expected = {}
+    async with running(application):
+        await application.process_update(Update.de_json(text_update(1, "/round", chat_id=CHAT_ID), application.bot))
+        for _ in range(questions):
+            # Очередной вопрос отправляется из job, когда закрывается предыдущий
+            while len(bot.group_questions) != 1:
+                await asyncio.sleep(0.01)
+            message_id, buttons = last_question(request)
+            game = next(iter(bot.group_questions.values()))
+            correct = game.question.answer_index
+            for user_id in range(1000, 1000 + members):
+                data = rng.choice(buttons)
+                if data.endswith(f":{correct}"):
+                    expected[str(user_id)] = expected.get(str(user_id), 0) + 1
+                for _ in range(2):
+                    update = Update.de_json(callback_update(user_id, CHAT_ID, message_id, data), application.bot)
+                    start = time.perf_counter_ns()
+                    await application.process_update(update)
+                    latencies.append(time.perf_counter_ns() - start)
+                answered += 1
+            # Все ответили — закрываем вопрос, не дожидаясь таймера
+            for job in application.job_queue.get_jobs_by_name(f"group:{CHAT_ID}"):
+                job.schedule_removal()
+                await job.run(application)
+        pending = bot.score_store.pending()
+    return request, latencies, answered, expected, pending
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--members", type=int, default=5000)
+    parser.add_argument("--questions", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    bot.GROUP_ROUND_LENGTH = args.questions
+    # Таймер не сработает сам: вопрос закрывается, когда ответят все
+    bot.GROUP_ANSWER_SECONDS = 3600
+    # Буфер хранилища проверяется в конце — не сбрасываем его по дороге
+    bot.SCORE_FLUSH_INTERVAL = 3600
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.load_scores(SQLiteScoreStore(os.path.join(tmp, "scores.db")))
+        bot.ANSWER_LOG = os.path.join(tmp, "answers.log")
+        request, latencies, answered, expected, pending = asyncio.run(
+            play(args.members, args.questions, args.seed)
+        )
+
+    latencies.sort()
+    print(f"участников: {args.members}, вопросов: {args.questions}, нажатий: {len(latencies)}")
+    print(f"обработка нажатия: p50 {latencies[len(latencies) // 2] / 1000:.0f} мкс, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] / 1000:.0f} мкс, "
+          f"{len(latencies) / (sum(latencies) / 1e9):.0f} нажатий/с")
+    print(f"answerCallbackQuery: {request.counts.get('answerCallbackQuery', 0)}, "
+          f"сообщений в группу: {request.counts.get('sendMessage', 0)}")
+    print(f"игроков с изменением очков в буфере хранилища: {pending} (на {answered} ответов)")
+    wrong = [uid for uid, points in expected.items() if bot.scoreboard[uid]["score"] != points]
+    missing = sum(1 for uid in map(str, range(1000, 1000 + args.members))
+                  if uid not in expected and uid in bot.scoreboard)
+    if wrong or missing or pending != len(expected):
+        print(f"ОШИБКА: неверные очки у {len(wrong)} игроков, лишних записей {missing}")
+        sys.exit(1)
+    print("очки начислены верно")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Вызовы Bot API на одну викторину: ответы текстом против inline-кнопок.
+
+USERS игроков проходят викторину целиком (меню, имя, категория,
+все вопросы, возврат в меню) через настоящие обработчики и фейковый
+Bot API в трёх режимах:
+  - reply без очереди отправки — как было до outbound.Outbox;
+  - reply с очередью (вердикт склеивается со следующим вопросом);
+  - inline (QUIZ_KEYBOARD=inline): одно сообщение с кнопками, которое
+    редактируется на месте, плюс answerCallbackQuery на каждое нажатие.
+Печатается число вызовов каждого метода на одну викторину.
+
+    python benchmarks/bench_inline_quiz.py [--users 50]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import bot  # noqa: E402
+from fakebot import FakeRequest, callback_update, text_update  # noqa: E402
+from question_bank import QUIZ_LENGTH  # noqa: E402
+from storage import SQLiteScoreStore  # noqa: E402
+from telegram import Update  # noqa: E402
+from webhook import running  # noqa: E402
+
+METHODS = ("sendMessage", "editMessageText", "answerCallbackQuery")
+
+
+def inline_buttons(request, chat_id):
+    """callback_data кнопок последнего сообщения с inline-клавиатурой в чате."""
+    for method, params, _ in reversed(request.calls):
+        if method in ("sendMessage", "editMessageText") and int(params["chat_id"]) == chat_id:
+            markup = params.get("reply_markup")
+            markup = json.loads(markup) if isinstance(markup, str) else markup
+            if markup and "inline_keyboard" in markup:
+                return [row[0]["callback_data"] for row in markup["inline_keyboard"]]
+    return None
+
+
+async def play(application, request, user_id, rng, inline):
+    async def send(data):
+        await application.process_update(Update.de_json(data, application.bot))
+
+    category = rng.choice(list(bot.question_bank.by_title.values()))
+    for text in ("/start", "Начать викторину", f"Игрок {user_id}", category.title):
+        await send(text_update(user_id, text))
+    options = sorted({opt for q in category.questions for opt in q.options})
+    for _ in range(min(len(category.questions), QUIZ_LENGTH)):
+        if inline:
+            # Ждём, пока очередь доставит вопрос, — нужна его клавиатура
+            while (buttons := inline_buttons(request, user_id)) is None:
+                await asyncio.sleep(0.001)
+            message_id = request.last_message_ids[user_id]
+            await send(callback_update(user_id, user_id, message_id, rng.choice(buttons)))
+        else:
+            await send(text_update(user_id, rng.choice(options)))
+    await send(text_update(user_id, "Вернуться в меню"))
+
+
+async def run_mode(users, inline, with_outbox):
+    # Игроки жмут кнопки без пауз — бакеты throttle.py их бы остановили
+    bot.throttle = None
+    bot.INLINE_QUIZ = inline
+    request = FakeRequest()
+    application = bot.build_application("1:fake", request=request)
+    rng = random.Random(1)
+    # Без очереди — Application без post_init, как в версии до outbound.py
+    lifecycle = running(application) if with_outbox else contextlib.AsyncExitStack()
+    if not with_outbox:
+        await application.initialize()
+    async with lifecycle:
+        await asyncio.gather(*(
+            play(application, request, 7000 + i, rng, inline) for i in range(users)
+        ))
+    if not with_outbox:
+        await application.shutdown()
+    return {method: request.counts.get(method, 0) / users for method in METHODS}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    args = parser.parse_args()
+
+    # Фейковый API лимитов не держит, а ждать бакеты здесь незачем
+    bot.OUTBOX_GLOBAL_RATE = bot.OUTBOX_CHAT_RATE = bot.OUTBOX_CHAT_BURST = 10**6
+    modes = (
+        ("reply без очереди", False, False),
+        ("reply с очередью", False, True),
+        ("inline с очередью", True, True),
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.ANSWER_LOG = os.path.join(tmp, "answers.log")
+        print(f"{'':>18}  " + "  ".join(f"{m:>19}" for m in METHODS) + f"  {'всего':>7}")
+        for index, (name, inline, with_outbox) in enumerate(modes):
+            bot.load_scores(SQLiteScoreStore(os.path.join(tmp, f"{index}.db")))
+            counts = asyncio.run(run_mode(args.users, inline, with_outbox))
+            print(f"{name:>18}  " + "  ".join(f"{counts[m]:>19.1f}" for m in METHODS)
+                  + f"  {sum(counts.values()):>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Тексты ответов: сколько новых строк создаётся на обработанный ответ игрока.
+
+На каждый ответ бот отправляет вердикт (верно/неверно, правильный ответ,
+пояснение) и следующий вопрос. Сравниваются прежние f-строки прямо
+в обработчиках и каталоги messages.py (функции текстов с f-строками, кэш
+вердиктов). Все отправленные тексты удерживаются до конца замера, поэтому
+число различных объектов среди них — это число строк, созданных заново;
+их размер — сколько байт выделено под тексты.
+
+    python benchmarks/bench_messages.py [--answers 200000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import messages  # noqa: E402
+from question_bank import QuestionBank  # noqa: E402
+
+PACKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "packs")
+
+
+def legacy_replies(question, correct, number, total, next_question):
+    # Как было в check_answer / ask_question
+    verdict = (
+        f"{'Верно! +1 очко.' if correct else 'Неверно.'}\n"
+        f"Правильный ответ: {question.answer}\n"
+        f"Пояснение: {question.explanation}"
+    )
+    return verdict, f"Вопрос {number}/{total}:\n{next_question.text}"
+
+
+def catalog_replies(question, correct, number, total, next_question, t=messages.DEFAULT):
+    return t.verdict(question, correct), t.question(number=number, total=total, text=next_question.text)
+
+
+def run(render, answers, questions, seed):
+    rng = random.Random(seed)
+    sent = []
+    start = time.perf_counter()
+    for i in range(answers):
+        question = questions[rng.randrange(len(questions))]
+        next_question = questions[rng.randrange(len(questions))]
+        sent.extend(render(question, rng.random() < 0.6, i % 20 + 1, 20, next_question))
+    elapsed = time.perf_counter() - start
+    unique = {id(text): text for text in sent}
+    return elapsed, len(unique), sum(sys.getsizeof(text) for text in unique.values())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--answers", type=int, default=200_000)
+    args = parser.parse_args()
+
+    bank = QuestionBank.load(PACKS_DIR)
+    questions = [q for category in bank.categories.values() for q in category.questions]
+    print(f"вопросов в паках: {len(questions)}, ответов: {args.answers}")
+    for name, render in (("f-строки", legacy_replies), ("messages.py", catalog_replies)):
+        elapsed, created, size = run(render, args.answers, questions, 1)
+        print(f"{name:>12}: новых строк на ответ {created / args.answers:.2f}, "
+              f"{size / args.answers:,.0f} байт на ответ, {elapsed / args.answers * 1e6:.2f} мкс на ответ")
+
+
+if __name__ == "__main__":
+    main()
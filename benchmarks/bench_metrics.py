@@ -0,0 +1,98 @@
+"""
+Накладные расходы метрик на апдейт.
+
+1. Микро: один и тот же пустой обработчик без обёртки и с metrics.instrument.
+2. Целиком: USERS игроков проходят викторину через process_update
+   с фейковым Bot API — один раз с обёрнутыми обработчиками, другой раз
+   с обработчиками как есть. Разница, делённая на число апдейтов, — цена
+   метрик на апдейт (зашумлена, поэтому берётся лучший из REPEAT прогонов).
+
+    python benchmarks/bench_metrics.py [--users 500] [--repeat 5]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import bot  # noqa: E402
+import metrics  # noqa: E402
+from fakebot import FakeRequest, player_steps, text_update  # noqa: E402
+from storage import SQLiteScoreStore  # noqa: E402
+from telegram import Update  # noqa: E402
+
+
+async def handler(update, context):
+    return None
+
+
+async def micro(calls):
+    wrapped = metrics.instrument(handler, "bench_handler", "bench_state")
+    results = {}
+    for name, callback in (("без обёртки", handler), ("с обёрткой", wrapped)):
+        best = float("inf")
+        for _ in range(5):
+            start = time.perf_counter_ns()
+            for _ in range(calls):
+                await callback(None, None)
+            best = min(best, time.perf_counter_ns() - start)
+        results[name] = best / calls
+    return results
+
+
+async def full_flow(scripts, instrumented):
+    original = bot.instrument
+    if not instrumented:
+        bot.instrument = lambda callback, handler, state=None: callback
+    try:
+        # Сравниваются только обёртки обработчиков
+        bot.throttle = None
+        application = bot.build_application("1:fake", request=FakeRequest(record=False))
+    finally:
+        bot.instrument = original
+    updates = [
+        Update.de_json(text_update(user_id, text), application.bot)
+        for user_id, script in scripts.items()
+        for _, text in script
+    ]
+    async with application:
+        start = time.perf_counter_ns()
+        for update in updates:
+            await application.process_update(update)
+        elapsed = time.perf_counter_ns() - start
+    return elapsed / len(updates), len(updates)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--calls", type=int, default=200_000)
+    args = parser.parse_args()
+
+    for name, ns in asyncio.run(micro(args.calls)).items():
+        print(f"{name:>12}: {ns:8.0f} нс на вызов")
+
+    best = {True: float("inf"), False: float("inf")}
+    with tempfile.TemporaryDirectory() as tmp:
+        for attempt in range(args.repeat):
+            for instrumented in (False, True):
+                rng = random.Random(attempt)
+                # Новые user_id на каждый прогон — иначе сессии останутся с прошлого
+                base = 1_000_000 * (attempt * 2 + instrumented + 1)
+                scripts = {base + i: player_steps(base + i, bot.question_bank, rng) for i in range(args.users)}
+                bot.load_scores(SQLiteScoreStore(os.path.join(tmp, f"{attempt}-{instrumented}.db")))
+                per_update, count = asyncio.run(full_flow(scripts, instrumented))
+                best[instrumented] = min(best[instrumented], per_update)
+    print(f"апдейтов за прогон: {count}")
+    print(f"process_update без метрик: {best[False] / 1000:8.2f} мкс")
+    print(f"process_update с метриками: {best[True] / 1000:8.2f} мкс")
+    print(f"цена метрик: {(best[True] - best[False]) / 1000:+.2f} мкс на апдейт")
+
+
+if __name__ == "__main__":
+    main()
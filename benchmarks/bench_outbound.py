@@ -0,0 +1,115 @@
+"""
+Очередь отправки (outbound.Outbox) против прямых reply_text.
+
+USERS игроков параллельно проходят викторину через настоящие обработчики
+и фейковый Bot API. Сравниваются число вызовов sendMessage без очереди
+и с ней (склейка вердикта с вопросом и т.п.), а для очереди проверяется,
+что лимиты соблюдены (не больше CHAT_BURST + CHAT_RATE * t сообщений
+в чат и GLOBAL_RATE * t + GLOBAL_RATE всего), а 429 от сервера
+отработаны повтором без потерь.
+
+    python benchmarks/bench_outbound.py [--users 20] [--flood-every 50]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import bot  # noqa: E402
+from fakebot import FakeRequest, player_script, text_update  # noqa: E402
+from storage import SQLiteScoreStore  # noqa: E402
+from telegram import Update  # noqa: E402
+from webhook import running  # noqa: E402
+
+
+async def play(application, scripts):
+    async def player(user_id, script):
+        for text in script:
+            await application.process_update(Update.de_json(text_update(user_id, text), application.bot))
+            # Игрок читает вопрос, прежде чем ответить
+            await asyncio.sleep(0.05)
+
+    await asyncio.gather(*(player(u, s) for u, s in scripts.items()))
+
+
+async def run_direct(scripts):
+    request = FakeRequest()
+    application = bot.build_application("1:fake", request=request)
+    async with application:
+        await play(application, scripts)
+    return request
+
+
+async def run_outbox(scripts, flood_every):
+    request = FakeRequest(flood_every=flood_every)
+    application = bot.build_application("1:fake", request=request)
+    started = time.monotonic()
+    async with running(application):
+        await play(application, scripts)
+        stats_before_drain = bot.outbox.stats()
+        outbox = bot.outbox
+    return request, outbox, stats_before_drain, time.monotonic() - started
+
+
+def check_limits(request, chat_rate, chat_burst, global_rate):
+    sends = [(params["chat_id"], at) for method, params, at in request.calls if method == "sendMessage"]
+    violations = []
+    by_chat = {}
+    for chat_id, at in sends:
+        by_chat.setdefault(chat_id, []).append(at)
+    for chat_id, times in by_chat.items():
+        for i, at in enumerate(times):
+            allowed = chat_burst + chat_rate * (at - times[0]) + 1e-6
+            if i + 1 > allowed + 1:
+                violations.append(f"чат {chat_id}: {i + 1} сообщений за {at - times[0]:.2f} с")
+                break
+    all_times = sorted(at for _, at in sends)
+    for i, at in enumerate(all_times):
+        if i + 1 > global_rate + global_rate * (at - all_times[0]) + 1:
+            violations.append(f"всего {i + 1} сообщений за {at - all_times[0]:.2f} с")
+            break
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--flood-every", type=int, default=50, help="каждый N-й sendMessage получает 429")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    scripts = {5000 + i: player_script(5000 + i, bot.question_bank, rng) for i in range(args.users)}
+    with tempfile.TemporaryDirectory() as tmp:
+        # 20 апдейтов в секунду на игрока — выше лимита THROTTLE_RATE
+        bot.throttle = None
+        bot.ANSWER_LOG = os.path.join(tmp, "answers.log")
+        bot.load_scores(SQLiteScoreStore(os.path.join(tmp, "a.db")))
+        direct = asyncio.run(run_direct(scripts))
+        bot.load_scores(SQLiteScoreStore(os.path.join(tmp, "b.db")))
+        queued, outbox, stats, elapsed = asyncio.run(run_outbox(scripts, args.flood_every))
+
+    direct_calls = direct.counts.get("sendMessage", 0)
+    queued_calls = queued.counts.get("sendMessage", 0) - queued.flooded
+    final = outbox.stats()
+    print(f"игроков: {args.users}")
+    print(f"sendMessage без очереди: {direct_calls}")
+    print(f"sendMessage с очередью:  {queued_calls} ({queued_calls / direct_calls:.0%}), склеено {final['merged']}")
+    print(f"429 от сервера: {queued.flooded}, повторов: {final['retried']}, потеряно: {final['failed']}")
+    print(f"очередь в конце игры: {stats['queue_depth']} сообщений, {stats['chats_waiting']} чатов")
+    print(f"задержка отправки: средняя {final['latency_avg_s'] * 1000:.0f} мс, "
+          f"p95 {final['latency_p95_s'] * 1000:.0f} мс, макс {final['latency_max_s'] * 1000:.0f} мс; "
+          f"всего {elapsed:.1f} с")
+    violations = check_limits(queued, bot.OUTBOX_CHAT_RATE, bot.OUTBOX_CHAT_BURST, bot.OUTBOX_GLOBAL_RATE)
+    for violation in violations:
+        print("превышен лимит: " + violation)
+    if violations or final["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Таблицы лидеров за день и неделю (leaderboard.PeriodLeaderboards).
+
+Синтетическая нагрузка: EVENTS начислений очков за DAYS дней по PLAYERS
+игрокам (активность игроков неравномерная — как в жизни, немногие играют
+много). Начисления идут так же, как в bot.credit_scores: общая таблица,
+таблицы периодов и буфер хранилища с ключами периодов; в полночь —
+rollover и сброс буфера в SQLite.
+
+Замеряются:
+1. цена начисления — только общая таблица против общей + день + неделя;
+2. смена периода (rollover) и сброс буфера за день;
+3. топ за неделю и место игрока: из индекса против пересчёта по истории
+   начислений за неделю (как пришлось бы без таблиц периодов).
+
+    python benchmarks/bench_periods.py [--events 3000000] [--days 8] [--players 200000]
+"""
+import argparse
+import heapq
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import messages  # noqa: E402
+from leaderboard import Leaderboard, PeriodLeaderboards  # noqa: E402
+from storage import SQLiteScoreStore  # noqa: E402
+
+
+def make_events(events, players, rng):
+    # Номер игрока по степенному закону: несколько процентов игроков дают большую часть очков
+    weights = [1 / (i + 1) ** 0.8 for i in range(players)]
+    users = rng.choices(range(players), weights=weights, k=events)
+    return [(str(user), rng.randint(1, 20)) for user in users]
+
+
+def new_scoreboard(players):
+    return {str(i): {"username": f"Игрок {i}", "score": 0} for i in range(players)}
+
+
+def run_all_time(events, players):
+    scoreboard = new_scoreboard(players)
+    board = Leaderboard(scoreboard)
+    start = time.perf_counter()
+    for user_id, delta in events:
+        board.add_score(user_id, delta)
+    return time.perf_counter() - start
+
+
+def run_periods(events, players, days, store):
+    scoreboard = new_scoreboard(players)
+    board = Leaderboard(scoreboard)
+    # Воскресенье: на второй день начинается новая неделя, дальше она идёт целиком
+    start_day = datetime(2024, 5, 5, tzinfo=timezone.utc)
+    periods = PeriodLeaderboards(scoreboard, now=start_day)
+    per_day = len(events) // days
+    credit = rollover = flush = 0.0
+    flushed_rows = 0
+    # История начислений за текущую неделю — для пересчёта «как без таблиц»
+    week_history = []
+    for day in range(days):
+        chunk = events[day * per_day:(day + 1) * per_day]
+        start = time.perf_counter()
+        keys = periods.keys.values()
+        for user_id, delta in chunk:
+            board.add_score(user_id, delta)
+            periods.add_score(user_id, delta)
+            store.add_score(user_id, delta, keys)
+        credit += time.perf_counter() - start
+        week_history.extend(chunk)
+
+        start = time.perf_counter()
+        flushed_rows += len(store._pending_periods)
+        store.flush()
+        flush += time.perf_counter() - start
+        if day == days - 1:
+            break
+        start = time.perf_counter()
+        changed = periods.rollover(start_day + timedelta(days=day + 1))
+        rollover += time.perf_counter() - start
+        if "week" in changed:
+            week_history = []
+    return periods, week_history, credit, rollover / max(1, days - 1), flush / days, flushed_rows
+
+
+def top_from_history(history, size=10):
+    totals = {}
+    for user_id, delta in history:
+        totals[user_id] = totals.get(user_id, 0) + delta
+    return heapq.nlargest(size, totals.items(), key=lambda item: item[1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=3_000_000)
+    parser.add_argument("--days", type=int, default=8)
+    parser.add_argument("--players", type=int, default=200_000)
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    events = make_events(args.events, args.players, rng)
+    print(f"начислений: {args.events} за {args.days} дн. ({args.events // args.days} в день), "
+          f"игроков: {args.players}")
+
+    elapsed = run_all_time(events, args.players)
+    print(f"только общая таблица:       {elapsed / args.events * 1e6:.2f} мкс на начисление")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteScoreStore(os.path.join(tmp, "scores.db"))
+        periods, week_history, credit, rollover, flush, rows = run_periods(
+            events, args.players, args.days, store
+        )
+        print(f"общая + день + неделя:      {credit / args.events * 1e6:.2f} мкс на начисление "
+              f"(вместе с буфером хранилища), до {86400 / (credit / args.events) / 1e9:.1f} млрд "
+              f"начислений в сутки на ядро")
+        print(f"rollover: {rollover * 1e6:.0f} мкс; сброс за день: {flush * 1000:.0f} мс "
+              f"({rows // args.days} строк периодов в среднем)")
+        loaded = store.load_period_scores(list(periods.keys.values()))
+        store.close()
+
+    week = periods.boards["week"]
+    same = loaded[periods.keys["week"]] == {
+        user_id: entry["score"] for user_id, entry in periods.scoreboards["week"].items()
+    }
+    print(f"очки за неделю в SQLite совпадают с памятью: {'да' if same else 'НЕТ'}")
+
+    t = messages.DEFAULT
+    queries = 10_000
+    user_ids = [str(rng.randrange(args.players)) for _ in range(queries)]
+    start = time.perf_counter()
+    for user_id in user_ids:
+        week.render(t)
+        week.rank(user_id)
+    indexed = (time.perf_counter() - start) / queries
+
+    start = time.perf_counter()
+    rescanned_top = top_from_history(week_history)
+    rescan = time.perf_counter() - start
+    same_top = [score for _, score in rescanned_top] == [score for _, _, score in week.top()]
+    print(f"топ недели + место игрока: {indexed * 1e6:.1f} мкс из индекса, "
+          f"{rescan * 1000:.0f} мс пересчётом {len(week_history)} начислений недели; "
+          f"топы совпадают: {'да' if same_top else 'НЕТ'}")
+
+
+if __name__ == "__main__":
+    main()
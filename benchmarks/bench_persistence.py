@@ -0,0 +1,99 @@
+"""
+Бенчмарк сброса состояния: PicklePersistence против SQLitePersistence.
+
+Для каждого размера базы (число сохранённых игроков) измеряется время
+одного сброса, в котором изменились данные DIRTY игроков. У PicklePersistence
+каждый сброс переписывает файл целиком, у SQLitePersistence пишутся только
+изменившиеся строки, поэтому время должно оставаться примерно постоянным.
+
+    python benchmarks/bench_persistence.py [--sizes 1000,10000,100000,1000000]
+"""
+import argparse
+import asyncio
+import os
+import pickle
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from telegram.ext import PicklePersistence  # noqa: E402
+
+from persistence import SQLitePersistence  # noqa: E402
+
+
+def sample_user_data(user_id):
+    return {
+        "username": f"Игрок {user_id}",
+        "category": "Правила волейбола \U0001F3D0",
+        "current_question_index": user_id % 20,
+        "score_this_round": user_id % 7,
+    }
+
+
+def prefill_sqlite(path, size):
+    conn = sqlite3.connect(path)
+    SQLitePersistence(path)  # создаёт схему с нужными PRAGMA
+    with conn:
+        conn.executemany(
+            "INSERT INTO user_data (id, data) VALUES (?, ?)",
+            ((i, pickle.dumps(sample_user_data(i), protocol=pickle.HIGHEST_PROTOCOL)) for i in range(size)),
+        )
+    conn.close()
+
+
+async def bench_sqlite(path, size, dirty, rounds):
+    persistence = SQLitePersistence(path)
+    times = []
+    for r in range(rounds):
+        start = time.perf_counter()
+        for user_id in range(r * dirty, (r + 1) * dirty):
+            await persistence.update_user_data(user_id % size, sample_user_data(user_id))
+        await persistence._commit_task
+        times.append(time.perf_counter() - start)
+    await persistence.flush()
+    return min(times)
+
+
+async def bench_pickle(path, size, dirty, rounds):
+    persistence = PicklePersistence(filepath=path, on_flush=True)
+    persistence.user_data = {i: sample_user_data(i) for i in range(size)}
+    times = []
+    for r in range(rounds):
+        start = time.perf_counter()
+        for user_id in range(r * dirty, (r + 1) * dirty):
+            await persistence.update_user_data(user_id % size, sample_user_data(user_id))
+        await persistence.flush()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+    parser.add_argument("--dirty", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--pickle-max", type=int, default=1000000,
+                        help="не запускать PicklePersistence на базах больше этого размера")
+    args = parser.parse_args()
+
+    print(f"{'игроков':>10} {'sqlite, мс':>12} {'pickle, мс':>12}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "state.db")
+            prefill_sqlite(db_path, size)
+            sqlite_time = asyncio.run(bench_sqlite(db_path, size, args.dirty, args.rounds))
+            if size <= args.pickle_max:
+                pickle_time = asyncio.run(
+                    bench_pickle(os.path.join(tmp, "state.pkl"), size, args.dirty, args.rounds)
+                )
+                pickle_ms = f"{pickle_time * 1000:12.2f}"
+            else:
+                pickle_ms = f"{'-':>12}"
+        print(f"{size:>10} {sqlite_time * 1000:12.2f} {pickle_ms}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Пропускная способность ask_question / check_answer: прежняя реализация
+(список вопросов в user_data, клавиатура собирается на каждое сообщение,
+сравнение ответа строкой) против текущей на QuestionBank.
+
+Отправка сообщений заглушена, так что измеряется только работа обработчиков.
+
+    python benchmarks/bench_question_bank.py [--rounds 20000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from telegram import ReplyKeyboardMarkup  # noqa: E402
+
+import bot  # noqa: E402
+from question_bank import read_pack_source  # noqa: E402
+
+# Вопросы в прежнем формате quiz_data: {категория: [dict, ...]}
+quiz_data = {
+    title: items
+    for name in sorted(os.listdir(bot.PACKS_DIR)) if name.endswith((".json", ".csv"))
+    for title, items in read_pack_source(os.path.join(bot.PACKS_DIR, name))
+}
+
+
+class StubMessage:
+    def __init__(self):
+        self.text = ""
+
+    async def reply_text(self, text, reply_markup=None):
+        pass
+
+
+# -------------------------
+# Прежняя реализация (до question_bank)
+# -------------------------
+async def legacy_ask_question(update, context):
+    index = context.user_data["current_question_index"]
+    questions = context.user_data["questions"]
+    if index >= len(questions):
+        return None
+    question_data = questions[index]
+    keyboard = [[opt] for opt in question_data["options"]]
+    await update.message.reply_text(
+        f"Вопрос {index+1}/{len(questions)}:\n{question_data['question']}",
+        reply_markup=ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
+    )
+    return bot.ASK_QUESTION
+
+
+async def legacy_check_answer(update, context):
+    user_answer = update.message.text.strip()
+    index = context.user_data["current_question_index"]
+    question_data = context.user_data["questions"][index]
+    correct_answer = question_data["answer"]
+    explanation = question_data["explanation"]
+    if user_answer == correct_answer:
+        context.user_data["score_this_round"] += 1
+        reply_text = f"Верно! +1 очко.\nПравильный ответ: {correct_answer}\nПояснение: {explanation}"
+    else:
+        reply_text = f"Неверно.\nПравильный ответ: {correct_answer}\nПояснение: {explanation}"
+    await update.message.reply_text(reply_text)
+    context.user_data["current_question_index"] += 1
+    return await legacy_ask_question(update, context)
+
+
+def legacy_start(user_data, title):
+    questions = quiz_data[title][:]
+    random.shuffle(questions)
+    user_data["questions"] = questions
+
+
+def bank_start(user_data, title):
+    category = bot.question_bank.by_title[title]
+    user_data["category"] = category.id
+    user_data["order"] = bot.question_bank.new_order(category)
+
+
+async def run(check_answer, start, rounds):
+    title = next(iter(bot.question_bank.by_title))
+    message = StubMessage()
+    update = SimpleNamespace(
+        message=message, effective_message=message, effective_user=SimpleNamespace(id=1, language_code="ru")
+    )
+    context = SimpleNamespace(user_data={"username": "Игрок"})
+    options = quiz_data[title][0]["options"]
+    handled = 0
+    start_time = time.perf_counter()
+    while handled < rounds:
+        context.user_data.update(current_question_index=0, score_this_round=0)
+        start(context.user_data, title)
+        for _ in range(len(quiz_data[title])):
+            update.message.text = options[handled % len(options)]
+            await check_answer(update, context)
+            handled += 1
+    return handled / (time.perf_counter() - start_time)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=20000)
+    args = parser.parse_args()
+    # end_quiz в замере не участвует: обе версии останавливаются на последнем вопросе
+    bot.end_quiz = lambda update, context: asyncio.sleep(0)
+    legacy = asyncio.run(run(legacy_check_answer, legacy_start, args.rounds))
+    current = asyncio.run(run(bot.check_answer, bank_start, args.rounds))
+    print(f"прежняя реализация: {legacy:,.0f} ответов/с")
+    print(f"QuestionBank:       {current:,.0f} ответов/с ({current / legacy:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Адаптивный подбор вопросов (rating.py).
+
+1. Стоимость подбора и обновления рейтинга в зависимости от размера
+   категории — DifficultyIndex против линейного поиска ближайшего рейтинга.
+2. Симуляция: у игроков и вопросов есть «истинные» сила и сложность,
+   ответ верен с вероятностью по Эло. Сравнивается доля верных ответов
+   при случайном и адаптивном подборе (цель — TARGET_SUCCESS) и насколько
+   выученные рейтинги вопросов совпадают с истинной сложностью.
+3. Сброс накопленных рейтингов в SQLite одной пачкой.
+
+    python benchmarks/bench_rating.py [--sizes 1000,100000,1000000] [--players 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import rating  # noqa: E402
+from rating import DifficultyIndex, Ratings, expected  # noqa: E402
+from storage import SQLiteScoreStore  # noqa: E402
+
+
+def bench_index(size, rng, ops=20000):
+    index = DifficultyIndex(size)
+    for position in range(size):
+        index.set(position, rng.gauss(1500, 200))
+    targets = [rng.gauss(1500, 250) for _ in range(ops)]
+    exclude = set(rng.sample(range(size), min(size // 2, 19)))
+
+    start = time.perf_counter()
+    for target in targets:
+        position = index.pick(target, exclude, rng)
+        index.set(position, index.ratings[position] + rng.uniform(-8, 8))
+    indexed = (time.perf_counter() - start) / ops
+
+    linear_ops = max(10, ops * 1000 // size)
+    ratings = index.ratings
+    start = time.perf_counter()
+    for target in targets[:linear_ops]:
+        min((p for p in range(size) if p not in exclude), key=lambda p: abs(ratings[p] - target))
+    linear = (time.perf_counter() - start) / linear_ops
+    return indexed, linear
+
+
+def simulate(players, quiz_length, questions, adaptive, rng):
+    difficulty = [rng.gauss(1500, 250) for _ in range(questions)]
+    category = SimpleNamespace(
+        title="Симуляция", questions=[SimpleNamespace(text=str(i)) for i in range(questions)]
+    )
+    ratings = Ratings()
+    answered = correct = 0
+    # Каждый игрок проходит несколько викторин подряд
+    for player in range(players):
+        skill = rng.gauss(1500, 250)
+        user_data = {}
+        for quiz in range(5):
+            asked = set()
+            for _ in range(quiz_length):
+                if adaptive:
+                    position = ratings.pick(user_data, category, asked, rng)
+                else:
+                    position = rng.choice([p for p in range(questions) if p not in asked])
+                asked.add(position)
+                ok = rng.random() < expected(skill, difficulty[position])
+                ratings.update(user_data, category, position, category.questions[position], ok)
+                if quiz == 4:
+                    answered += 1
+                    correct += ok
+    learned = ratings.index(category).ratings
+    mean_l = sum(learned) / questions
+    mean_d = sum(difficulty) / questions
+    cov = sum((l - mean_l) * (d - mean_d) for l, d in zip(learned, difficulty))
+    var_l = sum((l - mean_l) ** 2 for l in learned)
+    var_d = sum((d - mean_d) ** 2 for d in difficulty)
+    return correct / answered, cov / (var_l * var_d) ** 0.5, ratings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,100000,1000000")
+    parser.add_argument("--players", type=int, default=2000)
+    parser.add_argument("--questions", type=int, default=500)
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    print(f"{'вопросов':>10}  {'индекс, мкс':>12}  {'линейно, мкс':>13}")
+    for size in map(int, args.sizes.split(",")):
+        indexed, linear = bench_index(size, rng)
+        print(f"{size:>10}  {indexed * 1e6:>12.1f}  {linear * 1e6:>13.0f}")
+
+    print(f"\nсимуляция: {args.players} игроков × 5 викторин по 20 вопросов, {args.questions} вопросов "
+          f"(цель — {rating.TARGET_SUCCESS:.0%} верных)")
+    for name, adaptive in (("случайный", False), ("адаптивный", True)):
+        success, corr, ratings = simulate(args.players, 20, args.questions, adaptive, random.Random(2))
+        print(f"{name:>11}: верных в 5-й викторине {success:.1%}, "
+              f"корреляция рейтинга вопроса с истинной сложностью {corr:.2f}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteScoreStore(os.path.join(tmp, "scores.db"))
+        pending = ratings.pending()
+        start = time.perf_counter()
+        ratings.flush(store)
+        elapsed = time.perf_counter() - start
+        loaded = Ratings()
+        bank = SimpleNamespace(by_title={"Симуляция": SimpleNamespace(
+            title="Симуляция", questions=[SimpleNamespace(text=str(i)) for i in range(args.questions)]
+        )})
+        loaded.load(store.load_question_ratings(), bank)
+        same = all(
+            abs(a - b) < 1e-6
+            for a, b in zip(loaded.index(bank.by_title["Симуляция"]).ratings,
+                            ratings.index(bank.by_title["Симуляция"]).ratings)
+        )
+        store.close()
+    print(f"\nсброс {pending} рейтингов вопросов: {elapsed * 1000:.1f} мс, "
+          f"после перечитывания совпадают: {'да' if same else 'НЕТ'}")
+
+
+if __name__ == "__main__":
+    main()
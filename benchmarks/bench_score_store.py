@@ -0,0 +1,63 @@
+"""
+Бенчмарк хранилища очков: запись «по одной транзакции на викторину»
+против накопления приращений и пакетного сброса (storage.SQLiteScoreStore).
+
+    python benchmarks/bench_score_store.py [--players 10000] [--quizzes 100000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from storage import SQLiteScoreStore  # noqa: E402
+
+
+def run_unbatched(path, events):
+    store = SQLiteScoreStore(path)
+    start = time.perf_counter()
+    for user_id, delta in events:
+        store.add_score(user_id, delta)
+        store.flush()
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed
+
+
+def run_batched(path, events, batch):
+    store = SQLiteScoreStore(path)
+    start = time.perf_counter()
+    for i, (user_id, delta) in enumerate(events, start=1):
+        store.add_score(user_id, delta)
+        if i % batch == 0:
+            store.flush()
+    store.flush()
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=10000)
+    parser.add_argument("--quizzes", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    events = [(str(rng.randrange(args.players)), rng.randrange(1, 21)) for _ in range(args.quizzes)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        unbatched = run_unbatched(os.path.join(tmp, "a.db"), events)
+        batched = run_batched(os.path.join(tmp, "b.db"), events, args.batch)
+
+    print(f"викторин: {args.quizzes}, игроков: {args.players}")
+    print(f"транзакция на событие: {unbatched:.3f} с ({args.quizzes / unbatched:,.0f} событий/с)")
+    print(f"пачки по {args.batch}:      {batched:.3f} с ({args.quizzes / batched:,.0f} событий/с)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+SessionReaper: сколько event loop стоит без передачи управления во время sweep.
+
+SESSIONS сессий просрочены разом (например, после ночи без игроков).
+Параллельно с sweep крутится задача-«пульс», которая засыпает на 0 с
+и меряет, сколько на самом деле ждала, — это и есть задержка, которую
+увидят апдейты. Сравниваются разные batch_size.
+
+    python benchmarks/bench_session_reaper.py [--sessions 500000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from sessions import SessionReaper  # noqa: E402
+
+
+async def run(sessions, batch_size):
+    user_data = {}
+    conversations = {}
+
+    def expire(key):
+        # Как bot.expire_session: чистим данные раунда и возвращаем в меню
+        data = user_data.get(key[1])
+        if data is not None:
+            data.clear()
+        conversations[key] = 0
+        return True
+
+    reaper = SessionReaper(60, expire, batch_size=batch_size)
+    for i in range(sessions):
+        user_data[i] = {"order": list(range(20)), "current_question_index": 3, "score_this_round": 1}
+        conversations[(i, i)] = 3
+        reaper.touch((i, i), now=0)
+
+    stalls = []
+    done = asyncio.Event()
+
+    async def pulse():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0)
+            stalls.append(time.perf_counter() - start)
+
+    pulse_task = asyncio.create_task(pulse())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    expired = await reaper.sweep(now=3600)
+    elapsed = time.perf_counter() - start
+    done.set()
+    await pulse_task
+    return expired, elapsed, max(stalls)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=500_000)
+    args = parser.parse_args()
+
+    for batch_size in (args.sessions, 5000, 500, 50):
+        expired, elapsed, stall = asyncio.run(run(args.sessions, batch_size))
+        print(
+            f"batch_size={batch_size:>7}: закрыто {expired} за {elapsed * 1000:7.1f} мс, "
+            f"максимальная пауза event loop {stall * 1000:7.2f} мс"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Размер сессий викторины: старый формат (копия списка вопросов в user_data)
+против компактного (номер категории + порядок вопросов + перестановки вариантов).
+
+Для SESSIONS смоделированных игроков измеряются память в куче (tracemalloc),
+суммарный размер pickle, который пишет persistence, и время deepcopy —
+Application копирует user_data перед каждой передачей в persistence.
+
+    python benchmarks/bench_sessions.py [--sessions 100000]
+"""
+import argparse
+import copy
+import os
+import pickle
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import bot  # noqa: E402
+from question_bank import read_pack_source  # noqa: E402
+
+# Вопросы в прежнем формате quiz_data: {категория: [dict, ...]}
+quiz_data = {
+    title: items
+    for name in sorted(os.listdir(bot.PACKS_DIR)) if name.endswith((".json", ".csv"))
+    for title, items in read_pack_source(os.path.join(bot.PACKS_DIR, name))
+}
+
+
+def legacy_session(user_data, category):
+    # Так choose_category заполнял user_data раньше
+    questions = quiz_data[category][:]
+    random.shuffle(questions)
+    user_data["category"] = category
+    user_data["questions"] = questions
+    user_data["current_question_index"] = 0
+    user_data["score_this_round"] = 0
+
+
+def compact_session(user_data, category):
+    # То же, что делает choose_category сейчас
+    category = bot.question_bank.by_title[category]
+    user_data["category"] = category.id
+    user_data["order"] = bot.question_bank.new_order(category)
+    user_data["current_question_index"] = 0
+    user_data["score_this_round"] = 0
+
+
+def measure(name, fill, sessions):
+    categories = list(bot.question_bank.by_title)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    users = []
+    for i in range(sessions):
+        user_data = {"username": f"Игрок {i}"}
+        fill(user_data, categories[i % len(categories)])
+        users.append(user_data)
+    heap = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    pickled = sum(len(pickle.dumps(u, protocol=pickle.HIGHEST_PROTOCOL)) for u in users)
+
+    sample = users[:1000]
+    start = time.perf_counter()
+    for user_data in sample:
+        copy.deepcopy(user_data)
+    deepcopy_us = (time.perf_counter() - start) / len(sample) * 1e6
+
+    print(
+        f"{name:>10}: память {heap / sessions:8.0f} Б/сессию, "
+        f"pickle {pickled / sessions:8.0f} Б/сессию ({pickled / 2**20:.1f} МиБ всего), "
+        f"deepcopy {deepcopy_us:6.1f} мкс"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=100000)
+    args = parser.parse_args()
+    random.seed(1)
+    measure("старый", legacy_session, args.sessions)
+    measure("компактный", compact_session, args.sessions)
+
+
+if __name__ == "__main__":
+    main()
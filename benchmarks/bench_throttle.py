@@ -0,0 +1,171 @@
+"""
+Защита от флуда (throttle.py): задержка обычных игроков, пока бота
+заваливают скрипты.
+
+PLAYERS игроков проходят викторину как люди — сообщение раз в 1–3 с.
+Одновременно ATTACKERS скриптов шлют FLOOD_RATE апдейтов в секунду
+на всех: случайный мусор, один и тот же текст и сообщения по 4000
+символов. Апдейты приходят по расписанию в реальном времени
+и обрабатываются по одному, как в Application без concurrent_updates;
+задержка игрока — от момента, когда апдейт должен был прийти, до конца
+его обработки, так что очередь за флудом в неё входит.
+
+Три прогона: только игроки; игроки и флуд без защиты; игроки и флуд
+с защитой. Проверяется, что p99 игроков под флудом с защитой остаётся
+около p99 без флуда и что ни один апдейт игроков не отброшен.
+
+    python benchmarks/bench_throttle.py [--players 300] [--attackers 20] [--flood-rate 5000] [--seconds 10]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import bot  # noqa: E402
+from fakebot import FakeRequest, player_script, text_update  # noqa: E402
+from persistence import SQLitePersistence  # noqa: E402
+from storage import SQLiteScoreStore  # noqa: E402
+from telegram import Update  # noqa: E402
+from throttle import Throttle  # noqa: E402
+
+OVERSIZED = "х" * 4000
+
+
+def attacker_texts(rng):
+    while True:
+        roll = rng.random()
+        if roll < 0.7:
+            yield f"spam {rng.getrandbits(32)}"
+        elif roll < 0.85:
+            yield OVERSIZED
+        else:
+            yield "spam"
+
+
+def schedule(args, first_id, with_flood, rng):
+    """[(секунда прихода, JSON апдейта, это игрок)] по времени прихода."""
+    events = []
+    for user_id in range(first_id, first_id + args.players):
+        at = rng.uniform(0, 2)
+        for text in player_script(user_id, bot.question_bank, rng):
+            if at >= args.seconds:
+                break
+            events.append((at, text_update(user_id, text), True))
+            at += rng.uniform(1, 3)
+    if with_flood:
+        per_attacker = args.flood_rate / args.attackers
+        for user_id in range(first_id + args.players, first_id + args.players + args.attackers):
+            events.append((0.0, text_update(user_id, "/start"), False))
+            texts = attacker_texts(rng)
+            for i in range(int(args.seconds * per_attacker)):
+                events.append(((i + rng.random()) / per_attacker, text_update(user_id, next(texts)), False))
+    events.sort(key=lambda event: event[0])
+    return events
+
+
+async def run(events, throttled, tmp, name):
+    bot.throttle = Throttle(
+        rate=bot.THROTTLE_RATE or 1, burst=bot.THROTTLE_BURST, max_text=bot.MAX_UPDATE_TEXT,
+        answer_pattern=bot.THROTTLE_ANSWER_PATTERN,
+    ) if throttled else None
+    request = FakeRequest(record=False)
+    application = bot.build_application(
+        "1:fake", persistence=SQLitePersistence(os.path.join(tmp, f"{name}.db")), request=request
+    )
+    queue = asyncio.Queue()
+    latencies = []
+    async with application:
+        loop = asyncio.get_running_loop()
+        updates = [(at, Update.de_json(data, application.bot), player) for at, data, player in events]
+        start = loop.time()
+
+        async def producer():
+            for at, update, player in updates:
+                delay = start + at - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                queue.put_nowait((start + at, update, player))
+            queue.put_nowait(None)
+
+        async def consumer():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                due, update, player = item
+                await application.process_update(update)
+                if player:
+                    latencies.append(loop.time() - due)
+
+        await asyncio.gather(producer(), consumer())
+        elapsed = loop.time() - start
+        await application.update_persistence()
+    latencies.sort()
+    size = os.path.getsize(os.path.join(tmp, f"{name}.db"))
+    return latencies, elapsed, size
+
+
+def pick(samples, q):
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=300)
+    parser.add_argument("--attackers", type=int, default=20)
+    parser.add_argument("--flood-rate", type=int, default=5000, help="апдейтов флуда в секунду на всех")
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.load_scores(SQLiteScoreStore(os.path.join(tmp, "scores.db")))
+        print(f"игроков: {args.players}, скриптов: {args.attackers}, "
+              f"флуд: {args.flood_rate} апдейтов/с, {args.seconds:.0f} с")
+        results = {}
+        runs = (
+            ("без флуда", False, True),
+            ("флуд, без защиты", True, False),
+            ("флуд, с защитой", True, True),
+        )
+        for index, (name, with_flood, throttled) in enumerate(runs):
+            # У каждого прогона свои игроки: scoreboard общий на модуль bot
+            events = schedule(args, 10_000_000 * (index + 1), with_flood, random.Random(1))
+            started = time.perf_counter()
+            latencies, elapsed, size = asyncio.run(run(events, throttled, tmp, f"state{index}"))
+            results[name] = latencies
+            print(f"{name:>17}: p50 {pick(latencies, 0.5) * 1000:7.1f} мс, p99 {pick(latencies, 0.99) * 1000:7.1f} мс, "
+                  f"апдейтов {len(events)} за {elapsed:.1f} с, persistence {size / 2**10:,.0f} КБ "
+                  f"(прогон {time.perf_counter() - started:.0f} с)")
+
+    # Те же апдейты игроков через Throttle по расписанию: не отброшен ли кто-то из них
+    throttle = Throttle(
+        rate=bot.THROTTLE_RATE or 1, burst=bot.THROTTLE_BURST, max_text=bot.MAX_UPDATE_TEXT,
+        answer_pattern=bot.THROTTLE_ANSWER_PATTERN,
+    )
+    events = schedule(args, 10_000_000 * 3, True, random.Random(1))
+    dropped_players = dropped_flood = 0
+    for at, data, player in events:
+        dropped = throttle.check(Update.de_json(data, None), now=at) is not None
+        if player:
+            dropped_players += dropped
+        else:
+            dropped_flood += dropped
+    flood_total = sum(not player for _, _, player in events)
+    print(f"отброшено: апдейтов игроков {dropped_players}, флуда {dropped_flood} из {flood_total} "
+          f"({dropped_flood / flood_total:.1%})")
+
+    baseline = pick(results["без флуда"], 0.99)
+    protected = pick(results["флуд, с защитой"], 0.99)
+    ok = dropped_players == 0 and protected <= max(2 * baseline, baseline + 0.005)
+    print(f"p99 игроков под флудом с защитой на уровне без флуда: {'да' if ok else 'НЕТ'}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Тёплый старт: сколько занимает Application.initialize() с SESSIONS
+сохранёнными сессиями посреди викторины.
+
+Файл состояния заполняется один раз (user_data в компактном формате
+и состояние разговора ASK_QUESTION на каждого игрока), затем бот
+поднимается три раза:
+  - lazy=False: все user_data и разговоры читаются при запуске;
+  - lazy=True без снимка разговоров (как после падения): при запуске
+    читаются только разговоры, построчно;
+  - lazy=True со снимком, оставленным штатной остановкой прошлого прогона.
+После старта один из восстановленных игроков отвечает
+на вопрос: проверяем, что викторина продолжается с того же места,
+и меряем задержку первого апдейта (в ней теперь чтение его записи).
+С --memory дополнительно считается память после старта (tracemalloc
+замедляет запуск в разы, поэтому отдельным прогоном).
+
+    python benchmarks/bench_warm_start.py [--sessions 500000] [--memory]
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import bot  # noqa: E402
+from fakebot import FakeRequest, text_update  # noqa: E402
+from persistence import SQLitePersistence  # noqa: E402
+from storage import SQLiteScoreStore  # noqa: E402
+from telegram import Update  # noqa: E402
+
+QUESTION_INDEX = 4
+
+
+def fill(path, sessions):
+    category = next(iter(bot.question_bank.categories.values()))
+    persistence = SQLitePersistence(path)
+    users, conversations = {}, {}
+    for user_id in range(1, sessions + 1):
+        users[user_id] = {
+            "username": f"Игрок {user_id}",
+            "category": category.id,
+            "order": bot.question_bank.new_order(category),
+            "current_question_index": QUESTION_INDEX,
+            "score_this_round": 2,
+        }
+        conversations[("quiz", f"[{user_id}, {user_id}]")] = bot.ASK_QUESTION
+    persistence._write_batch(users, {}, {}, conversations)
+    persistence._conn.close()
+
+
+def drop_snapshots(path):
+    with sqlite3.connect(path) as conn:
+        conn.execute("DELETE FROM conversation_snapshots")
+
+
+async def start(path, lazy, user_id):
+    request = FakeRequest()
+    application = bot.build_application(
+        "1:fake", persistence=SQLitePersistence(path, lazy=lazy), request=request
+    )
+    started = time.perf_counter()
+    await application.initialize()
+    elapsed = time.perf_counter() - started
+
+    # shutdown сохранит ответ этого игрока, так что каждый прогон берёт своего
+    update = Update.de_json(text_update(user_id, "какой-то ответ"), application.bot)
+    started = time.perf_counter()
+    await application.process_update(update)
+    first_update = time.perf_counter() - started
+    texts = request.texts_by_chat().get(user_id, [])
+    resumed = any(text.startswith(f"Вопрос {QUESTION_INDEX + 2}/") for text in texts)
+    await application.shutdown()
+    return elapsed, first_update, resumed
+
+
+async def measure_memory(path, lazy):
+    application = bot.build_application("1:fake", persistence=SQLitePersistence(path, lazy=lazy),
+                                        request=FakeRequest())
+    tracemalloc.start()
+    await application.initialize()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    await application.shutdown()
+    return memory
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=500_000)
+    parser.add_argument("--memory", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.load_scores(SQLiteScoreStore(os.path.join(tmp, "scores.db")))
+        path = os.path.join(tmp, "state.db")
+        started = time.perf_counter()
+        fill(path, args.sessions)
+        print(f"сессий: {args.sessions}, файл {os.path.getsize(path) / 2**20:.0f} МБ "
+              f"(заполнен за {time.perf_counter() - started:.1f} с)")
+        runs = (
+            ("всё при запуске", False, False),
+            ("лениво, построчно", True, False),
+            ("лениво, снимок", True, True),
+        )
+        for user_id, (name, lazy, snapshot) in enumerate(runs, 7):
+            if not snapshot:
+                drop_snapshots(path)
+            elapsed, first_update, resumed = asyncio.run(start(path, lazy, user_id))
+            line = (
+                f"{name:>18}: initialize {elapsed:6.3f} с, первый апдейт {first_update * 1000:5.2f} мс, "
+                f"викторина {'продолжилась' if resumed else 'НЕ продолжилась'}"
+            )
+            if args.memory:
+                line += f", память {asyncio.run(measure_memory(path, lazy)) / 2**20:.1f} МБ"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
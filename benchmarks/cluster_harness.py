@@ -0,0 +1,152 @@
+"""
+Проверка режима нескольких воркеров (cluster.py) на смоделированном потоке апдейтов.
+
+USERS игроков проходят викторину целиком; их апдейты перемешиваются
+(с сохранением порядка внутри каждого игрока) и идут через Router
+в WORKERS процессов с общими SQLite-хранилищами и фейковым Bot API.
+После остановки проверяется, что ни одна сессия не потерялась
+и не задвоилась:
+
+* все ответы игроку пришли из одного воркера;
+* у каждого игрока ровно одна завершённая викторина и ни одного
+  «Пожалуйста, выберите…» (то есть апдейты не перепутались местами);
+* очки в общем хранилище совпадают с числом ответов «Верно!»;
+* разговор каждого игрока сохранён в состоянии MAIN_MENU.
+
+    python benchmarks/cluster_harness.py [--workers 4] [--users 200]
+"""
+import argparse
+import json
+import os
+import pickle
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import bot  # noqa: E402
+import cluster  # noqa: E402
+from fakebot import FakeRequest, player_script, text_update  # noqa: E402
+from persistence import SQLitePersistence  # noqa: E402
+from storage import SQLiteScoreStore  # noqa: E402
+from webhook import running  # noqa: E402
+
+
+def harness_worker(index, workers, queue, results, state_db, scores_db):
+    import asyncio
+
+    # Фейковый Bot API лимитов не держит — не тормозим отправку
+    bot.OUTBOX_GLOBAL_RATE = bot.OUTBOX_CHAT_RATE = bot.OUTBOX_CHAT_BURST = 10**6
+    # Апдейты идут без пауз; флуд здесь не моделируется
+    bot.throttle = None
+    bot.load_scores(SQLiteScoreStore(scores_db))
+    bot.ANSWER_LOG = os.path.join(os.path.dirname(scores_db), f"answers.log.{index}")
+    request = FakeRequest()
+    application = bot.build_application(
+        "1:fake", persistence=SQLitePersistence(state_db, partition=(index, workers)), request=request
+    )
+
+    async def run():
+        async with running(application):
+            await cluster.serve_partition(application, queue)
+
+    asyncio.run(run())
+    results.put((index, request.texts_by_chat()))
+
+
+def interleave(scripts, rng):
+    """Перемешать апдейты игроков, сохранив порядок внутри каждого."""
+    pending = {user_id: list(reversed(script)) for user_id, script in scripts.items()}
+    while pending:
+        user_id = rng.choice(list(pending))
+        yield user_id, pending[user_id].pop()
+        if not pending[user_id]:
+            del pending[user_id]
+
+
+def check(texts_by_worker, users, state_db, scores_db):
+    errors = []
+    owner = {}
+    texts = {}
+    for index, chats in texts_by_worker.items():
+        for chat_id, chat_texts in chats.items():
+            if chat_id in owner:
+                errors.append(f"игрок {chat_id} обслуживался воркерами {owner[chat_id]} и {index}")
+            owner[chat_id] = index
+            texts[chat_id] = chat_texts
+
+    scores = SQLiteScoreStore(scores_db).load_all()
+    conn = sqlite3.connect(state_db)
+    states = {
+        # Целые состояния SQLitePersistence хранит без pickle
+        tuple(json.loads(key)): pickle.loads(state) if isinstance(state, bytes) else state
+        for key, state in conn.execute("SELECT key, state FROM conversations WHERE name = 'quiz'")
+    }
+    for user_id in users:
+        chat_texts = texts.get(user_id, [])
+        # Очередь отправки склеивает сообщения, поэтому считаем вхождения
+        finished = sum(t.count("Викторина завершена") for t in chat_texts)
+        if finished != 1:
+            errors.append(f"игрок {user_id}: завершённых викторин {finished}")
+        if any("Пожалуйста, выберите" in t for t in chat_texts):
+            errors.append(f"игрок {user_id}: апдейты обработаны не по порядку")
+        correct = sum(t.count("Верно! +1 очко.") for t in chat_texts)
+        stored = scores.get(str(user_id), {}).get("score")
+        if stored != correct:
+            errors.append(f"игрок {user_id}: в хранилище {stored} очков, верных ответов {correct}")
+        if states.get((user_id, user_id)) != bot.MAIN_MENU:
+            errors.append(f"игрок {user_id}: сохранённое состояние {states.get((user_id, user_id))}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        state_db = os.path.join(tmp, "state.db")
+        scores_db = os.path.join(tmp, "scores.db")
+        import multiprocessing
+
+        results = multiprocessing.get_context("spawn").Queue()
+        router, processes = cluster.start_workers(
+            args.workers,
+            harness_worker,
+            lambda index, queue: (index, args.workers, queue, results, state_db, scores_db),
+        )
+
+        users = list(range(1000, 1000 + args.users))
+        # Без «Лучших игроков» в конце: топ зависит от того, успели ли воркеры обменяться очками
+        scripts = {user_id: player_script(user_id, bot.question_bank, rng)[:-1] for user_id in users}
+        start = time.perf_counter()
+        sent = 0
+        for user_id, text in interleave(scripts, rng):
+            router.dispatch(text_update(user_id, text))
+            sent += 1
+        router.close()
+        texts_by_worker = dict(results.get() for _ in processes)
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        errors = check(texts_by_worker, users, state_db, scores_db)
+
+    print(f"воркеров: {args.workers}, игроков: {args.users}, апдейтов: {sent}, {elapsed:.2f} с "
+          f"({sent / elapsed:,.0f} апдейтов/с)")
+    if errors:
+        print(f"ошибок: {len(errors)}")
+        for error in errors[:20]:
+            print("  " + error)
+        sys.exit(1)
+    print("все сессии на месте, дублей нет")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Фейковый Bot API для бенчмарков: отвечает на запросы сразу, ничего не
+отправляя в сеть, и запоминает все вызовы.
+"""
+import json
+import time
+
+from question_bank import QUIZ_LENGTH
+from telegram.request import BaseRequest
+
+
+class FakeRequest(BaseRequest):
+    """Подставляется в ApplicationBuilder().request(...) вместо HTTPXRequest."""
+
+    def __init__(self, record=True, flood_every=0, retry_after=1, blocked=None, on_send=None):
+        self.record = record
+        # Каждый flood_every-й sendMessage отвечает 429 (0 — никогда)
+        self.flood_every = flood_every
+        self.retry_after = retry_after
+        # blocked(chat_id) -> True: игрок заблокировал бота, sendMessage отвечает 403
+        self.blocked = blocked
+        # on_send(chat_id) — после каждого успешного sendMessage (для проверок без record)
+        self.on_send = on_send
+        self.flooded = 0
+        self.calls = []
+        self.counts = {}
+        # {chat_id: message_id последнего отправленного сообщения}
+        self.last_message_ids = {}
+        self._message_id = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.counts[api_method] = self.counts.get(api_method, 0) + 1
+        if self.flood_every and api_method == "sendMessage" and self.counts[api_method] % self.flood_every == 0:
+            self.flooded += 1
+            return 429, json.dumps({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }).encode()
+        if self.blocked is not None and api_method == "sendMessage" and self.blocked(int(params["chat_id"])):
+            return 403, json.dumps({
+                "ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user",
+            }).encode()
+        if self.record:
+            self.calls.append((api_method, params, time.monotonic()))
+        if self.on_send is not None and api_method == "sendMessage":
+            self.on_send(int(params["chat_id"]))
+        if api_method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Bot", "username": "volley_quiz_bot"}
+        elif api_method in ("sendMessage", "editMessageText"):
+            self._message_id += 1
+            chat_id = params.get("chat_id", 0)
+            if api_method == "sendMessage":
+                self.last_message_ids[int(chat_id)] = self._message_id
+            result = {
+                "message_id": params.get("message_id", self._message_id),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "supergroup" if int(chat_id) < 0 else "private"},
+                "text": params.get("text", ""),
+            }
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+    def texts_by_chat(self):
+        """{chat_id: [тексты отправленных сообщений по порядку]}."""
+        texts = {}
+        for api_method, params, _ in self.calls:
+            if api_method in ("sendMessage", "editMessageText"):
+                texts.setdefault(params["chat_id"], []).append(params.get("text", ""))
+        return texts
+
+
+_update_id = 0
+
+
+def _chat(chat_id):
+    # Как в Telegram: у групп id отрицательные
+    return {"id": chat_id, "type": "supergroup", "title": "Группа"} if chat_id < 0 else {"id": chat_id, "type": "private"}
+
+
+def text_update(user_id, text, language_code="ru", chat_id=None):
+    """JSON апдейта с текстовым сообщением от игрока user_id (по умолчанию — в личном чате)."""
+    global _update_id
+    _update_id += 1
+    message = {
+        "message_id": _update_id,
+        "date": int(time.time()),
+        "chat": _chat(user_id if chat_id is None else chat_id),
+        "from": {"id": user_id, "is_bot": False, "first_name": "Игрок", "language_code": language_code},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": _update_id, "message": message}
+
+
+def callback_update(user_id, chat_id, message_id, data):
+    """JSON апдейта с нажатием inline-кнопки сообщения message_id в чате chat_id."""
+    global _update_id
+    _update_id += 1
+    return {
+        "update_id": _update_id,
+        "callback_query": {
+            "id": str(_update_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": f"Игрок {user_id}"},
+            "chat_instance": str(chat_id),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": _chat(chat_id),
+                "from": {"id": 1, "is_bot": True, "first_name": "Bot"},
+                "text": "",
+            },
+        },
+    }
+
+
+def player_steps(user_id, question_bank, rng):
+    """
+    Игрок проходит викторину целиком: [(шаг, текст сообщения)] — старт, меню,
+    имя, категория, ответы (случайные варианты), возврат в меню и топ.
+    """
+    category = rng.choice(list(question_bank.by_title.values()))
+    options = sorted({opt for q in category.questions for opt in q.options})
+    steps = [
+        ("start", "/start"),
+        ("menu", "Начать викторину"),
+        ("name", f"Игрок {user_id}"),
+        ("category", category.title),
+    ]
+    steps += [("answer", rng.choice(options)) for _ in range(min(len(category.questions), QUIZ_LENGTH))]
+    return steps + [("back", "Вернуться в меню"), ("leaderboard", "Лучшие игроки")]
+
+
+def player_script(user_id, question_bank, rng):
+    """То же, что player_steps, — только тексты сообщений."""
+    return [text for _, text in player_steps(user_id, question_bank, rng)]
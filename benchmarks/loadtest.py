@@ -0,0 +1,172 @@
+"""
+Нагрузочный тест диалога викторины на настоящих обработчиках.
+
+USERS смоделированных игроков проходят весь путь start_command ->
+main_menu_handler -> ask_name -> choose_category -> check_answer x N ->
+end_quiz -> «Лучшие игроки» через Application.process_update с фейковым
+Bot API (без сети). Игроки идут параллельно: CONCURRENCY задач, каждая
+ведёт своих игроков по порядку, так что ConversationHandler видит
+вперемешку апдейты тысяч разных сессий.
+
+Результат — JSON: апдейты в секунду, p50/p95/p99 задержки обработки
+(всего и по этапам), память на активную сессию. С --compare печатается
+разница с ранее сохранённым результатом.
+
+    python benchmarks/loadtest.py --users 5000 --output results.json
+    python benchmarks/loadtest.py --compare results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import bot  # noqa: E402
+from fakebot import FakeRequest, player_steps, text_update  # noqa: E402
+from persistence import SQLitePersistence  # noqa: E402
+from storage import SQLiteScoreStore  # noqa: E402
+from telegram import Update  # noqa: E402
+
+STAGES = ("start", "menu", "name", "category", "answer", "back", "leaderboard")
+# Чем больше — тем хуже; для --compare
+LOWER_IS_BETTER = ("p50_us", "p95_us", "p99_us", "memory_per_session_bytes")
+
+
+def percentiles(samples_ns):
+    if not samples_ns:
+        return {}
+    samples = sorted(samples_ns)
+
+    def pick(q):
+        return samples[min(len(samples) - 1, int(q * len(samples)))] / 1000
+
+    return {
+        "count": len(samples),
+        "p50_us": round(pick(0.50), 1),
+        "p95_us": round(pick(0.95), 1),
+        "p99_us": round(pick(0.99), 1),
+        "max_us": round(samples[-1] / 1000, 1),
+    }
+
+
+async def drive(application, scripts, concurrency):
+    latencies = {stage: [] for stage in STAGES}
+    queue = list(scripts.items())
+    random.Random(0).shuffle(queue)
+    perf = time.perf_counter_ns
+
+    async def player_task():
+        while queue:
+            user_id, script = queue.pop()
+            for stage, text in script:
+                update = Update.de_json(text_update(user_id, text), application.bot)
+                start = perf()
+                await application.process_update(update)
+                latencies[stage].append(perf() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(player_task() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started
+
+
+async def measure_session_memory(application, users, rng):
+    """Память на сессию: сколько прибавилось после того, как users игроков начали викторину."""
+    scripts = {900_000_000 + i: player_steps(900_000_000 + i, bot.question_bank, rng)[:4] for i in range(users)}
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for user_id, script in scripts.items():
+        for _, text in script:
+            await application.process_update(Update.de_json(text_update(user_id, text), application.bot))
+    grown = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return grown // users
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    tmp = tempfile.TemporaryDirectory()
+    # Сценарии игроков идут без пауз — нагрузку на обработчики не режем
+    bot.throttle = None
+    bot.load_scores(SQLiteScoreStore(os.path.join(tmp.name, "scores.db")))
+    persistence = SQLitePersistence(os.path.join(tmp.name, "state.db")) if args.persistence else None
+    application = bot.build_application("1:fake", persistence=persistence, request=FakeRequest(record=False))
+
+    scripts = {1_000_000 + i: player_steps(1_000_000 + i, bot.question_bank, rng) for i in range(args.users)}
+    async with application:
+        latencies, elapsed = await drive(application, scripts, args.concurrency)
+        memory = await measure_session_memory(application, args.memory_sessions, rng)
+        if persistence is not None:
+            await application.update_persistence()
+    tmp.cleanup()
+
+    all_latencies = [ns for samples in latencies.values() for ns in samples]
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "users": args.users,
+        "concurrency": args.concurrency,
+        "persistence": args.persistence,
+        "updates": len(all_latencies),
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(len(all_latencies) / elapsed, 1),
+        "latency": percentiles(all_latencies),
+        "latency_by_stage": {stage: percentiles(samples) for stage, samples in latencies.items()},
+        "memory_per_session_bytes": memory,
+    }
+
+
+def compare(current, baseline):
+    rows = [("updates_per_s", current["updates_per_s"], baseline["updates_per_s"])]
+    for key in ("p50_us", "p95_us", "p99_us"):
+        rows.append((key, current["latency"][key], baseline["latency"][key]))
+    rows.append(("memory_per_session_bytes", current["memory_per_session_bytes"],
+                 baseline["memory_per_session_bytes"]))
+    print(f"сравнение с {baseline.get('revision') or 'базовым результатом'}:")
+    for key, now, before in rows:
+        change = (now - before) / before * 100 if before else 0.0
+        worse = change > 0 if key in LOWER_IS_BETTER else change < 0
+        print(f"  {key:>26}: {before:>12} -> {now:>12} ({change:+.1f}%{' хуже' if worse and abs(change) > 5 else ''})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--memory-sessions", type=int, default=2000)
+    parser.add_argument("--persistence", action="store_true", help="со SQLitePersistence во временном файле")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="куда сохранить JSON с результатом")
+    parser.add_argument("--compare", help="JSON предыдущего запуска для сравнения")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,46 @@
+# Первым: время запуска считается с этого импорта (см. startup.py)
+from startup import STARTUP
+
+import argparse
+import asyncio
+import datetime
 import logging
 import os
 import random
+import time
+import warnings
+from zoneinfo import ZoneInfo
 
-from telegram import (
-    Update, 
-    ReplyKeyboardMarkup, 
-    ReplyKeyboardRemove,
-    InlineKeyboardButton,
-    InlineKeyboardMarkup
-)
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update, ReplyKeyboardRemove
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
     MessageHandler,
     ConversationHandler,
+    CallbackQueryHandler,
+    TypeHandler,
     filters,
     ContextTypes,
-    PicklePersistence
 )
+from telegram.error import TelegramError
+from telegram.warnings import PTBUserWarning
+
+from analytics import AnswerLog, question_key
+from group import CALLBACK_PATTERN, GroupGame, parse_callback
+import messages
+from leaderboard import PERIODS, Leaderboard, PeriodLeaderboards
+from metrics import REGISTRY, SESSIONS_EXPIRED, Gauge, instrument, metrics_route
+from outbound import Outbox
+from persistence import SQLitePersistence
+from question_bank import ANSWER_CALLBACK_PATTERN, QuestionBank, parse_answer_callback
+from rating import Ratings
+from sessions import SessionReaper
+from storage import open_score_store
+from throttle import Throttle, ThrottledApplication
+# webhook и broadcast импортируются там, где нужны: в polling-режиме без
+# METRICS_PORT HTTP-сервер не поднимается, а рассылка идёт раз в день
+
+STARTUP.mark("imports")
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -29,287 +52,140 @@ logger = logging.getLogger(__name__)
 # Состояния
 # -------------------------
 MAIN_MENU, ASK_NAME, CHOOSE_CATEGORY, ASK_QUESTION = range(4)
+STATE_NAMES = {
+    MAIN_MENU: "main_menu",
+    ASK_NAME: "ask_name",
+    CHOOSE_CATEGORY: "choose_category",
+    ASK_QUESTION: "ask_question",
+}
 
 # -------------------------
 # Храним очки игроков в памяти (словарь).
 # -------------------------
 # Формат: scoreboard[user_id] = {"username": "...", "score": <int>}
 scoreboard = {}
+# Индекс лучших игроков: обновляется в ask_name и end_quiz
+leaderboard = Leaderboard(scoreboard)
+# Таблицы за сегодня и за неделю (см. leaderboard.PeriodLeaderboards): все
+# начисления идут через credit_scores и попадают и в общую таблицу, и в них.
+# Периоды считаются в часовом поясе LEADERBOARD_TZ и сменяются заданием
+# rotate_periods в полночь.
+LEADERBOARD_TZ = ZoneInfo(os.environ.get("LEADERBOARD_TZ", "Europe/Moscow"))
+periods = PeriodLeaderboards(scoreboard, now=datetime.datetime.now(LEADERBOARD_TZ))
+# Долговременное хранилище очков (см. storage.py); открывается в main().
+# Изменения копятся в нём и сбрасываются пачкой раз в SCORE_FLUSH_INTERVAL секунд.
+score_store = None
+SCORE_FLUSH_INTERVAL = int(os.environ.get("SCORE_FLUSH_INTERVAL", "5"))
+# Когда воркеров несколько (см. cluster.py), каждый видит в памяти только
+# свои начисления; раз в SCOREBOARD_SYNC_INTERVAL секунд из хранилища
+# забираются строки, изменённые с прошлой синхронизации (с запасом
+# SCOREBOARD_SYNC_OVERLAP секунд на транзакции, которые ещё шли). Слияние
+# идемпотентно, так что прочитать строку дважды не страшно. 0 — не
+# перечитывать (один процесс).
+SCOREBOARD_SYNC_INTERVAL = int(os.environ.get("SCOREBOARD_SYNC_INTERVAL", "0"))
+SCOREBOARD_SYNC_OVERLAP = 30
+scores_synced_at = None
 
 # -------------------------
-# Полный список из 40 вопросов (2 категории)
+# Банк вопросов (см. question_bank.py)
 # -------------------------
-quiz_data = {
-    "Правила волейбола \U0001F3D0": [
-        {
-            "question": "1. Какой размер площадки для классического волейбола?",
-            "options": ["9 м x 9 м", "18 м x 9 м", "16 м x 8 м", "20 м x 10 м"],
-            "answer": "18 м x 9 м",
-            "explanation": "По официальным правилам FIVB длина классической площадки 18 м, ширина – 9 м."
-        },
-        {
-            "question": "2. Сколько игроков находится на площадке в одной команде в классическом волейболе?",
-            "options": ["4", "5", "6", "7"],
-            "answer": "6",
-            "explanation": "В классическом формате на площадке в каждой команде играют по 6 человек (плюс запасные)."
-        },
-        {
-            "question": "3. Какой максимальный вес разрешён для мяча в волейболе?",
-            "options": ["250 г", "280 г", "300 г", "320 г"],
-            "answer": "280 г",
-            "explanation": "Вес официального мяча должен быть в диапазоне 260–280 г."
-        },
-        {
-            "question": "4. Сколько очков нужно набрать, чтобы выиграть сет в классическом волейболе?",
-            "options": ["15", "21", "25", "30"],
-            "answer": "25",
-            "explanation": "Необходимо набрать минимум 25 очков с разницей в 2."
-        },
-        {
-            "question": "5. Какая высота сетки для мужского классического волейбола?",
-            "options": ["2.24 м", "2.35 м", "2.43 м", "2.50 м"],
-            "answer": "2.43 м",
-            "explanation": "Высота сетки для мужчин — 2,43 м."
-        },
-        {
-            "question": "6. Сколько тайм-аутов разрешено каждой команде в одном сете?",
-            "options": ["1", "2", "3", "4"],
-            "answer": "2",
-            "explanation": "В классическом сете обычно два 30-секундных тайм-аута."
-        },
-        {
-            "question": "7. Сколько касаний мяча разрешено одной команде до передачи через сетку?",
-            "options": ["2", "3", "4", "5"],
-            "answer": "3",
-            "explanation": "Команда имеет право на максимум три касания (не считая блок)."
-        },
-        {
-            "question": "8. Какой размер площадки для пляжного волейбола?",
-            "options": ["8 м x 8 м", "9 м x 9 м", "16 м x 8 м", "18 м x 9 м"],
-            "answer": "16 м x 8 м",
-            "explanation": "В пляжном волейболе площадка 16×8 м, меньше классической."
-        },
-        {
-            "question": "9. Сколько игроков в команде на площадке в пляжном волейболе?",
-            "options": ["2", "3", "4", "6"],
-            "answer": "2",
-            "explanation": "Пляжный волейбол играется 2 на 2, без запасных."
-        },
-        {
-            "question": "10. В каком случае команде начисляется очко?",
-            "options": [
-                "Мяч касается пола соперника",
-                "Мяч выходит за пределы от соперника",
-                "Нарушение правил соперником",
-                "Все вышеуказанные"
-            ],
-            "answer": "Все вышеуказанные",
-            "explanation": "Очко при любой ошибке соперника или попадании мяча на его сторону."
-        },
-        {
-            "question": "11. Какая высота сетки в женском пляжном волейболе?",
-            "options": ["2.10 м", "2.15 м", "2.24 м", "2.43 м"],
-            "answer": "2.24 м",
-            "explanation": "У женщин в пляжном волейболе сетка 2,24 м."
-        },
-        {
-            "question": "12. Какой максимальный счёт может быть в сете, если разница очков не достигает двух?",
-            "options": ["25", "30", "35", "Неограниченный"],
-            "answer": "Неограниченный",
-            "explanation": "Сет продолжается, пока не будет +2 очка."
-        },
-        {
-            "question": "13. Что означает термин «блок»?",
-            "options": [
-                "Удар по мячу снизу",
-                "Перекрытие пути мячу возле сетки",
-                "Защитный пас",
-                "Ошибка при подаче"
-            ],
-            "answer": "Перекрытие пути мячу возле сетки",
-            "explanation": "Блок – это попытка игроков передней линии перекрыть атаку соперника."
-        },
-        {
-            "question": "14. Какова минимальная температура для проведения соревнований по снежному волейболу?",
-            "options": ["-5 °C", "-10 °C", "-15 °C", "-20 °C"],
-            "answer": "-10 °C",
-            "explanation": "Обычно порог -10 °C устанавливается для снежного волейбола."
-        },
-        {
-            "question": "15. Сколько игроков в одной команде в снежном волейболе?",
-            "options": ["2", "3", "4", "5"],
-            "answer": "3",
-            "explanation": "В снежном волейболе играет по три человека в команде."
-        },
-        {
-            "question": "16. Сколько сетов играют в классическом волейболе для определения победителя?",
-            "options": ["3", "4", "5", "6"],
-            "answer": "5",
-            "explanation": "Матч идёт до 3 выигранных сетов, максимум 5."
-        },
-        {
-            "question": "17. Сколько длится технический перерыв в классическом волейболе?",
-            "options": ["30 секунд", "60 секунд", "90 секунд", "120 секунд"],
-            "answer": "60 секунд",
-            "explanation": "Технические перерывы ранее были по 60 секунд (при 8 и 16 очках)."
-        },
-        {
-            "question": "18. Что происходит, если мяч касается линии площадки?",
-            "options": [
-                "Мяч считается в ауте",
-                "Мяч считается в игре",
-                "Игроки должны остановить игру",
-                "Судья принимает решение"
-            ],
-            "answer": "Мяч считается в игре",
-            "explanation": "Касание линий считается попаданием в поле."
-        },
-        {
-            "question": "19. Каково максимальное время для подачи после свистка судьи?",
-            "options": ["5 секунд", "8 секунд", "10 секунд", "12 секунд"],
-            "answer": "8 секунд",
-            "explanation": "Игрок имеет 8 секунд на подачу."
-        },
-        {
-            "question": "20. Может ли либеро атаковать из передней зоны?",
-            "options": [
-                "Нет, никогда",
-                "Да, только если мяч ниже уровня сетки",
-                "Да, без ограничений",
-                "Нет, но может выполнять передачи"
-            ],
-            "answer": "Да, только если мяч ниже уровня сетки",
-            "explanation": "Либеро не может атаковать выше верхнего края сетки."
-        },
-    ],
-    "История волейбола \U0001F4D6": [
-        {
-            "question": "21. Кто считается основателем волейбола?",
-            "options": ["Джеймс Нейсмит", "Уильям Дж. Морган", "Пьер де Кубертен", "Джордж Фишер"],
-            "answer": "Уильям Дж. Морган",
-            "explanation": "Уильям Морган создал эту игру в 1895 году, работая в YMCA."
-        },
-        {
-            "question": "22. В каком году был изобретён волейбол?",
-            "options": ["1891", "1895", "1900", "1912"],
-            "answer": "1895",
-            "explanation": "В 1895 году Морган провёл первую демонстрацию «минтонета»."
-        },
-        {
-            "question": "23. Как первоначально называлась игра, придуманная Уильямом Морганом?",
-            "options": ["Бадминтон", "Теннибол", "Минтонет", "Сферобол"],
-            "answer": "Минтонет",
-            "explanation": "Первоначальное название «минтонет», позже сменили на «волейбол»."
-        },
-        {
-            "question": "24. Кто изобрёл баскетбол, что позже вдохновило Моргана на создание волейбола?",
-            "options": ["Джеймс Нейсмит", "Альфред Халстед", "Пьер де Кубертен", "Генри Морган"],
-            "answer": "Джеймс Нейсмит",
-            "explanation": "Нейсмит изобрёл баскетбол в 1891, Морган вдохновился и сделал волейбол."
-        },
-        {
-            "question": "25. В каком году волейбол официально вошёл в программу Олимпийских игр?",
-            "options": ["1924", "1948", "1964", "1988"],
-            "answer": "1964",
-            "explanation": "В Токио-1964 волейбол стал олимпийским."
-        },
-        {
-            "question": "26. В какой стране прошли первые Олимпийские игры, на которых был представлен волейбол?",
-            "options": ["Япония", "Бразилия", "США", "Мексика"],
-            "answer": "Япония",
-            "explanation": "Олимпиада 1964 года прошла в Токио (Япония)."
-        },
-        {
-            "question": "27. Какой международный орган управляет волейболом во всём мире?",
-            "options": ["ФИФА (FIFA)", "ФИВБ (FIVB)", "МОК (IOC)", "ФИБА (FIBA)"],
-            "answer": "ФИВБ (FIVB)",
-            "explanation": "Международная федерация волейбола (FIVB) регулирует этот спорт."
-        },
-        {
-            "question": "28. В каком году была основана Международная федерация волейбола (FIVB)?",
-            "options": ["1895", "1908", "1947", "1952"],
-            "answer": "1947",
-            "explanation": "FIVB учреждена в 1947 году после Второй мировой войны."
-        },
-        {
-            "question": "29. Где находится штаб-квартира Международной федерации волейбола (FIVB)?",
-            "options": ["Лозанна (Швейцария)", "Париж (Франция)", "Нью-Йорк (США)", "Монреаль (Канада)"],
-            "answer": "Лозанна (Швейцария)",
-            "explanation": "Многие спортивные федерации располагаются в Лозанне."
-        },
-        {
-            "question": "30. Какая страна считалась одной из ведущих по развитию волейбола в первой половине XX века?",
-            "options": ["Испания", "Россия (СССР)", "Египет", "Великобритания"],
-            "answer": "Россия (СССР)",
-            "explanation": "СССР активно развивал волейбол и добивался высоких результатов."
-        },
-        {
-            "question": "31. В каком году прошёл первый официальный чемпионат мира по волейболу среди мужчин?",
-            "options": ["1949", "1952", "1956", "1960"],
-            "answer": "1949",
-            "explanation": "Первый ЧМ состоялся в Праге (Чехословакия)."
-        },
-        {
-            "question": "32. Когда в СССР состоялся первый чемпионат страны по волейболу среди мужчин?",
-            "options": ["1923", "1933", "1938", "1947"],
-            "answer": "1933",
-            "explanation": "В 1933 году прошёл первый всесоюзный чемпионат."
-        },
-        {
-            "question": "33. Каково было первоначальное количество игроков на площадке в самой ранней версии волейбола?",
-            "options": [
-                "Не было чёткого ограничения",
-                "По 6 человек с каждой стороны",
-                "По 9 человек с каждой стороны",
-                "По 4 человека с каждой стороны"
-            ],
-            "answer": "Не было чёткого ограничения",
-            "explanation": "Морган не оговаривал точного числа участников."
-        },
-        {
-            "question": "34. В каком году впервые провели Кубок мира по волейболу?",
-            "options": ["1959", "1965", "1969", "1977"],
-            "answer": "1969",
-            "explanation": "Кубок мира FIVB впервые состоялся в 1969 году."
-        },
-        {
-            "question": "35. Какая страна является рекордсменом по количеству побед на мужских чемпионатах мира?",
-            "options": ["Бразилия", "СССР / Россия", "США", "Италия"],
-            "answer": "СССР / Россия",
-            "explanation": "Советская/российская сборная чаще всего становилась чемпионом мира."
-        },
-        {
-            "question": "36. Кто стал первым олимпийским чемпионом в мужском волейболе на Играх 1964 года?",
-            "options": ["Япония", "Польша", "СССР", "США"],
-            "answer": "СССР",
-            "explanation": "На дебютном олимпийском волейбольном турнире в 1964 золото взяла СССР."
-        },
-        {
-            "question": "37. В каком году пляжный волейбол был впервые включён в программу Олимпийских игр?",
-            "options": ["1984", "1992", "1996", "2000"],
-            "answer": "1996",
-            "explanation": "Пляжный волейбол дебютировал на Олимпиаде-1996 (Атланта, США)."
-        },
-        {
-            "question": "38. Где прошёл первый официальный чемпионат мира по пляжному волейболу?",
-            "options": ["Лос-Анджелес (США)", "Рио-де-Жанейро (Бразилия)", "Марсель (Франция)", "Майами (США)"],
-            "answer": "Рио-де-Жанейро (Бразилия)",
-            "explanation": "Бразилия — одна из сильнейших стран в пляжном волейболе, ЧМ провели там."
-        },
-        {
-            "question": "39. В каком году состоялся первый чемпионат мира по волейболу среди женщин?",
-            "options": ["1949", "1952", "1956", "1957"],
-            "answer": "1952",
-            "explanation": "Женский ЧМ впервые прошёл в 1952 году в Москве (СССР)."
-        },
-        {
-            "question": "40. Когда в официальных правилах волейбола появилась позиция «либеро»?",
-            "options": ["1994", "1996", "1998", "2000"],
-            "answer": "1998",
-            "explanation": "Позицию либеро ввели в 1998 году, чтобы усилить игру в защите."
-        },
-    ]
-}
+# Вопросы загружаются из паков в каталоге QUESTION_PACKS_DIR (JSON/CSV)
+# и перечитываются на лету, если паки поменялись. Обработчики всегда берут
+# текущий question_bank; в user_data сессия хранит номер категории
+# и компактный порядок вопросов ("order").
+PACKS_DIR = os.environ.get(
+    "QUESTION_PACKS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "packs")
+)
+PACKS_RELOAD_INTERVAL = int(os.environ.get("PACKS_RELOAD_INTERVAL", "30"))
+with STARTUP.phase("question_bank"):
+    question_bank = QuestionBank.load(PACKS_DIR)
+
+# Как подбирать вопросы в личной викторине: "adaptive" — следующий вопрос
+# по рейтингу игрока (см. rating.py), "random" — случайный порядок сразу
+# на всю викторину. Рейтинги обновляются в обоих режимах.
+ADAPTIVE_QUIZ = os.environ.get("QUIZ_SELECTION", "adaptive") == "adaptive"
+ratings = Ratings()
+
+# asked_at — когда задан текущий вопрос (time.time()), для времени ответа в журнале;
+# quiz_nonce — случайное число викторины в callback_data inline-кнопок
+SESSION_KEYS = (
+    "category", "category_version", "order", "current_question_index", "score_this_round", "asked_at", "quiz_nonce",
+)
+
+# -------------------------
+# Журнал ответов (см. analytics.py)
+# -------------------------
+# Каждый ответ в личной викторине и в групповом раунде дописывается
+# в ANSWER_LOG записью фиксированной длины; статистику по нему считает
+# `python analytics.py answers.log`. Пустое значение — не вести журнал.
+# Журнал старого формата бот не дописывает и не запускается — его надо переименовать.
+ANSWER_LOG = os.environ.get("ANSWER_LOG", "answers.log")
+answer_log = None
+
+# Как задавать вопросы в личке: "reply" — сообщение с обычной клавиатурой
+# на каждый вопрос и ответ текстом; "inline" — одно сообщение с inline-кнопками,
+# которое редактируется на месте (вердикт + следующий вопрос), а ответ
+# приходит индексом варианта в callback_data.
+INLINE_QUIZ = os.environ.get("QUIZ_KEYBOARD", "reply") == "inline"
+
+# Тексты ответов и клавиатуры меню — в messages.py, на языке игрока:
+# texts(update) возвращает каталог, где всё уже скомпилировано.
+texts = messages.for_update
+REMOVE_KEYBOARD = ReplyKeyboardRemove()
+
+# -------------------------
+# Защита от флуда (см. throttle.py)
+# -------------------------
+# Апдейты игрока сверх THROTTLE_BURST подряд и THROTTLE_RATE в секунду,
+# повторные нажатия кнопок ответа и тексты длиннее MAX_UPDATE_TEXT
+# отбрасываются до обработчиков. THROTTLE_RATE=0 — не ограничивать.
+# Имя игрока — не длиннее NAME_MAX_LENGTH.
+THROTTLE_RATE = float(os.environ.get("THROTTLE_RATE", "1"))
+THROTTLE_BURST = int(os.environ.get("THROTTLE_BURST", "10"))
+THROTTLE_MAX_USERS = int(os.environ.get("THROTTLE_MAX_USERS", "100000"))
+MAX_UPDATE_TEXT = int(os.environ.get("MAX_UPDATE_TEXT", "512"))
+NAME_MAX_LENGTH = int(os.environ.get("NAME_MAX_LENGTH", "32"))
+# Кнопки ответа викторины и группового раунда; повтор ответа на ежедневный
+# вопрос отсеивает хранилище (record_broadcast_answer)
+THROTTLE_ANSWER_PATTERN = f"{ANSWER_CALLBACK_PATTERN}|{CALLBACK_PATTERN}"
+throttle = Throttle(
+    rate=THROTTLE_RATE, burst=THROTTLE_BURST, max_users=THROTTLE_MAX_USERS, max_text=MAX_UPDATE_TEXT,
+    answer_pattern=THROTTLE_ANSWER_PATTERN,
+) if THROTTLE_RATE else None
+
+def clear_session(user_data):
+    for key in SESSION_KEYS:
+        user_data.pop(key, None)
+
+def session_question(user_data):
+    """
+    Текущий вопрос сессии (как question_bank.resolve). KeyError — категорию
+    убрали или её пак изменился с начала викторины: элементы order тогда
+    указывают на другие вопросы, и сессию надо сбросить.
+    """
+    category = question_bank.categories[user_data["category"]]
+    if category.version != user_data.get("category_version"):
+        raise KeyError(user_data["category"])
+    return question_bank.resolve(category.id, user_data["order"][user_data["current_question_index"]])
+
+# -------------------------
+# Отправка ответов
+# -------------------------
+# Ответы идут через очередь отправки (см. outbound.py): подряд идущие
+# сообщения в один чат склеиваются, лимиты Telegram соблюдаются, на 429
+# сообщение переотправляется. Очередь создаётся в post_init; без неё
+# (например, в бенчмарках без запуска Application) отвечаем напрямую.
+outbox = None
+OUTBOX_GLOBAL_RATE = float(os.environ.get("OUTBOX_GLOBAL_RATE", "30"))
+OUTBOX_CHAT_RATE = float(os.environ.get("OUTBOX_CHAT_RATE", "1"))
+OUTBOX_CHAT_BURST = int(os.environ.get("OUTBOX_CHAT_BURST", "3"))
+
+async def reply(update: Update, text, reply_markup=None):
+    if outbox is not None:
+        outbox.send(update.effective_chat.id, text, reply_markup)
+    else:
+        # У нажатия inline-кнопки update.message нет — отвечаем в чат её сообщения
+        await update.effective_message.reply_text(text, reply_markup=reply_markup)
 
 # -------------------------
 # /start — показ меню
@@ -321,8 +197,9 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # /cancel — прервать викторину (вернуться в меню)
 # -------------------------
 async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    context.user_data.clear()
-    await update.message.reply_text("Викторина прервана. Возвращаемся в главное меню!")
+    # Только состояние викторины: имя и рейтинг игрока остаются
+    clear_session(context.user_data)
+    await reply(update, texts(update).cancelled)
     return await show_main_menu(update, context)
 
 # -------------------------
@@ -335,107 +212,112 @@ async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     2) Лучшие игроки
     3) Наш магазин
     """
-    keyboard = [
-        ["Начать викторину"],
-        ["Лучшие игроки"],
-        ["Наш магазин"]
-    ]
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-    await update.message.reply_text(
-        "Выберите действие:",
-        reply_markup=reply_markup
-    )
+    t = texts(update)
+    await reply(update, t.choose_action, reply_markup=t.main_menu_keyboard)
     return MAIN_MENU
 
 async def main_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    choice = update.message.text.strip()
+    # Кнопки меню на любом из языков -> действие
+    choice = messages.MENU_ACTIONS.get(update.message.text.strip())
+    t = texts(update)
 
-    if choice == "Начать викторину":
+    if choice == "start":
         # Переходим к запросу имени
-        await update.message.reply_text("Отлично! Как тебя зовут?", reply_markup=ReplyKeyboardRemove())
+        await reply(update, t.ask_name, reply_markup=REMOVE_KEYBOARD)
         return ASK_NAME
 
-    elif choice == "Лучшие игроки":
-        # Формируем топ-10 из scoreboard
-        if not scoreboard:
-            text = "Пока никто не играл."
-        else:
-            # Сортируем по убыванию score
-            sorted_users = sorted(scoreboard.items(), key=lambda x: x[1]["score"], reverse=True)
-            top_10 = sorted_users[:10]
-            text = "Топ-10 игроков:\n"
-            for i, (uid, data) in enumerate(top_10, start=1):
-                text += f"{i}. {data['username']}: {data['score']}\n"
-
-        await update.message.reply_text(text)
+    elif choice == "top":
+        # Топ-10 берём из индекса (текст кэшируется до изменения топа);
+        # кнопки под ним переключают период (show_top_period)
+        await reply(update, top_text("all", update, t), reply_markup=t.top_periods_keyboard)
         return await show_main_menu(update, context)
 
-    elif choice == "Наш магазин":
+    elif choice == "shop":
         # Отправляем INLINE-кнопку (гибридный подход)
-        inline_keyboard = [
-            [InlineKeyboardButton(text="Открыть магазин", url="https://t.me/magaz_volley")]
-        ]
-        inline_markup = InlineKeyboardMarkup(inline_keyboard)
-        await update.message.reply_text(
-            text="Наш магазин в Telegram. Нажмите кнопку:",
-            reply_markup=inline_markup
-        )
+        await reply(update, t.shop, reply_markup=t.shop_markup)
         # Возвращаемся в меню (или просто оставим так)
         return await show_main_menu(update, context)
 
-    elif choice == "Вернуться в меню":
+    elif choice == "back":
         # Если пользователь нажал кнопку «Вернуться в меню» после викторины
         return await show_main_menu(update, context)
 
     else:
-        await update.message.reply_text("Пожалуйста, выберите пункт из меню.")
+        # Клавиатура нужна, если сюда попали после истечения сессии (см. expire_session)
+        await reply(update, t.pick_menu_item, reply_markup=t.main_menu_keyboard)
         return MAIN_MENU
 
+def top_text(period, update, t):
+    """Топ за период ("all" или один из leaderboard.PERIODS) и место игрока в нём."""
+    board = leaderboard if period == "all" else periods.boards[period]
+    text = board.render(t)
+    rank = board.rank(str(update.effective_user.id))
+    if rank is not None:
+        text += t.your_rank(rank=rank, total=len(board))
+    return text
+
+async def show_top_period(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопка периода под топом: сообщение с топом редактируется на месте."""
+    query = update.callback_query
+    period = query.data.split(":", 1)[1]
+    t = texts(update)
+    await query.answer()
+    try:
+        await query.edit_message_text(top_text(period, update, t), reply_markup=t.top_periods_keyboard)
+    except TelegramError as exc:
+        # Повторное нажатие той же кнопки: текст не изменился
+        if "not modified" not in str(exc):
+            raise
+
 # -------------------------
 # Логика регистрации имени -> выбор категории
 # -------------------------
 async def ask_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
     username_input = update.message.text.strip()
+    if len(username_input) > NAME_MAX_LENGTH:
+        # Имя хранится в scoreboard, user_data и базе и попадает в топ
+        await reply(update, texts(update).name_too_long(limit=NAME_MAX_LENGTH))
+        return ASK_NAME
 
     # Если пользователя нет — создадим
     if user_id not in scoreboard:
         scoreboard[user_id] = {"username": username_input, "score": 0}
+        leaderboard.add_player(user_id)
     else:
         scoreboard[user_id]["username"] = username_input
+        leaderboard.rename(user_id)
+        periods.rename(user_id)
+    score_store.set_username(user_id, username_input)
 
     context.user_data["username"] = username_input
 
     # Предлагаем выбрать категорию
-    categories = list(quiz_data.keys())  # ["Правила волейбола 🏐", "История волейбола 📖"]
-    cat_keyboard = [[cat] for cat in categories]
-
-    await update.message.reply_text(
-        f"Приятно познакомиться, {username_input}!\nВыберите категорию викторины:",
-        reply_markup=ReplyKeyboardMarkup(cat_keyboard, one_time_keyboard=True, resize_keyboard=True)
+    await reply(
+        update,
+        texts(update).greeting(name=username_input),
+        reply_markup=question_bank.category_keyboard
     )
     return CHOOSE_CATEGORY
 
 async def choose_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    category = update.message.text.strip()
-    if category not in quiz_data:
-        await update.message.reply_text("Пожалуйста, выберите категорию из списка.")
+    category = question_bank.by_title.get(update.message.text.strip())
+    if category is None:
+        await reply(update, texts(update).pick_category)
         return CHOOSE_CATEGORY
 
-    context.user_data["category"] = category
-
-    questions = quiz_data[category][:]
-    random.shuffle(questions)
-    for q in questions:
-        random.shuffle(q["options"])
-
-    context.user_data["questions"] = questions
+    context.user_data["category"] = category.id
+    context.user_data["category_version"] = category.version
+    if ADAPTIVE_QUIZ:
+        first = ratings.pick(context.user_data, category)
+        context.user_data["order"] = question_bank.adaptive_order(category, first)
+    else:
+        context.user_data["order"] = question_bank.new_order(category)
     context.user_data["current_question_index"] = 0
     context.user_data["score_this_round"] = 0
+    context.user_data["quiz_nonce"] = random.randrange(1 << 31)
 
-    await update.message.reply_text(
-        f"Вы выбрали категорию: {category}\nНачинаем викторину! Для отмены — /cancel."
-    )
+    await reply(update, texts(update).category_chosen(title=category.title))
     return await ask_question(update, context)
 
 # -------------------------
@@ -443,21 +325,21 @@ async def choose_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # -------------------------
 async def ask_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
     index = context.user_data["current_question_index"]
-    questions = context.user_data["questions"]
+    order = context.user_data["order"]
 
-    if index >= len(questions):
+    if index >= len(order):
         return await end_quiz(update, context)
 
-    question_data = questions[index]
-    question_text = question_data["question"]
-    options = question_data["options"]
-
-    # Клавиатура вариантов
-    keyboard = [[opt] for opt in options]
+    # Клавиатура вариантов уже собрана в банке для этого порядка ответов
+    question, keyboard = question_bank.resolve(
+        context.user_data["category"], order[index], INLINE_QUIZ, context.user_data.get("quiz_nonce", 0), index
+    )
+    context.user_data["asked_at"] = time.time()
 
-    await update.message.reply_text(
-        f"Вопрос {index+1}/{len(questions)}:\n{question_text}",
-        reply_markup=ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
+    await reply(
+        update,
+        texts(update).question(number=index + 1, total=len(order), text=question.text),
+        reply_markup=keyboard
     )
     return ASK_QUESTION
 
@@ -465,32 +347,100 @@ async def check_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
     user_answer = update.message.text.strip()
 
-    index = context.user_data["current_question_index"]
-    questions = context.user_data["questions"]
-    question_data = questions[index]
+    if "order" not in context.user_data:
+        # Сессии нет (например, сохранена в старом формате) — возвращаем в меню
+        clear_session(context.user_data)
+        return await show_main_menu(update, context)
 
-    correct_answer = question_data["answer"]
-    explanation = question_data["explanation"]
-    username = context.user_data["username"]
+    try:
+        question, _ = session_question(context.user_data)
+    except (KeyError, IndexError):
+        # Пак с этой категорией убрали или изменили, пока шла викторина
+        clear_session(context.user_data)
+        await reply(update, texts(update).quiz_changed)
+        return await show_main_menu(update, context)
 
-    if user_answer == correct_answer:
-        context.user_data["score_this_round"] += 1
-        reply_text = (
-            "Верно! +1 очко.\n"
-            f"Правильный ответ: {correct_answer}\n"
-            f"Пояснение: {explanation}"
-        )
-    else:
-        reply_text = (
-            "Неверно.\n"
-            f"Правильный ответ: {correct_answer}\n"
-            f"Пояснение: {explanation}"
+    option = question.option_index.get(user_answer)
+    await reply(update, record_answer(user_id, context.user_data, question, option, texts(update)))
+    return await ask_question(update, context)
+
+def record_answer(user_id, user_data, question, option, t=messages.DEFAULT):
+    """
+    Засчитать ответ (option — индекс варианта или None, если ответ не из
+    вариантов), записать его в журнал и перейти к следующему вопросу;
+    возвращает текст вердикта из каталога t.
+    """
+    correct = option == question.answer_index
+    category = question_bank.categories[user_data["category"]]
+    order = user_data["order"]
+    index = user_data["current_question_index"]
+    ratings.update(user_data, category, order[index] >> 8, question, correct)
+    if ADAPTIVE_QUIZ and index + 1 < len(order):
+        # Следующий вопрос — по уже обновлённому рейтингу игрока
+        asked = {packed >> 8 for packed in order[:index + 1]}
+        position = ratings.pick(user_data, category, asked)
+        if position is None:
+            # Незаданных вопросов не осталось (категорию сократили посреди викторины) —
+            # викторина заканчивается на этом вопросе
+            del order[index + 1:]
+        else:
+            order[index + 1] = question_bank.packed(category, position)
+    if answer_log is not None:
+        asked_at = user_data.get("asked_at")
+        answer_log.record(
+            int(user_id), category.title, question.text, option, correct,
+            time.time() - asked_at if asked_at else 0,
         )
+    if correct:
+        user_data["score_this_round"] += 1
+    user_data["current_question_index"] += 1
+    return t.verdict(question, correct)
 
-    await update.message.reply_text(reply_text)
+async def check_inline_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ответ нажатием inline-кнопки: сообщение с вопросом редактируется на месте."""
+    query = update.callback_query
+    nonce, position, option = parse_answer_callback(query.data)
+    user_data = context.user_data
 
-    context.user_data["current_question_index"] += 1
-    return await ask_question(update, context)
+    if "order" not in user_data:
+        await query.answer()
+        clear_session(user_data)
+        return await show_main_menu(update, context)
+
+    index = user_data["current_question_index"]
+    try:
+        question, _ = session_question(user_data)
+    except (KeyError, IndexError):
+        await query.answer()
+        clear_session(user_data)
+        await reply(update, texts(update).quiz_changed)
+        return await show_main_menu(update, context)
+    t = texts(update)
+    if nonce != user_data.get("quiz_nonce", 0) or position != index:
+        # Кнопка под старым вопросом (двойное нажатие, устаревшее сообщение, прошлая викторина)
+        await query.answer(t.question_passed)
+        return ASK_QUESTION
+
+    verdict = record_answer(update.effective_user.id, user_data, question, option, t)
+    await query.answer(t.answer_correct if option == question.answer_index else t.answer_wrong)
+
+    index = user_data["current_question_index"]
+    order = user_data["order"]
+    if index >= len(order):
+        await query.edit_message_text(verdict)
+        return await end_quiz(update, context)
+    next_question, keyboard = question_bank.resolve(
+        user_data["category"], order[index], inline=True, nonce=user_data.get("quiz_nonce", 0), position=index
+    )
+    user_data["asked_at"] = time.time()
+    await query.edit_message_text(
+        t.verdict_and_question(
+            verdict=verdict,
+            question=t.question(number=index + 1, total=len(order), text=next_question.text),
+        ),
+        reply_markup=keyboard
+    )
+    return ASK_QUESTION
 
 # -------------------------
 # Завершение викторины
@@ -500,55 +450,715 @@ async def end_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE):
     score_this_round = context.user_data["score_this_round"]
     username = context.user_data["username"]
 
-    # Обновим общий счёт
-    scoreboard[user_id]["score"] += score_this_round
+    # Обновим общий счёт и счёт за день / неделю
+    credit_scores({user_id: score_this_round}, {})
 
-    await update.message.reply_text(
-        f"Викторина завершена!\n"
-        f"Ты набрал {score_this_round} очк(а/ов) за эту игру.\n"
-        f"Твой общий счёт: {scoreboard[user_id]['score']}."
-    )
+    t = texts(update)
+    await reply(update, t.quiz_finished(score=score_this_round, total=scoreboard[user_id]["score"]))
 
     # Кнопка «Вернуться в меню»
-    keyboard = [["Вернуться в меню"]]
-    await update.message.reply_text(
-        "Нажмите, чтобы вернуться в главное меню:",
-        reply_markup=ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
-    )
+    await reply(update, t.back_to_menu, reply_markup=t.back_keyboard)
 
     # Сбросим промежуточные данные
-    context.user_data["questions"] = []
-    context.user_data["current_question_index"] = 0
-    context.user_data["score_this_round"] = 0
+    clear_session(context.user_data)
 
     # ВНИМАНИЕ: возращаем MAIN_MENU вместо ConversationHandler.END
     return MAIN_MENU
 
 # -------------------------
-# Функция main (запуск бота)
+# Групповые раунды (см. group.py)
 # -------------------------
-def main():
-    token = os.environ.get("BOT_TOKEN", "YOUR_TELEGRAM_BOT_TOKEN")
+# /round [категория] в группе запускает игру из GROUP_ROUND_LENGTH вопросов,
+# на каждый даётся GROUP_ANSWER_SECONDS секунд. Сообщения раунда идут мимо
+# очереди отправки: нужен message_id вопроса, чтобы убрать кнопки, а итог
+# вопроса и следующий вопрос уходят одним сообщением — порядок сохраняется.
+# Идущие игры живут только в памяти и при перезапуске теряются.
+GROUP_ROUND_LENGTH = int(os.environ.get("GROUP_ROUND_LENGTH", "5"))
+GROUP_ANSWER_SECONDS = int(os.environ.get("GROUP_ANSWER_SECONDS", "20"))
+# Идущие игры: по чату и по token открытого вопроса
+group_games = {}
+group_questions = {}
+
+def credit_scores(deltas, names):
+    """
+    Начислить очки пачкой: deltas = {user_id: очки}; names — имена для новых
+    игроков. Очки идут в общую таблицу и в таблицы текущих периодов.
+    """
+    for user_id, delta in deltas.items():
+        if user_id not in scoreboard:
+            scoreboard[user_id] = {"username": names[user_id], "score": 0}
+            leaderboard.add_player(user_id)
+            score_store.set_username(user_id, names[user_id])
+        leaderboard.add_score(user_id, delta)
+        periods.add_score(user_id, delta)
+    score_store.add_scores(deltas, periods.keys.values())
+
+async def group_round_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    # Раунд идёт на языке того, кто его начал
+    t = texts(update)
+    if chat_id in group_games:
+        await reply(update, t.round_running)
+        return
+    title = " ".join(context.args)
+    if title:
+        category = question_bank.by_title.get(title)
+        if category is None:
+            await reply(update, t.round_no_category(titles=", ".join(question_bank.by_title)))
+            return
+    else:
+        category = random.choice(list(question_bank.by_title.values()))
+
+    game = group_games[chat_id] = GroupGame(
+        chat_id, category, question_bank.new_order(category, GROUP_ROUND_LENGTH), t
+    )
+    intro = t.round_intro(title=category.title, count=len(game.order), seconds=GROUP_ANSWER_SECONDS)
+    await open_group_question(context, game, intro)
+
+async def open_group_question(context: ContextTypes.DEFAULT_TYPE, game, intro=""):
+    text, keyboard = game.open_next()
+    try:
+        message = await context.bot.send_message(game.chat_id, intro + text, reply_markup=keyboard)
+    except TelegramError as exc:
+        logger.warning("Групповой раунд в чате %s прерван: %s", game.chat_id, exc)
+        group_games.pop(game.chat_id, None)
+        return
+    game.message_id = message.message_id
+    group_questions[game.token] = game
+    context.job_queue.run_once(
+        close_group_question, GROUP_ANSWER_SECONDS, data=game, name=f"group:{game.chat_id}"
+    )
+
+async def group_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Горячий путь: только запись в память и ответ на нажатие
+    query = update.callback_query
+    token, option = parse_callback(query.data)
+    game = group_questions.get(token)
+    t = texts(update)
+    if game is None or query.message is None or query.message.chat.id != game.chat_id:
+        await query.answer(t.round_question_closed)
+    elif game.record(str(query.from_user.id), query.from_user.first_name, option):
+        await query.answer(t.round_answer_accepted)
+    else:
+        await query.answer(t.round_already_answered)
+
+def group_standings(game):
+    line = game.texts.top_line
+    lines = [
+        line(place=place, name=scoreboard[user_id]["username"], score=points)
+        for place, (user_id, points) in enumerate(game.standings(), 1)
+    ]
+    return "\n".join(lines) if lines else game.texts.round_nobody
+
+async def close_group_question(context: ContextTypes.DEFAULT_TYPE):
+    game = context.job.data
+    group_questions.pop(game.token, None)
+    question = game.question
+    deltas, names, counts = game.close()
+    credit_scores(deltas, names)
+    if answer_log is not None:
+        for user_id, option in game.answers.items():
+            answer_log.record(
+                int(user_id), game.category.title, question.text, option, user_id in deltas,
+                game.answered_at[user_id] - game.opened_at,
+            )
+
+    try:
+        await context.bot.edit_message_reply_markup(game.chat_id, game.message_id, reply_markup=None)
+    except TelegramError:
+        pass
+    text = game.texts.round_result(
+        answer=question.answer, explanation=question.explanation, correct=len(deltas), answered=sum(counts)
+    )
+    if game.finished:
+        group_games.pop(game.chat_id, None)
+        text += game.texts.round_finished(standings=group_standings(game))
+        try:
+            await context.bot.send_message(game.chat_id, text)
+        except TelegramError as exc:
+            logger.warning("Не удалось отправить итоги раунда в чат %s: %s", game.chat_id, exc)
+    else:
+        await open_group_question(context, game, text + "\n\n")
+
+async def group_stop_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    game = group_games.pop(chat_id, None)
+    if game is None:
+        await reply(update, texts(update).round_not_running)
+        return
+    for job in context.job_queue.get_jobs_by_name(f"group:{chat_id}"):
+        job.schedule_removal()
+    # Ответы на открытый вопрос не засчитываются
+    group_questions.pop(game.token, None)
+    await reply(update, game.texts.round_stopped(standings=group_standings(game)))
+
+# -------------------------
+# Сброс очков и журнала ответов
+# -------------------------
+async def flush_scores(context: ContextTypes.DEFAULT_TYPE):
+    # Запись в БД блокирующая — уводим её из event loop
+    await asyncio.to_thread(score_store.flush)
+    await asyncio.to_thread(ratings.flush, score_store)
+    if answer_log is not None:
+        await asyncio.to_thread(answer_log.flush)
+
+# -------------------------
+# Перезагрузка паков вопросов без перезапуска
+# -------------------------
+async def reload_question_packs(context: ContextTypes.DEFAULT_TYPE):
+    global question_bank
+    if not await asyncio.to_thread(question_bank.changed, PACKS_DIR):
+        return
+    # Неизменившиеся паки переиспользуются, изменившиеся перекомпилируются
+    question_bank = await asyncio.to_thread(QuestionBank.load, PACKS_DIR, question_bank)
+    logger.info("Паки вопросов перезагружены: %d категорий", len(question_bank.categories))
+    # Викторины по изменившимся категориям сбрасываются на следующем ответе (см. session_question)
+    # Рейтинги изменившихся категорий перечитываем: вопросы могли сдвинуться
+    changed = ratings.rebind(question_bank)
+    if changed:
+        await asyncio.to_thread(ratings.flush, score_store)
+        rows = await asyncio.to_thread(score_store.load_question_ratings)
+        ratings.load(rows, question_bank, changed)
+
+def load_scores(store):
+    """
+    Подключить хранилище очков и заполнить из него scoreboard / leaderboard,
+    таблицы за текущие периоды и рейтинги вопросов.
+    """
+    global score_store, scores_synced_at
+    score_store = store
+    scores_synced_at = time.time()
+    merge_scores(store.load_all())
+    merge_period_scores(store.load_period_scores(list(periods.keys.values())))
+    ratings.load(store.load_question_ratings(), question_bank)
+
+def merge_scores(entries):
+    if not scoreboard:
+        # Запуск: сливать не с чем, индекс строится одним проходом
+        scoreboard.update(entries)
+        leaderboard.add_players(list(entries))
+        return
+    # Очки в хранилище только растут, поэтому достаточно доначислить разницу
+    new = []
+    for user_id, entry in entries.items():
+        current = scoreboard.get(user_id)
+        if current is None:
+            scoreboard[user_id] = entry
+            new.append(user_id)
+            continue
+        if entry["username"] and entry["username"] != current["username"]:
+            current["username"] = entry["username"]
+            leaderboard.rename(user_id)
+        if entry["score"] > current["score"]:
+            leaderboard.add_score(user_id, entry["score"] - current["score"])
+    leaderboard.add_players(new)
+
+def merge_period_scores(by_period):
+    for key, scores in by_period.items():
+        periods.merge(key, scores)
+
+async def sync_scoreboard(context: ContextTypes.DEFAULT_TYPE):
+    global scores_synced_at
+    # Сначала отдаём свои начисления, потом забираем чужие
+    await asyncio.to_thread(score_store.flush)
+    since = scores_synced_at - SCOREBOARD_SYNC_OVERLAP
+    started = time.time()
+    merge_scores(await asyncio.to_thread(score_store.load_all, since))
+    merge_period_scores(
+        await asyncio.to_thread(score_store.load_period_scores, list(periods.keys.values()), since)
+    )
+    scores_synced_at = started
+
+async def rotate_periods(context: ContextTypes.DEFAULT_TYPE):
+    """Полночь в LEADERBOARD_TZ: начать новый день (и неделю) и удалить очки прошедших."""
+    changed = periods.rollover(datetime.datetime.now(LEADERBOARD_TZ))
+    if not changed:
+        return
+    logger.info("Новые периоды таблицы лидеров: %s", ", ".join(periods.keys[p] for p in changed))
+    # Начисления за прошедший период уходят в базу до удаления его строк
+    await asyncio.to_thread(score_store.flush)
+    await asyncio.to_thread(score_store.prune_periods, list(periods.keys.values()))
+
+# -------------------------
+# Вопрос дня (см. broadcast.py)
+# -------------------------
+# Каждый день в DAILY_QUESTION_TIME (часовой пояс LEADERBOARD_TZ) всем
+# игрокам из хранилища очков уходит один вопрос с inline-кнопками; верный
+# ответ приносит очко. Рассылка идёт фоновой задачей в общем лимите
+# отправки Outbox и после перезапуска продолжается с контрольной точки.
+# Пустое DAILY_QUESTION_TIME — не рассылать; в кластере рассылает
+# только первый воркер.
+#
+# В callback_data кнопок — дата рассылки: ответ отмечается в хранилище
+# (broadcast_answers), и очко даёт только первое нажатие игрока, на любом
+# воркере. На вопросы старше DAILY_ANSWER_DAYS дней ответы не принимаются,
+# их отметки удаляются. Ещё там ключ вопроса (analytics.question_key): после
+# перезагрузки паков категория и позиция могут указывать на другой вопрос,
+# и такой ответ не проверяется. Очко начисляется через хранилище, если
+# игрока ещё нет в scoreboard воркера (в кластере он появляется после синхронизации).
+DAILY_QUESTION_TIME = os.environ.get("DAILY_QUESTION_TIME", "12:00")
+DAILY_ANSWER_DAYS = int(os.environ.get("DAILY_ANSWER_DAYS", "7"))
+BROADCAST_CONCURRENCY = int(os.environ.get("BROADCAST_CONCURRENCY", "8"))
+BROADCAST_CHUNK = int(os.environ.get("BROADCAST_CHUNK", "1000"))
+DAILY_CALLBACK_PATTERN = r"^daily:\d{4}-\d{2}-\d{2}:\d+:\d+:[0-9a-f]+:\d+$"
+broadcast_task = None
+
+def daily_broadcast_name(now=None):
+    return (now or datetime.datetime.now(LEADERBOARD_TZ)).strftime("daily:%Y-%m-%d")
+
+def oldest_daily_broadcast_name():
+    """Имя самой старой рассылки, ответы на которую ещё принимаются."""
+    return daily_broadcast_name(datetime.datetime.now(LEADERBOARD_TZ) - datetime.timedelta(days=DAILY_ANSWER_DAYS))
+
+def daily_question(name):
+    """
+    (категория, позиция вопроса) для рассылки name: выбор зависит только
+    от name и паков — тот же и у других воркеров, и после перезапуска.
+    """
+    categories = sorted(question_bank.categories.values(), key=lambda category: category.id)
+    index = random.Random(name).randrange(sum(len(category.questions) for category in categories))
+    for category in categories:
+        if index < len(category.questions):
+            return category, index
+        index -= len(category.questions)
+
+def start_daily_broadcast(application, name):
+    global broadcast_task
+    if broadcast_task is not None and not broadcast_task.done():
+        return
+    from broadcast import Broadcast
+    category, position = daily_question(name)
+    question = category.questions[position]
+    key = question_key(category.title, question.text)
+    # Тексты рассылки — на языке по умолчанию: язык игрока известен только из его апдейтов
+    markup = InlineKeyboardMarkup([
+        [InlineKeyboardButton(option, callback_data=f"{name}:{category.id}:{position}:{key:x}:{i}")]
+        for i, option in enumerate(question.options)
+    ])
+    engine = Broadcast(
+        application.bot, score_store, name, messages.DEFAULT.daily_question(text=question.text), markup,
+        bucket=outbox.global_bucket if outbox is not None else None,
+        concurrency=BROADCAST_CONCURRENCY, chunk_size=BROADCAST_CHUNK,
+    )
+
+    def done(task):
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            logger.error("Рассылка %s прервана ошибкой", name, exc_info=task.exception())
+        else:
+            logger.info("Рассылка %s завершена: %s", name, task.result())
+
+    # Не application.create_task: Application.stop ждал бы конца рассылки;
+    # ошибки задачи пишутся в лог из done
+    broadcast_task = asyncio.create_task(engine.run())
+    broadcast_task.add_done_callback(done)
+
+async def daily_broadcast(context: ContextTypes.DEFAULT_TYPE):
+    start_daily_broadcast(context.application, daily_broadcast_name())
+    await asyncio.to_thread(score_store.prune_broadcast_answers, oldest_daily_broadcast_name())
+
+async def resume_daily_broadcast(application):
+    """Продолжить сегодняшнюю рассылку, если её прервал перезапуск."""
+    name = daily_broadcast_name()
+    state = await asyncio.to_thread(score_store.load_broadcast, name)
+    if state is not None and not state["finished"]:
+        start_daily_broadcast(application, name)
+
+async def daily_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ответ на вопрос дня: сообщение заменяется вердиктом, кнопки убираются."""
+    query = update.callback_query
+    prefix, day, category_id, position, key, option = query.data.split(":")
+    name = f"{prefix}:{day}"
+    t = texts(update)
+    try:
+        category = question_bank.categories[int(category_id)]
+        question = category.questions[int(position)]
+    except (KeyError, IndexError):
+        question = None
+    if question is None or question_key(category.title, question.text) != int(key, 16):
+        await query.answer(t.quiz_changed)
+        return
+    user_id = str(update.effective_user.id)
+    if name < oldest_daily_broadcast_name() or not await asyncio.to_thread(
+        score_store.record_broadcast_answer, name, user_id
+    ):
+        # Уже отвечал (повторное нажатие, в том числе на другом воркере) или вопрос слишком старый
+        await query.answer(t.question_passed)
+        return
+    correct = int(option) == question.answer_index
+    if correct:
+        if user_id in scoreboard:
+            credit_scores({user_id: 1}, {})
+        else:
+            # Рассылка идёт игрокам из хранилища — там он есть, даже если воркер его ещё не видел
+            score_store.add_score(user_id, 1, periods.keys.values())
+    await query.answer(t.answer_correct if correct else t.answer_wrong)
+    await query.edit_message_text(t.daily_answered(
+        question=t.daily_question(text=question.text), verdict=t.verdict(question, correct)
+    ))
+
+# -------------------------
+# Истечение брошенных сессий (см. sessions.py)
+# -------------------------
+# Сессия, простоявшая SESSION_TTL секунд в выборе категории или посреди
+# викторины, закрывается: данные раунда удаляются из user_data, разговор
+# возвращается в главное меню. С SESSION_CREDIT_PARTIAL=1 набранные
+# в раунде очки засчитываются. SESSION_TTL=0 — сессии не истекают.
+#
+# conversation_timeout ConversationHandler'а здесь не годится: он заводит
+# задачу JobQueue на каждый разговор и не переживает перезапуск, а
+# сохранённые сессии должны истекать и после него. Поэтому состояния
+# разговоров читаются и меняются напрямую — через conversation_states().
+SESSION_TTL = int(os.environ.get("SESSION_TTL", "1800"))
+SESSION_SWEEP_INTERVAL = int(os.environ.get("SESSION_SWEEP_INTERVAL", "60"))
+SESSION_CREDIT_PARTIAL = os.environ.get("SESSION_CREDIT_PARTIAL", "0") == "1"
+EXPIRING_STATES = (CHOOSE_CATEGORY, ASK_QUESTION)
+session_reaper = None
+
+async def touch_session(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat, user = update.effective_chat, update.effective_user
+    if session_reaper is not None and chat is not None and user is not None:
+        session_reaper.touch((chat.id, user.id))
 
-    # Сохраняем состояния в файл (опционально); при перезапусках на локальной машине
-    persistence = PicklePersistence(filepath="bot_state.pkl")
-    application = ApplicationBuilder().token(token).persistence(persistence).build()
+def conversation_states():
+    """
+    {(chat_id, user_id): состояние} разговоров викторины — единственное место,
+    где трогается приватный ConversationHandler._conversations.
+
+    Публичного API для этого в PTB нет; атрибут проверен на
+    python-telegram-bot==20.3 (см. requirements.txt). При обновлении PTB
+    сначала запустить tests/test_conversation_states.py: он падает, если
+    атрибут пропал или запись в него перестала менять состояние разговора.
+    Для persistent-разговора это TrackingDict — записи уходят в хранилище.
+    """
+    return quiz_conversation._conversations
+
+def expire_session(application, key):
+    conversations = conversation_states()
+    if conversations.get(key) not in EXPIRING_STATES:
+        return False
+    user_id = key[-1]
+    user_data = application.user_data.get(user_id)
+    if user_data is None and isinstance(application.persistence, SQLitePersistence):
+        # Игрок с прошлого запуска ещё не писал — его запись не поднята из базы
+        user_data = application.user_data[user_id]
+        application.persistence.load_user_data(user_id, user_data)
+    if user_data is not None:
+        partial = user_data.get("score_this_round", 0)
+        if SESSION_CREDIT_PARTIAL and partial and str(user_id) in scoreboard:
+            credit_scores({str(user_id): partial}, {})
+        clear_session(user_data)
+        application.mark_data_for_update_persistence(user_ids=user_id)
+    conversations[key] = MAIN_MENU
+    SESSIONS_EXPIRED.inc()
+    return True
+
+async def expire_sessions(context: ContextTypes.DEFAULT_TYPE):
+    expired = await session_reaper.sweep()
+    if expired:
+        logger.info("Закрыто брошенных сессий: %d", expired)
+
+def start_session_reaper(application):
+    global session_reaper
+    session_reaper = SessionReaper(SESSION_TTL, lambda key: expire_session(application, key))
+    application.job_queue.run_repeating(
+        expire_sessions, interval=SESSION_SWEEP_INTERVAL, first=SESSION_SWEEP_INTERVAL
+    )
+
+async def touch_restored_sessions():
+    """
+    Сессии, поднятые из хранилища, отсчитывают TTL с момента запуска.
+    Вызывается, когда бот уже принимает апдейты, поэтому ключи отмечаются
+    пачками с передачей управления event loop.
+    """
+    keys = [key for key, state in conversation_states().items() if state in EXPIRING_STATES]
+    batch = session_reaper.batch_size
+    for start in range(0, len(keys), batch):
+        # Время у каждого touch своё: ключи, тронутые апдейтами, остаются позже
+        for key in keys[start:start + batch]:
+            session_reaper.touch(key)
+        await asyncio.sleep(0)
+
+# -------------------------
+# Метрики (см. metrics.py)
+# -------------------------
+# Обработчики обёрнуты в build_application; /metrics отдаётся на том же
+# сервере, что и webhook, а при METRICS_PORT — ещё и отдельным сервером
+# (в polling-режиме это единственный способ их забрать).
+METRICS_LISTEN = os.environ.get("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+metrics_server = None
+# ConversationHandler викторины; задаётся в build_application
+quiz_conversation = None
+
+def session_counts():
+    counts = {(name,): 0 for name in STATE_NAMES.values()}
+    if quiz_conversation is not None:
+        # Сессии считаются только при запросе /metrics, обработчики их не трогают
+        for state in conversation_states().values():
+            name = STATE_NAMES.get(state)
+            if name is not None:
+                counts[(name,)] += 1
+    return counts
+
+def outbox_stat(key):
+    return lambda: outbox.stats()[key] if outbox is not None else 0
+
+REGISTRY.register(Gauge(
+    "quiz_active_sessions", "Сессии по состояниям разговора", ("state",), collect=session_counts
+))
+REGISTRY.register(Gauge(
+    "quiz_outbound_queue_depth", "Сообщения в очереди отправки", collect=outbox_stat("queue_depth")
+))
+REGISTRY.register(Gauge(
+    "quiz_outbound_chats_waiting", "Чаты с неотправленными сообщениями", collect=outbox_stat("chats_waiting")
+))
+REGISTRY.register(Gauge(
+    "quiz_startup_seconds", "Длительность фаз запуска (total — до приёма апдейтов)", ("phase",),
+    collect=STARTUP.seconds,
+))
+
+async def post_init(application):
+    global outbox, metrics_server, answer_log
+    # Перед post_init Application.initialize читал разговоры из persistence
+    STARTUP.mark("initialize")
+    if ANSWER_LOG and answer_log is None:
+        answer_log = AnswerLog(ANSWER_LOG)
+    if METRICS_PORT:
+        from webhook import HTTPServer
+        metrics_server = HTTPServer({"/metrics": metrics_route()})
+        await metrics_server.start(METRICS_LISTEN, METRICS_PORT)
+        logger.info("Метрики: http://%s:%d/metrics", METRICS_LISTEN, METRICS_PORT)
+    outbox = Outbox(
+        application.bot,
+        global_rate=OUTBOX_GLOBAL_RATE,
+        chat_rate=OUTBOX_CHAT_RATE,
+        chat_burst=OUTBOX_CHAT_BURST,
+    )
+    application.job_queue.run_repeating(
+        flush_scores, interval=SCORE_FLUSH_INTERVAL, first=SCORE_FLUSH_INTERVAL
+    )
+    if SCOREBOARD_SYNC_INTERVAL:
+        application.job_queue.run_repeating(
+            sync_scoreboard, interval=SCOREBOARD_SYNC_INTERVAL, first=SCOREBOARD_SYNC_INTERVAL
+        )
+    application.job_queue.run_repeating(
+        reload_question_packs, interval=PACKS_RELOAD_INTERVAL, first=PACKS_RELOAD_INTERVAL
+    )
+    application.job_queue.run_daily(rotate_periods, time=datetime.time(0, 0, tzinfo=LEADERBOARD_TZ))
+    if DAILY_QUESTION_TIME:
+        hour, minute = map(int, DAILY_QUESTION_TIME.split(":"))
+        application.job_queue.run_daily(
+            daily_broadcast, time=datetime.time(hour, minute, tzinfo=LEADERBOARD_TZ)
+        )
+    if SESSION_TTL:
+        start_session_reaper(application)
+    # Остальное — после start(), когда апдейты уже принимаются
+    application.job_queue.run_once(after_start, 0)
+    STARTUP.mark("post_init")
+
+async def after_start(context: ContextTypes.DEFAULT_TYPE):
+    """Первое задание после start(): бот уже отвечает игрокам."""
+    if STARTUP.ready():
+        logger.info("Запуск: %s", STARTUP.report())
+    if session_reaper is not None:
+        await touch_restored_sessions()
+    if DAILY_QUESTION_TIME:
+        await resume_daily_broadcast(context.application)
+
+async def post_stop(application):
+    # Доотправляем очередь, пока Bot ещё не закрыт
+    global outbox, metrics_server, broadcast_task
+    if broadcast_task is not None:
+        # Рассылка продолжится с контрольной точки при следующем запуске
+        broadcast_task.cancel()
+        await asyncio.gather(broadcast_task, return_exceptions=True)
+        broadcast_task = None
+    if outbox is not None:
+        await outbox.close()
+        outbox = None
+    if metrics_server is not None:
+        await metrics_server.stop()
+        metrics_server = None
+
+async def post_shutdown(application):
+    global answer_log
+    await asyncio.to_thread(score_store.flush)
+    await asyncio.to_thread(ratings.flush, score_store)
+    score_store.close()
+    if answer_log is not None:
+        answer_log.close()
+        answer_log = None
+
+# -------------------------
+# Сборка приложения
+# -------------------------
+# Кнопки периодов под топом (messages.Catalog.top_periods_keyboard)
+TOP_PERIOD_PATTERN = rf"^top:(all|{'|'.join(PERIODS)})$"
+# Другой адрес Bot API, например свой telegram-bot-api
+# ("http://localhost:8081/bot") или фейк в benchmarks/bench_cold_start.py
+BOT_API_URL = os.environ.get("BOT_API_URL")
 
-    conv_handler = ConversationHandler(
-        entry_points=[CommandHandler("start", start_command)],
+def build_application(token, persistence=None, request=None, concurrent_updates=False):
+    """
+    Application со всеми обработчиками.
+
+    request позволяет подменить HTTP-слой Bot API (например, фейком в бенчмарках).
+    concurrent_updates > 1 разрешает обрабатывать столько апдейтов параллельно;
+    порядок апдейтов одного игрока при этом не гарантируется.
+    """
+    builder = (
+        ApplicationBuilder()
+        .token(token)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+        .concurrent_updates(concurrent_updates)
+    )
+    if persistence is not None:
+        builder = builder.persistence(persistence)
+    if BOT_API_URL:
+        builder = builder.base_url(BOT_API_URL)
+    if throttle is not None:
+        builder = builder.application_class(ThrottledApplication, kwargs={"throttle": throttle})
+    if request is not None:
+        builder = builder.request(request).updater(None)
+    application = builder.build()
+
+    def on_text(state, callback):
+        return MessageHandler(
+            filters.TEXT & ~filters.COMMAND,
+            instrument(callback, callback.__name__, STATE_NAMES[state]),
+        )
+
+    # Нажатия inline-кнопок отслеживаются по (чат, игрок), а не по сообщению —
+    # так и задумано (см. check_inline_answer), предупреждение PTB об этом лишнее
+    warnings.filterwarnings("ignore", message="If 'per_message=False'", category=PTBUserWarning)
+
+    global quiz_conversation
+    conv_handler = quiz_conversation = ConversationHandler(
+        # Одиночная викторина — в личке; в группах играют раундами (/round)
+        entry_points=[CommandHandler(
+            "start", instrument(start_command, "start_command", "none"), filters=filters.ChatType.PRIVATE
+        )],
         states={
-            MAIN_MENU: [MessageHandler(filters.TEXT & ~filters.COMMAND, main_menu_handler)],
-            ASK_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, ask_name)],
-            CHOOSE_CATEGORY: [MessageHandler(filters.TEXT & ~filters.COMMAND, choose_category)],
-            ASK_QUESTION: [MessageHandler(filters.TEXT & ~filters.COMMAND, check_answer)],
+            MAIN_MENU: [on_text(MAIN_MENU, main_menu_handler)],
+            ASK_NAME: [on_text(ASK_NAME, ask_name)],
+            CHOOSE_CATEGORY: [on_text(CHOOSE_CATEGORY, choose_category)],
+            ASK_QUESTION: [
+                on_text(ASK_QUESTION, check_answer),
+                CallbackQueryHandler(
+                    instrument(check_inline_answer, "check_inline_answer", STATE_NAMES[ASK_QUESTION]),
+                    pattern=ANSWER_CALLBACK_PATTERN,
+                ),
+            ],
         },
-        fallbacks=[CommandHandler("cancel", cancel_command)],
+        # Состояние, в котором пришёл /cancel, без разбора разговора не узнать
+        fallbacks=[CommandHandler("cancel", instrument(cancel_command, "cancel_command", "any"))],
+        # Состояния разговоров хранятся вместе с user_data — их читают и другие воркеры
+        name="quiz",
+        persistent=persistence is not None,
     )
 
+    # Время последнего апдейта игрока — до того, как его обработает разговор
+    application.add_handler(TypeHandler(Update, touch_session), group=-1)
+    # Нажатия в групповых раундах — до разговора, чтобы не искать их состояние
+    application.add_handler(CallbackQueryHandler(instrument(group_answer, "group_answer"), pattern=CALLBACK_PATTERN))
+    application.add_handler(CallbackQueryHandler(
+        instrument(daily_answer, "daily_answer"), pattern=DAILY_CALLBACK_PATTERN
+    ))
+    application.add_handler(CallbackQueryHandler(
+        instrument(show_top_period, "show_top_period"), pattern=TOP_PERIOD_PATTERN
+    ))
+    application.add_handler(CommandHandler(
+        "round", instrument(group_round_command, "group_round_command"), filters=filters.ChatType.GROUPS
+    ))
+    application.add_handler(CommandHandler(
+        "stopround", instrument(group_stop_command, "group_stop_command"), filters=filters.ChatType.GROUPS
+    ))
     application.add_handler(conv_handler)
+    return application
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Волейбольная викторина в Telegram")
+    parser.add_argument(
+        "--mode", choices=("polling", "webhook"), default=os.environ.get("BOT_MODE", "polling"),
+        help="как получать апдейты (BOT_MODE)"
+    )
+    parser.add_argument(
+        "--listen", default=os.environ.get("WEBHOOK_LISTEN", "0.0.0.0"),
+        help="адрес HTTP-сервера webhook (WEBHOOK_LISTEN)"
+    )
+    parser.add_argument(
+        "--port", type=int, default=int(os.environ.get("PORT", "8443")),
+        help="порт HTTP-сервера webhook (PORT)"
+    )
+    parser.add_argument(
+        "--url-path", default=os.environ.get("WEBHOOK_PATH", "telegram"),
+        help="путь, на который Telegram шлёт апдейты (WEBHOOK_PATH)"
+    )
+    parser.add_argument(
+        "--webhook-url", default=os.environ.get("WEBHOOK_URL"),
+        help="публичный URL для set_webhook; без него webhook не регистрируется (WEBHOOK_URL)"
+    )
+    parser.add_argument(
+        "--concurrent-updates", type=int, default=int(os.environ.get("CONCURRENT_UPDATES", "1")),
+        help="сколько апдейтов обрабатывать параллельно (CONCURRENT_UPDATES)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=int(os.environ.get("WORKERS", "1")),
+        help="число процессов-воркеров с общим хранилищем состояния (WORKERS)"
+    )
+    args = parser.parse_args()
+    # Секрет — только из окружения, чтобы не светился в списке процессов
+    args.secret_token = os.environ.get("WEBHOOK_SECRET")
+    if args.mode == "webhook" and not args.secret_token:
+        parser.error("в режиме webhook нужен WEBHOOK_SECRET: без него апдейты можно подделать")
+    return args
+
+# -------------------------
+# Функция main (запуск бота)
+# -------------------------
+def main():
+    args = parse_args()
+    token = os.environ.get("BOT_TOKEN", "YOUR_TELEGRAM_BOT_TOKEN")
+
+    if args.workers > 1:
+        # Несколько процессов-воркеров, апдейты раздаются по user_id
+        from cluster import run_cluster
+        run_cluster(token, args)
+        return
+
+    # Общий счёт переживает перезапуски: загружаем его из хранилища
+    with STARTUP.phase("scores"):
+        load_scores(open_score_store())
 
-    logger.info("Бот запущен. Ожидание сообщений...")
-    application.run_polling()
+    # Сохраняем состояния в файл; пишутся только изменившиеся пользователи.
+    # Записи игроков читаются при их первом апдейте (SQLitePersistence, lazy)
+    with STARTUP.phase("handlers"):
+        persistence = SQLitePersistence(filepath=os.environ.get("BOT_STATE_DB", "bot_state.db"))
+        application = build_application(
+            token,
+            persistence=persistence,
+            concurrent_updates=args.concurrent_updates if args.concurrent_updates > 1 else False,
+        )
+
+    if args.mode == "webhook":
+        from webhook import run_webhook
+        logger.info("Бот запущен в режиме webhook.")
+        asyncio.run(run_webhook(
+            application,
+            listen=args.listen,
+            port=args.port,
+            url_path=args.url_path,
+            secret_token=args.secret_token,
+            webhook_url=args.webhook_url,
+            routes={"/metrics": metrics_route()},
+        ))
+    else:
+        logger.info("Бот запущен. Ожидание сообщений...")
+        application.run_polling()
 
 if __name__ == "__main__":
     main()
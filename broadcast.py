@@ -0,0 +1,140 @@
+import asyncio
+import logging
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+from outbound import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# -------------------------
+# Рассылка всем игрокам
+# -------------------------
+# Получатели читаются из хранилища очков страницами по chunk_size
+# (ScoreStore.recipients_after, по возрастанию user_id): в памяти только
+# текущая страница и следующая, которая подгружается, пока отправляется
+# текущая. Страницу отправляют concurrency задач; общий темп держит
+# токен-бакет (можно передать бакет Outbox — тогда рассылка и ответы игрокам
+# делят один лимит бота). 429 притормаживает все задачи сразу: лимит общий.
+#
+# После каждой страницы в broadcasts записывается контрольная точка —
+# последний user_id страницы и счётчики, в той же транзакции, что
+# и заблокировавшие бота на этой странице. Перезапущенная рассылка с тем же
+# name продолжает со следующей страницы; письма страницы, прерванной
+# посередине, могут уйти второй раз.
+#
+# Кто заблокировал бота (403) или удалил аккаунт (400 chat not found),
+# попадает в blocked_users, и следующие рассылки его пропускают.
+
+
+class Broadcast:
+    """
+    Args:
+        bot: telegram.Bot для отправки.
+        store: ScoreStore — получатели, контрольные точки, заблокировавшие.
+        name: имя рассылки — ключ контрольной точки ("daily:2024-05-01").
+        text, reply_markup: сообщение, одно на всех.
+        rate: сообщений в секунду, если bucket не задан.
+        bucket: общий TokenBucket (например, Outbox).
+        concurrency: сколько отправок идёт одновременно.
+        chunk_size: сколько получателей читать из хранилища за раз.
+        max_retries: сколько раз повторять после 429 и сетевых ошибок.
+    """
+
+    def __init__(self, bot, store, name, text, reply_markup=None, rate=20, bucket=None,
+                 concurrency=8, chunk_size=1000, max_retries=5):
+        self.bot = bot
+        self.store = store
+        self.name = name
+        self.text = text
+        self.reply_markup = reply_markup
+        self.bucket = bucket or TokenBucket(rate, rate)
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.sent = self.blocked = self.failed = 0
+        self.retried = 0
+
+    async def run(self):
+        """Отправить всем (или продолжить с контрольной точки). Возвращает stats()."""
+        state = await asyncio.to_thread(self.store.load_broadcast, self.name)
+        last = ""
+        if state is not None:
+            if state["finished"]:
+                return self.stats()
+            last = state["last_user_id"]
+            self.sent, self.blocked, self.failed = state["sent"], state["blocked"], state["failed"]
+            logger.info("Рассылка %s продолжается после %s (отправлено %d)", self.name, last, self.sent)
+
+        pending = asyncio.ensure_future(asyncio.to_thread(self.store.recipients_after, last, self.chunk_size))
+        try:
+            while True:
+                chunk = await pending
+                if not chunk:
+                    break
+                # Следующая страница читается, пока отправляется эта
+                pending = asyncio.ensure_future(
+                    asyncio.to_thread(self.store.recipients_after, chunk[-1], self.chunk_size)
+                )
+                blocked = await self._send_chunk(chunk)
+                last = chunk[-1]
+                await asyncio.to_thread(
+                    self.store.save_broadcast, self.name, last, self.sent, self.blocked, self.failed,
+                    blocked_ids=blocked,
+                )
+        finally:
+            pending.cancel()
+        await asyncio.to_thread(
+            self.store.save_broadcast, self.name, last, self.sent, self.blocked, self.failed, True
+        )
+        return self.stats()
+
+    async def _send_chunk(self, chunk):
+        """Отправить сообщение странице получателей; возвращает user_id заблокировавших бота."""
+        recipients = iter(chunk)
+        blocked = []
+
+        async def worker():
+            # Итератор общий: каждая задача берёт следующего свободного получателя
+            for user_id in recipients:
+                result = await self._send(user_id)
+                if result == "sent":
+                    self.sent += 1
+                elif result == "blocked":
+                    self.blocked += 1
+                    blocked.append(user_id)
+                else:
+                    self.failed += 1
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        return blocked
+
+    async def _send(self, user_id):
+        for _ in range(self.max_retries + 1):
+            delay = self.bucket.reserve()
+            if delay:
+                await asyncio.sleep(delay)
+            try:
+                await self.bot.send_message(int(user_id), self.text, reply_markup=self.reply_markup)
+                return "sent"
+            except RetryAfter as exc:
+                self.retried += 1
+                retry_after = getattr(exc.retry_after, "total_seconds", lambda: exc.retry_after)()
+                # Долг в бакете задерживает и остальные задачи
+                self.bucket.tokens = min(self.bucket.tokens, -retry_after * self.bucket.rate)
+            except Forbidden:
+                return "blocked"
+            except BadRequest as exc:
+                if "chat not found" in str(exc).lower():
+                    return "blocked"
+                logger.warning("Рассылка %s: не отправлено игроку %s: %s", self.name, user_id, exc)
+                return "failed"
+            except NetworkError:
+                self.retried += 1
+            except TelegramError as exc:
+                logger.warning("Рассылка %s: не отправлено игроку %s: %s", self.name, user_id, exc)
+                return "failed"
+        return "failed"
+
+    def stats(self):
+        return {"sent": self.sent, "blocked": self.blocked, "failed": self.failed, "retried": self.retried}
@@ -0,0 +1,274 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+
+from telegram import Bot, Update
+from telegram.error import InvalidToken, RetryAfter, TelegramError, TimedOut
+
+from persistence import SQLitePersistence
+from storage import open_score_store
+from webhook import HTTPServer, running, stop_signal, update_route
+
+logger = logging.getLogger(__name__)
+
+# -------------------------
+# Несколько воркеров на один токен
+# -------------------------
+# Апдейты от Telegram получает один процесс-роутер (polling или webhook)
+# и раскладывает их по очередям воркеров: игрок всегда попадает в воркер
+# partition_of(user_id), а всё из группового чата — в воркер
+# partition_of(chat_id), где живёт групповой раунд этого чата. Каждый
+# воркер обрабатывает свою очередь строго по порядку, поэтому порядок
+# апдейтов одного игрока (и одного группового чата) сохраняется.
+#
+# Состояние общее: user_data и состояния разговоров лежат в одном файле
+# SQLitePersistence (каждый воркер при старте читает только свою долю),
+# очки — в общем ScoreStore. Поменять число воркеров можно перезапуском:
+# доли пересчитаются, а данные останутся в хранилище.
+#
+# Роутер следит за воркерами: упавший перезапускается (его очередь никуда
+# не делась), а если воркер падает сразу после запуска — значит, он
+# не поднимется и дальше, и роутер останавливается целиком. Ошибки
+# getUpdates повторяются с нарастающей паузой, как в Updater PTB.
+
+# Пауза между повторами getUpdates растёт до стольких секунд
+POLL_MAX_DELAY = 30
+# Как часто проверять, живы ли воркеры
+WORKER_CHECK_INTERVAL = 1
+# Воркер, упавший раньше, чем через столько секунд после запуска, не перезапускается
+WORKER_MIN_UPTIME = 30
+
+# Апдейты, у которых есть автор; ключ — поле Update, в котором он лежит
+_UPDATE_FIELDS = (
+    "message",
+    "edited_message",
+    "callback_query",
+    "inline_query",
+    "chosen_inline_result",
+    "poll_answer",
+    "my_chat_member",
+    "chat_member",
+    "chat_join_request",
+    "shipping_query",
+    "pre_checkout_query",
+    "channel_post",
+    "edited_channel_post",
+)
+
+
+def partition_of(user_id, workers):
+    return abs(user_id) % workers
+
+
+_GROUP_CHATS = ("group", "supergroup")
+
+
+def routing_id(data):
+    """
+    По какому id раскладывать апдейт: чат для групп, иначе игрок
+    (или чат, если автора нет); 0 — если нет ни того, ни другого.
+    """
+    for field in _UPDATE_FIELDS:
+        obj = data.get(field)
+        if obj:
+            # У callback query чат — в сообщении с кнопками
+            chat = obj.get("chat") or (obj.get("message") or {}).get("chat")
+            if chat and chat.get("type") in _GROUP_CHATS:
+                return chat["id"]
+            user = obj.get("from") or obj.get("user")
+            if user:
+                return user["id"]
+            if chat:
+                return chat["id"]
+    return 0
+
+
+class Router:
+    """Раскладывает JSON апдейтов по очередям воркеров."""
+
+    def __init__(self, queues):
+        self.queues = queues
+
+    def dispatch(self, data):
+        self.queues[partition_of(routing_id(data), len(self.queues))].put(data)
+
+    def close(self):
+        for queue in self.queues:
+            queue.put(None)
+
+
+# -------------------------
+# Воркер
+# -------------------------
+async def serve_partition(application, queue):
+    """Обрабатывать апдейты из очереди воркера по одному, пока не придёт None."""
+    loop = asyncio.get_running_loop()
+    while True:
+        data = await loop.run_in_executor(None, queue.get)
+        if data is None:
+            break
+        await application.process_update(Update.de_json(data, application.bot))
+
+
+def worker_main(index, workers, queue, token, state_db, sync_interval):
+    logging.basicConfig(
+        format=f'%(asctime)s - worker {index} - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    import bot
+
+    if not bot.SCOREBOARD_SYNC_INTERVAL:
+        bot.SCOREBOARD_SYNC_INTERVAL = sync_interval
+    # Общий лимит Telegram делится между воркерами
+    bot.OUTBOX_GLOBAL_RATE /= workers
+    # Метрики у каждого воркера свои — и порт свой
+    if bot.METRICS_PORT:
+        bot.METRICS_PORT += index
+    # Журнал ответов тоже у каждого свой: answers.log.0, answers.log.1, ...
+    if bot.ANSWER_LOG:
+        bot.ANSWER_LOG += f".{index}"
+    # Вопрос дня рассылает один воркер — иначе каждый игрок получил бы его несколько раз
+    if index:
+        bot.DAILY_QUESTION_TIME = ""
+    with bot.STARTUP.phase("scores"):
+        bot.load_scores(open_score_store())
+    with bot.STARTUP.phase("handlers"):
+        persistence = SQLitePersistence(filepath=state_db, partition=(index, workers))
+        application = bot.build_application(token, persistence=persistence)
+
+    async def run():
+        async with running(application):
+            await serve_partition(application, queue)
+
+    asyncio.run(run())
+
+
+# -------------------------
+# Роутер
+# -------------------------
+async def poll_updates(token, router, stop):
+    """
+    getUpdates в одном процессе; апдейты уходят воркерам в исходном порядке.
+    Сетевые ошибки и Conflict повторяются; неверный токен — фатальная ошибка.
+    """
+    async with Bot(token) as telegram_bot:
+        # Пока зарегистрирован webhook, getUpdates отвечает Conflict
+        await telegram_bot.delete_webhook()
+        offset = None
+        delay = 0
+        while not stop.is_set():
+            try:
+                updates = await telegram_bot.get_updates(
+                    offset=offset, timeout=10, allowed_updates=Update.ALL_TYPES
+                )
+            except InvalidToken:
+                raise
+            except RetryAfter as exc:
+                await asyncio.sleep(exc.retry_after)
+                continue
+            except TimedOut:
+                # Long polling не уложился в таймаут HTTP — просто спрашиваем снова
+                continue
+            except TelegramError as exc:
+                delay = min(POLL_MAX_DELAY, delay * 2 or 1)
+                logger.error("getUpdates: %s; повтор через %d с", exc, delay)
+                await asyncio.sleep(delay)
+                continue
+            delay = 0
+            for update in updates:
+                router.dispatch(update.to_dict())
+                offset = update.update_id + 1
+
+
+async def watch_workers(processes, respawn, interval=WORKER_CHECK_INTERVAL):
+    """
+    Перезапускать упавшие воркеры: respawn(index) -> новый запущенный процесс,
+    он заменяет упавший в processes. Воркер, упавший сразу после запуска, —
+    RuntimeError.
+    """
+    started = [time.monotonic()] * len(processes)
+    while True:
+        await asyncio.sleep(interval)
+        for index, process in enumerate(processes):
+            if process.is_alive():
+                continue
+            uptime = time.monotonic() - started[index]
+            if uptime < WORKER_MIN_UPTIME:
+                raise RuntimeError(
+                    f"воркер {index} завершился через {uptime:.0f} с после запуска (код {process.exitcode})"
+                )
+            logger.error("Воркер %d завершился с кодом %s, перезапускаем", index, process.exitcode)
+            processes[index] = respawn(index)
+            started[index] = time.monotonic()
+
+
+async def _route(token, args, router, processes, respawn):
+    stop = stop_signal()
+    tasks = {asyncio.create_task(stop.wait()), asyncio.create_task(watch_workers(processes, respawn))}
+    server = None
+    try:
+        if args.mode == "webhook":
+            async def to_router(data):
+                router.dispatch(data)
+
+            server = HTTPServer({"/" + args.url_path.lstrip("/"): update_route(to_router, args.secret_token)})
+            # Сначала слушаем, потом регистрируем webhook (как в webhook.run_webhook):
+            # иначе апдейты придут на закрытый порт, а при ошибке bind останется
+            # webhook, указывающий в никуда
+            await server.start(args.listen, args.port)
+            if args.webhook_url:
+                async with Bot(token) as telegram_bot:
+                    await telegram_bot.set_webhook(
+                        args.webhook_url, secret_token=args.secret_token, allowed_updates=Update.ALL_TYPES
+                    )
+        else:
+            tasks.add(asyncio.create_task(poll_updates(token, router, stop)))
+        # Сигнал остановки, упавший поллер или воркер, который не поднимается
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            # Ошибка выходит из asyncio.run — run_cluster останавливает воркеры
+            task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if server is not None:
+            await server.stop()
+
+
+def spawn_worker(target, args, index):
+    process = multiprocessing.get_context("spawn").Process(target=target, args=args, name=f"worker-{index}")
+    process.start()
+    return process
+
+
+def start_workers(workers, target, args_for):
+    """Запустить процессы-воркеры; args_for(index, queue) — аргументы target."""
+    context = multiprocessing.get_context("spawn")
+    queues = [context.Queue() for _ in range(workers)]
+    processes = [spawn_worker(target, args_for(index, queue), index) for index, queue in enumerate(queues)]
+    return Router(queues), processes
+
+
+def run_cluster(token, args):
+    state_db = os.environ.get("BOT_STATE_DB", "bot_state.db")
+    sync_interval = int(os.environ.get("SCOREBOARD_SYNC_INTERVAL", "0")) or 10
+
+    def args_for(index, queue):
+        return index, args.workers, queue, token, state_db, sync_interval
+
+    router, processes = start_workers(args.workers, worker_main, args_for)
+    logger.info("Запущено воркеров: %d", args.workers)
+
+    def respawn(index):
+        return spawn_worker(worker_main, args_for(index, router.queues[index]), index)
+
+    try:
+        asyncio.run(_route(token, args, router, processes, respawn))
+    finally:
+        # None в каждой очереди — воркер доделывает свои апдейты и выходит
+        router.close()
+        for process in processes:
+            process.join()
@@ -0,0 +1,123 @@
+import itertools
+import time
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+import messages
+
+# -------------------------
+# Групповые раунды
+# -------------------------
+# В группе вопрос публикуется одним сообщением с inline-кнопками, и на него
+# одновременно отвечают все участники. Нажатие кнопки (callback query)
+# только записывает ответ в память — dict user_id -> вариант, первый ответ
+# окончательный. Очки начисляются пачкой, когда по таймеру вопрос
+# закрывается (GroupGame.close): сколько бы ни было нажатий, scoreboard
+# и хранилище видят одно обновление на игрока за вопрос.
+#
+# callback_data кнопки: "g:<token>:<вариант>", где token — номер вопроса:
+# по нему ответ находит свою игру за O(1), а нажатия на кнопки уже
+# закрытых вопросов отбрасываются. Номера начинаются со времени запуска
+# в микросекундах, так что кнопки, оставшиеся от прошлого запуска,
+# не совпадут с вопросами нового. Чат нажатия сверяется с чатом игры
+# (см. bot.group_answer) — подделанный callback из другого чата не засчитывается.
+
+CALLBACK_PREFIX = "g:"
+CALLBACK_PATTERN = r"^g:\d+:\d+$"
+
+_tokens = itertools.count(time.time_ns() // 1000)
+
+
+def parse_callback(data):
+    """(token, вариант) из callback_data кнопки."""
+    _, token, option = data.split(":")
+    return int(token), int(option)
+
+
+class GroupGame:
+    """
+    Игра в одном групповом чате: несколько вопросов одной категории подряд.
+
+    Args:
+        chat_id: чат, где идёт игра.
+        category: Category из банка вопросов.
+        order: порядок вопросов из QuestionBank.new_order.
+        texts: каталог messages, на языке которого идёт игра.
+    """
+
+    def __init__(self, chat_id, category, order, texts=messages.DEFAULT):
+        self.chat_id = chat_id
+        self.category = category
+        self.order = order
+        self.texts = texts
+        self.index = -1
+        self.token = None
+        self.question = None
+        self.message_id = None
+        self.opened_at = 0.0
+        self.answers = {}
+        self.names = {}
+        # Когда игрок ответил (time.monotonic()) — для журнала ответов
+        self.answered_at = {}
+        # Очки за эту игру: {user_id: очки}
+        self.scores = {}
+
+    @property
+    def finished(self):
+        return self.index + 1 >= len(self.order)
+
+    def open_next(self):
+        """Перейти к следующему вопросу; возвращает (текст, клавиатура)."""
+        self.index += 1
+        self.token = next(_tokens)
+        # Раунд доигрывается на своей категории: после перезагрузки паков
+        # те же номер и позиция в банке могут указывать на другой вопрос
+        packed = self.order[self.index]
+        question = self.category.questions[packed >> 8]
+        reply_keyboard = question.keyboards[packed & 0xFF]
+        self.question = question
+        self.answers = {}
+        self.names = {}
+        self.answered_at = {}
+        self.opened_at = time.monotonic()
+        # Порядок кнопок — тот же, что у обычной клавиатуры этого элемента порядка
+        options = question.option_index
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton(row[0].text, callback_data=f"{CALLBACK_PREFIX}{self.token}:{options[row[0].text]}")]
+            for row in reply_keyboard.keyboard
+        ])
+        text = self.texts.question(number=self.index + 1, total=len(self.order), text=question.text)
+        return text, keyboard
+
+    def record(self, user_id, name, option):
+        """Записать ответ; False, если игрок уже отвечал на этот вопрос."""
+        if user_id in self.answers:
+            return False
+        self.answers[user_id] = option
+        self.names[user_id] = name
+        self.answered_at[user_id] = time.monotonic()
+        return True
+
+    def close(self):
+        """
+        Закрыть вопрос и подвести итог.
+
+        Возвращает (очки за вопрос {user_id: 1}, имена отвечавших,
+        число ответов по вариантам).
+        """
+        self.token = None
+        answer_index = self.question.answer_index
+        counts = [0] * len(self.question.options)
+        deltas = {}
+        for user_id, option in self.answers.items():
+            if option < len(counts):
+                counts[option] += 1
+            if option == answer_index:
+                deltas[user_id] = 1
+        for user_id in deltas:
+            self.scores[user_id] = self.scores.get(user_id, 0) + 1
+        return deltas, self.names, counts
+
+    def standings(self, limit=10):
+        """Лучшие игроки этой игры: [(user_id, очки)], по убыванию очков."""
+        return sorted(self.scores.items(), key=lambda item: -item[1])[:limit]
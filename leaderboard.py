@@ -0,0 +1,310 @@
+import heapq
+from datetime import datetime, timezone
+
+import messages
+
+# -------------------------
+# Таблица лидеров
+# -------------------------
+# Индекс поверх scoreboard, который обновляется по событиям (новый игрок,
+# смена имени, начисление очков) и не требует сортировки всех игроков
+# при каждом нажатии «Лучшие игроки».
+#
+# * топ-N хранится отдельным маленьким списком: очки только растут,
+#   поэтому игрок может войти в топ лишь в момент собственного обновления;
+# * место игрока считается деревом Фенвика по значениям очков —
+#   O(log max_score) на запрос и на обновление;
+# * готовый текст топа (по языкам) кэшируется и пересобирается, только когда
+#   меняется состав топа, чьи-то очки или имя внутри него.
+
+
+class _ScoreCounts:
+    """Дерево Фенвика: сколько игроков имеют каждое значение очков."""
+
+    def __init__(self, capacity=64):
+        self._tree = [0] * (capacity + 1)
+        self.total = 0
+
+    def _grow(self, score):
+        capacity = len(self._tree) - 1
+        while capacity <= score:
+            capacity *= 2
+        counts = [self.count_at(s) for s in range(len(self._tree) - 1)]
+        self._tree = [0] * (capacity + 1)
+        self.total = 0
+        for s, n in enumerate(counts):
+            if n:
+                self.add(s, n)
+
+    def add(self, score, n=1):
+        if score >= len(self._tree) - 1:
+            self._grow(score)
+        self.total += n
+        i = score + 1
+        while i < len(self._tree):
+            self._tree[i] += n
+            i += i & -i
+
+    def add_many(self, scores):
+        """По одному игроку на каждое значение из списка scores — за O(capacity + len(scores))."""
+        if not scores:
+            return
+        top = max(scores)
+        if top >= len(self._tree) - 1:
+            self._grow(top)
+        # Дерево Фенвика линейно по счётчикам: строим дерево для новых
+        # игроков снизу вверх и прибавляем к текущему поэлементно
+        tree = [0] * len(self._tree)
+        for score in scores:
+            tree[score + 1] += 1
+        size = len(tree)
+        for i in range(1, size):
+            parent = i + (i & -i)
+            if parent < size:
+                tree[parent] += tree[i]
+        self._tree = [a + b for a, b in zip(self._tree, tree)]
+        self.total += len(scores)
+
+    def count_le(self, score):
+        """Количество игроков с очками <= score."""
+        i = min(score + 1, len(self._tree) - 1)
+        result = 0
+        while i > 0:
+            result += self._tree[i]
+            i -= i & -i
+        return result
+
+    def count_at(self, score):
+        return self.count_le(score) - (self.count_le(score - 1) if score > 0 else 0)
+
+
+class Leaderboard:
+    """
+    Индекс лидеров поверх словаря scoreboard.
+
+    Записи scoreboard ({"username": ..., "score": ...}) остаются
+    источником данных; Leaderboard меняет очки только через add_score,
+    чтобы индекс и словарь не расходились.
+    При равенстве очков выше стоит тот, кто зарегистрировался раньше —
+    так же, как при стабильной сортировке словаря.
+    header — ключ заголовка топа в каталоге messages.
+    """
+
+    def __init__(self, scoreboard, size=10, header="top_header"):
+        self.scoreboard = scoreboard
+        self.size = size
+        self.header = header
+        self._seq = {}
+        self._next_seq = 0
+        self._counts = _ScoreCounts()
+        self._top = []
+        self._top_set = set()
+        # Готовый текст топа по языкам: {язык: текст}
+        self._texts = {}
+        self.add_players(scoreboard)
+
+    def __len__(self):
+        return len(self._seq)
+
+    def _key(self, user_id):
+        return (-self.scoreboard[user_id]["score"], self._seq[user_id])
+
+    def _register(self, user_id):
+        self._seq[user_id] = self._next_seq
+        self._next_seq += 1
+        self._counts.add(self.scoreboard[user_id]["score"])
+
+    def _rebuild_top(self):
+        self._top = heapq.nsmallest(self.size, self._seq, key=self._key)
+        self._top_set = set(self._top)
+        self._texts.clear()
+
+    def _promote(self, user_id):
+        """Пересчитать место user_id в топе после того, как его очки выросли."""
+        if user_id in self._top_set:
+            self._top.sort(key=self._key)
+            self._texts.clear()
+        elif len(self._top) < self.size:
+            self._top.append(user_id)
+            self._top.sort(key=self._key)
+            self._top_set.add(user_id)
+            self._texts.clear()
+        elif self._key(user_id) < self._key(self._top[-1]):
+            self._top_set.discard(self._top.pop())
+            self._top.append(user_id)
+            self._top.sort(key=self._key)
+            self._top_set.add(user_id)
+            self._texts.clear()
+
+    # -------------------------
+    # События
+    # -------------------------
+    def add_player(self, user_id):
+        """Вызывается после того, как запись user_id появилась в scoreboard."""
+        if user_id in self._seq:
+            return
+        self._register(user_id)
+        self._promote(user_id)
+
+    def add_players(self, user_ids):
+        """
+        add_player для многих игроков сразу (загрузка из хранилища): индекс
+        строится одним проходом, а топ пересобирается один раз.
+        """
+        new = [user_id for user_id in user_ids if user_id not in self._seq]
+        if not new:
+            return
+        self._seq.update(zip(new, range(self._next_seq, self._next_seq + len(new))))
+        self._next_seq += len(new)
+        scores = [self.scoreboard[user_id]["score"] for user_id in new]
+        self._counts.add_many(scores)
+        # Новые игроки зарегистрированы позже всех и при равных очках стоят
+        # ниже, так что в топ могут попасть только лучшие size из них
+        # (nlargest устойчив: из равных первым идёт раньше добавленный)
+        best = heapq.nlargest(self.size, range(len(new)), key=scores.__getitem__)
+        self._top = sorted(self._top + [new[i] for i in best], key=self._key)[:self.size]
+        self._top_set = set(self._top)
+        self._texts.clear()
+
+    def rename(self, user_id):
+        """Вызывается после смены username в scoreboard."""
+        if user_id in self._top_set:
+            self._texts.clear()
+
+    def add_score(self, user_id, delta):
+        """Начислить delta очков игроку и обновить индекс."""
+        entry = self.scoreboard[user_id]
+        old_score = entry["score"]
+        entry["score"] = old_score + delta
+        self._counts.add(old_score, -1)
+        self._counts.add(entry["score"])
+        if delta > 0:
+            self._promote(user_id)
+        elif delta < 0:
+            # Штрафов в викторине нет, но индекс не должен ломаться
+            self._rebuild_top()
+        return entry["score"]
+
+    # -------------------------
+    # Запросы
+    # -------------------------
+    def top(self):
+        """Список (user_id, username, score) для текущего топа."""
+        return [
+            (uid, self.scoreboard[uid]["username"], self.scoreboard[uid]["score"])
+            for uid in self._top
+        ]
+
+    def rank(self, user_id):
+        """Место игрока (1 — лучший); игроки с равными очками делят место."""
+        if user_id not in self._seq:
+            return None
+        score = self.scoreboard[user_id]["score"]
+        return self._counts.total - self._counts.count_le(score) + 1
+
+    def render(self, texts=messages.DEFAULT):
+        """Текст топа в каталоге texts; кэшируется до следующего изменения состава топа."""
+        text = self._texts.get(texts.language)
+        if text is None:
+            if not self._top:
+                text = texts.top_empty
+            else:
+                lines = [getattr(texts, self.header)(size=self.size)]
+                for i, (uid, username, score) in enumerate(self.top(), start=1):
+                    lines.append(texts.top_line(place=i, name=username, score=score))
+                text = "\n".join(lines) + "\n"
+            self._texts[texts.language] = text
+        return text
+
+
+# -------------------------
+# Таблицы за день и неделю
+# -------------------------
+# Для каждого периода — свой Leaderboard над своим словарём очков за этот
+# период, так что начисление стоит столько же, сколько в общей таблице,
+# а топ и место игрока отдаются из тех же кэшей. Периоды календарные
+# (день и ISO-неделя в заданном часовом поясе): при смене периода
+# (rollover, по расписанию) таблица заменяется пустой, ничего не
+# пересчитывается и не вычитается.
+
+PERIODS = ("day", "week")
+
+
+def period_key(period, now):
+    """Ключ периода, в который попадает момент now: "day:2024-05-01", "week:2024-W18"."""
+    if period == "day":
+        return now.strftime("day:%Y-%m-%d")
+    return now.strftime("week:%G-W%V")
+
+
+class PeriodLeaderboards:
+    """
+    Таблицы лидеров за текущие периоды PERIODS.
+
+    Args:
+        names: общий scoreboard — имена игроков берутся из него.
+        size: размер топа.
+        now: текущее время (datetime с часовым поясом).
+    """
+
+    def __init__(self, names, size=10, now=None):
+        self.names = names
+        self.size = size
+        # {период: ключ текущего периода / словарь очков / Leaderboard}
+        self.keys = {}
+        self.scoreboards = {}
+        self.boards = {}
+        self.rollover(now or datetime.now(timezone.utc))
+
+    def rollover(self, now):
+        """Начать новые периоды, если они сменились; возвращает список сменившихся."""
+        changed = []
+        for period in PERIODS:
+            key = period_key(period, now)
+            if self.keys.get(period) == key:
+                continue
+            self.keys[period] = key
+            scoreboard = self.scoreboards[period] = {}
+            self.boards[period] = Leaderboard(scoreboard, self.size, header=f"top_header_{period}")
+            changed.append(period)
+        return changed
+
+    def add_score(self, user_id, delta):
+        if delta <= 0:
+            return
+        for period in PERIODS:
+            scoreboard = self.scoreboards[period]
+            if user_id not in scoreboard:
+                scoreboard[user_id] = {"username": self.names[user_id]["username"], "score": 0}
+                self.boards[period].add_player(user_id)
+            self.boards[period].add_score(user_id, delta)
+
+    def rename(self, user_id):
+        """Вызывается после смены username в общем scoreboard."""
+        username = self.names[user_id]["username"]
+        for period in PERIODS:
+            entry = self.scoreboards[period].get(user_id)
+            if entry is not None:
+                entry["username"] = username
+                self.boards[period].rename(user_id)
+
+    def merge(self, key, scores):
+        """
+        Доначислить очки периода key из хранилища ({user_id: очки}):
+        другие воркеры или прошлый запуск. Очки за период только растут.
+        """
+        for period in PERIODS:
+            if self.keys[period] != key:
+                continue
+            scoreboard = self.scoreboards[period]
+            board = self.boards[period]
+            new = []
+            for user_id, score in scores.items():
+                entry = scoreboard.get(user_id)
+                if entry is None:
+                    names = self.names.get(user_id)
+                    scoreboard[user_id] = {"username": names["username"] if names else "", "score": score}
+                    new.append(user_id)
+                elif score > entry["score"]:
+                    board.add_score(user_id, score - entry["score"])
+            board.add_players(new)
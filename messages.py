@@ -0,0 +1,238 @@
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
+
+# -------------------------
+# Тексты ответов бота
+# -------------------------
+# Все тексты собраны в каталоги по языкам (RU, EN). Тексты с подстановками —
+# функции с f-строкой и только именованными аргументами
+# (Catalog.question(number=..., total=..., text=...)): порядок полей
+# в переводах может отличаться. Строки без подстановок — общие константы,
+# обработчики не разбирают шаблоны и не склеивают строки на каждый апдейт.
+# Клавиатуры меню собираются один раз на язык.
+#
+# Вердикт на ответ («Верно!/Неверно», правильный ответ, пояснение)
+# зависит только от вопроса и языка, поэтому кэшируется: на частые
+# вопросы повторно отправляется тот же объект строки.
+#
+# Язык — по language_code пользователя Telegram (for_language), по
+# умолчанию русский. Тексты вопросов и названия категорий берутся из паков
+# как есть.
+
+DEFAULT_LANGUAGE = "ru"
+# Сколько вердиктов держать в кэше на язык
+VERDICT_CACHE_SIZE = 8192
+# Периоды на кнопках топа: "all" — общая таблица, остальные — leaderboard.PERIODS
+TOP_PERIODS = ("all", "day", "week")
+
+RU = {
+    # Кнопки
+    "menu_start": "Начать викторину",
+    "menu_top": "Лучшие игроки",
+    "menu_shop": "Наш магазин",
+    "menu_back": "Вернуться в меню",
+    "shop_button": "Открыть магазин",
+    # Меню
+    "choose_action": "Выберите действие:",
+    "pick_menu_item": "Пожалуйста, выберите пункт из меню.",
+    "cancelled": "Викторина прервана. Возвращаемся в главное меню!",
+    "ask_name": "Отлично! Как тебя зовут?",
+    "name_too_long": lambda *, limit: f"Слишком длинное имя — не больше {limit} символов. Как тебя зовут?",
+    "shop": "Наш магазин в Telegram. Нажмите кнопку:",
+    "your_rank": lambda *, rank, total: f"\nТвоё место: {rank} из {total}",
+    "top_header": lambda *, size: f"Топ-{size} игроков:",
+    "top_header_day": lambda *, size: f"Топ-{size} за сегодня:",
+    "top_header_week": lambda *, size: f"Топ-{size} за неделю:",
+    "top_all": "За всё время",
+    "top_day": "Сегодня",
+    "top_week": "Неделя",
+    "top_line": lambda *, place, name, score: f"{place}. {name}: {score}",
+    "top_empty": "Пока никто не играл.",
+    # Викторина
+    "greeting": lambda *, name: f"Приятно познакомиться, {name}!\nВыберите категорию викторины:",
+    "pick_category": "Пожалуйста, выберите категорию из списка.",
+    "category_chosen": lambda *, title: (
+        f"Вы выбрали категорию: {title}\n"
+        "Начинаем викторину! Для отмены — /cancel."
+    ),
+    "question": lambda *, number, total, text: f"Вопрос {number}/{total}:\n{text}",
+    "verdict_correct": lambda *, answer, explanation: (
+        "Верно! +1 очко.\n"
+        f"Правильный ответ: {answer}\n"
+        f"Пояснение: {explanation}"
+    ),
+    "verdict_wrong": lambda *, answer, explanation: (
+        "Неверно.\n"
+        f"Правильный ответ: {answer}\n"
+        f"Пояснение: {explanation}"
+    ),
+    "verdict_and_question": lambda *, verdict, question: f"{verdict}\n\n{question}",
+    "answer_correct": "Верно!",
+    "answer_wrong": "Неверно.",
+    "question_passed": "Этот вопрос уже пройден.",
+    "quiz_changed": "Вопросы викторины обновились, начните её заново.",
+    "quiz_finished": lambda *, score, total: (
+        "Викторина завершена!\n"
+        f"Ты набрал {score} очк(а/ов) за эту игру.\n"
+        f"Твой общий счёт: {total}."
+    ),
+    "back_to_menu": "Нажмите, чтобы вернуться в главное меню:",
+    # Вопрос дня
+    "daily_question": lambda *, text: f"Вопрос дня:\n{text}",
+    "daily_answered": lambda *, question, verdict: f"{question}\n\n{verdict}",
+    # Групповые раунды
+    "round_running": "Раунд уже идёт — отвечайте на вопрос выше.",
+    "round_no_category": lambda *, titles: f"Нет такой категории. Есть: {titles}.",
+    "round_intro": lambda *, title, count, seconds: (
+        f"Групповой раунд «{title}»: {count} вопросов, "
+        f"на каждый {seconds} с. Засчитывается первый ответ.\n\n"
+    ),
+    "round_answer_accepted": "Ответ принят!",
+    "round_already_answered": "Вы уже ответили на этот вопрос.",
+    "round_question_closed": "Этот вопрос уже закрыт.",
+    "round_result": lambda *, answer, explanation, correct, answered: (
+        f"Правильный ответ: {answer}\n"
+        f"Пояснение: {explanation}\n"
+        f"Верно ответили: {correct} из {answered}."
+    ),
+    "round_finished": lambda *, standings: f"\n\nРаунд окончен!\n{standings}",
+    "round_nobody": "Никто не ответил верно.",
+    "round_not_running": "Раунд не идёт. Начать: /round",
+    "round_stopped": lambda *, standings: f"Раунд остановлен.\n{standings}",
+}
+
+EN = {
+    "menu_start": "Start quiz",
+    "menu_top": "Top players",
+    "menu_shop": "Our shop",
+    "menu_back": "Back to menu",
+    "shop_button": "Open shop",
+    "choose_action": "Choose an action:",
+    "pick_menu_item": "Please choose a menu item.",
+    "cancelled": "Quiz cancelled. Back to the main menu!",
+    "ask_name": "Great! What's your name?",
+    "name_too_long": lambda *, limit: (
+        f"That name is too long — {limit} characters at most. What's your name?"
+    ),
+    "shop": "Our shop on Telegram. Tap the button:",
+    "your_rank": lambda *, rank, total: f"\nYour place: {rank} of {total}",
+    "top_header": lambda *, size: f"Top {size} players:",
+    "top_header_day": lambda *, size: f"Top {size} today:",
+    "top_header_week": lambda *, size: f"Top {size} this week:",
+    "top_all": "All time",
+    "top_day": "Today",
+    "top_week": "This week",
+    "top_line": lambda *, place, name, score: f"{place}. {name}: {score}",
+    "top_empty": "Nobody has played yet.",
+    "greeting": lambda *, name: f"Nice to meet you, {name}!\nChoose a quiz category:",
+    "pick_category": "Please choose a category from the list.",
+    "category_chosen": lambda *, title: f"Category: {title}\nLet's start! To cancel, send /cancel.",
+    "question": lambda *, number, total, text: f"Question {number}/{total}:\n{text}",
+    "verdict_correct": lambda *, answer, explanation: (
+        "Correct! +1 point.\n"
+        f"Right answer: {answer}\n"
+        f"Explanation: {explanation}"
+    ),
+    "verdict_wrong": lambda *, answer, explanation: (
+        "Wrong.\n"
+        f"Right answer: {answer}\n"
+        f"Explanation: {explanation}"
+    ),
+    "verdict_and_question": lambda *, verdict, question: f"{verdict}\n\n{question}",
+    "answer_correct": "Correct!",
+    "answer_wrong": "Wrong.",
+    "question_passed": "This question is already done.",
+    "quiz_changed": "The quiz questions have been updated, please start again.",
+    "quiz_finished": lambda *, score, total: (
+        "Quiz finished!\n"
+        f"You scored {score} point(s) this game.\n"
+        f"Your total score: {total}."
+    ),
+    "back_to_menu": "Tap to return to the main menu:",
+    "daily_question": lambda *, text: f"Question of the day:\n{text}",
+    "daily_answered": lambda *, question, verdict: f"{question}\n\n{verdict}",
+    "round_running": "A round is already running — answer the question above.",
+    "round_no_category": lambda *, titles: f"No such category. Available: {titles}.",
+    "round_intro": lambda *, title, count, seconds: (
+        f"Group round «{title}»: {count} questions, "
+        f"{seconds} s for each. Only the first answer counts.\n\n"
+    ),
+    "round_answer_accepted": "Answer accepted!",
+    "round_already_answered": "You have already answered this question.",
+    "round_question_closed": "This question is already closed.",
+    "round_result": lambda *, answer, explanation, correct, answered: (
+        f"Right answer: {answer}\n"
+        f"Explanation: {explanation}\n"
+        f"Answered correctly: {correct} of {answered}."
+    ),
+    "round_finished": lambda *, standings: f"\n\nRound over!\n{standings}",
+    "round_nobody": "Nobody answered correctly.",
+    "round_not_running": "No round is running. Start one: /round",
+    "round_stopped": lambda *, standings: f"Round stopped.\n{standings}",
+}
+
+LANGUAGES = {"ru": RU, "en": EN}
+
+
+class Catalog:
+    """Тексты и клавиатуры одного языка; атрибуты — строки и функции текстов с подстановками."""
+
+    def __init__(self, language, texts):
+        self.language = language
+        for key, text in texts.items():
+            setattr(self, key, text)
+        self.main_menu_keyboard = ReplyKeyboardMarkup(
+            [[self.menu_start], [self.menu_top], [self.menu_shop]], resize_keyboard=True
+        )
+        self.back_keyboard = ReplyKeyboardMarkup(
+            [[self.menu_back]], one_time_keyboard=True, resize_keyboard=True
+        )
+        self.shop_markup = InlineKeyboardMarkup(
+            [[InlineKeyboardButton(text=self.shop_button, url="https://t.me/magaz_volley")]]
+        )
+        # Переключение топа: за всё время / день / неделю (см. bot.show_top_period)
+        self.top_periods_keyboard = InlineKeyboardMarkup([[
+            InlineKeyboardButton(text=getattr(self, f"top_{period}"), callback_data=f"top:{period}")
+            for period in TOP_PERIODS
+        ]])
+        # {Question: (вердикт на неверный ответ, на верный)}
+        self._verdicts = {}
+
+    def verdict(self, question, correct):
+        """Текст вердикта; один объект строки на вопрос и исход."""
+        pair = self._verdicts.get(question)
+        if pair is None:
+            # Question сравнивается по identity: после перезагрузки паков
+            # вопросы новые, а старые вердикты уходят при переполнении
+            if len(self._verdicts) >= VERDICT_CACHE_SIZE:
+                self._verdicts.clear()
+            pair = self._verdicts[question] = (
+                self.verdict_wrong(answer=question.answer, explanation=question.explanation),
+                self.verdict_correct(answer=question.answer, explanation=question.explanation),
+            )
+        return pair[bool(correct)]
+
+
+CATALOGS = {language: Catalog(language, texts) for language, texts in LANGUAGES.items()}
+DEFAULT = CATALOGS[DEFAULT_LANGUAGE]
+_by_code = {}
+
+# Кнопки меню на всех языках -> действие
+MENU_ACTIONS = {}
+for _catalog in CATALOGS.values():
+    for _action in ("start", "top", "shop", "back"):
+        MENU_ACTIONS[getattr(_catalog, f"menu_{_action}")] = _action
+
+
+def for_language(code):
+    """Каталог для language_code из Telegram ("en", "en-US", None, ...)."""
+    catalog = _by_code.get(code)
+    if catalog is None:
+        base = code.split("-")[0].lower() if code else DEFAULT_LANGUAGE
+        catalog = _by_code[code] = CATALOGS.get(base, DEFAULT)
+    return catalog
+
+
+def for_update(update):
+    """Каталог на языке автора апдейта."""
+    user = update.effective_user
+    return for_language(user.language_code if user is not None else None)
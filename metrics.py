@@ -0,0 +1,261 @@
+import bisect
+import collections
+import functools
+import time
+
+# -------------------------
+# Метрики в формате Prometheus
+# -------------------------
+# Без prometheus_client: счётчики и гистограммы — это несколько чисел
+# в памяти процесса. Горячий путь (обработка апдейта) только прибавляет:
+# дочерние метрики с конкретными метками создаются один раз при сборке
+# приложения, а bisect по границам корзин стоит доли микросекунды.
+# Значения, которые и так где-то посчитаны (сессии по состояниям, очередь
+# отправки), не дублируются, а читаются в момент запроса /metrics.
+#
+# Забрать локально:
+#   curl localhost:9100/metrics
+
+# Границы корзин времени (секунды): от 50 мкс до 10 с
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+
+    def labels(self, *values):
+        """Дочерняя метрика с заданными значениями меток; её стоит запомнить, а не искать на каждый вызов."""
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _default(self):
+        # Метрика без меток — сама себе единственный ребёнок
+        return self.labels()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+    _new_child = _CounterChild
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def _render_child(self, values, child):
+        yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, value):
+        self.value = value
+
+
+class Gauge(_Metric):
+    """
+    Текущее значение. Если задан collect, значения берутся из него при каждом
+    запросе: collect() возвращает число или {кортеж меток: число}.
+    """
+
+    kind = "gauge"
+    _new_child = _GaugeChild
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def set(self, value):
+        self._default().set(value)
+
+    def render(self):
+        if self.collect is not None:
+            collected = self.collect()
+            if not isinstance(collected, dict):
+                collected = {(): collected}
+            self._children = {}
+            for values, value in collected.items():
+                self.labels(*values).set(value)
+        return super().render()
+
+    def _render_child(self, values, child):
+        yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # Последняя корзина — всё, что больше верхней границы (+Inf)
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def _render_child(self, values, child):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, (("le", _format_value(float(bound))),))
+            yield f"{self.name}_bucket{labels} {cumulative}"
+        labels = _format_labels(self.labelnames, values)
+        yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+        yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = collections.OrderedDict()
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name):
+        self._metrics.pop(name, None)
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus 0.0.4."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# -------------------------
+# Метрики бота
+# -------------------------
+HANDLER_SECONDS = REGISTRY.register(Histogram(
+    "quiz_handler_seconds", "Время работы обработчика апдейта", ("handler",)
+))
+HANDLER_ERRORS = REGISTRY.register(Counter(
+    "quiz_handler_errors_total", "Исключения в обработчиках", ("handler",)
+))
+STATE_UPDATES = REGISTRY.register(Counter(
+    "quiz_state_updates_total", "Апдейты по состоянию разговора, в котором они пришли", ("state",)
+))
+SESSIONS_EXPIRED = REGISTRY.register(Counter(
+    "quiz_sessions_expired_total", "Брошенные сессии, закрытые по SESSION_TTL"
+))
+PERSISTENCE_WRITE_SECONDS = REGISTRY.register(Histogram(
+    "quiz_persistence_write_seconds", "Время записи пачки изменений SQLitePersistence"
+))
+PERSISTENCE_WRITE_ROWS = REGISTRY.register(Counter(
+    "quiz_persistence_written_rows_total", "Записанные SQLitePersistence строки"
+))
+SCORE_FLUSH_SECONDS = REGISTRY.register(Histogram(
+    "quiz_score_flush_seconds", "Время сброса очков в ScoreStore"
+))
+UPDATES_DROPPED = REGISTRY.register(Counter(
+    "quiz_updates_dropped_total", "Апдейты, отброшенные защитой от флуда", ("reason",)
+))
+OUTBOUND_CALL_SECONDS = REGISTRY.register(Histogram(
+    "quiz_outbound_call_seconds", "Время вызова sendMessage", ("result",)
+))
+OUTBOUND_QUEUE_SECONDS = REGISTRY.register(Histogram(
+    "quiz_outbound_delivery_seconds", "От постановки в очередь до доставки сообщения"
+))
+
+
+def instrument(callback, handler, state=None):
+    """
+    Обернуть callback обработчика: время и исключения под меткой handler,
+    счётчик апдейтов под меткой state (имя состояния разговора).
+    """
+    timing = HANDLER_SECONDS.labels(handler)
+    errors = HANDLER_ERRORS.labels(handler)
+    updates = STATE_UPDATES.labels(state) if state is not None else None
+    clock = time.perf_counter
+
+    @functools.wraps(callback)
+    async def wrapped(update, context):
+        if updates is not None:
+            updates.value += 1
+        start = clock()
+        try:
+            return await callback(update, context)
+        except Exception:
+            errors.value += 1
+            raise
+        finally:
+            timing.observe(clock() - start)
+
+    return wrapped
+
+
+def metrics_route(registry=REGISTRY):
+    """Обработчик GET /metrics для webhook.HTTPServer."""
+
+    async def handle(method, headers, body):
+        if method != "GET":
+            return 405, "text/plain", b""
+        return 200, "text/plain; version=0.0.4; charset=utf-8", registry.render().encode()
+
+    return handle
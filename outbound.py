@@ -0,0 +1,216 @@
+import asyncio
+import collections
+import logging
+import time
+
+from telegram.error import RetryAfter, TelegramError
+
+from metrics import OUTBOUND_CALL_SECONDS, OUTBOUND_QUEUE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# -------------------------
+# Очередь исходящих сообщений
+# -------------------------
+# Обработчики не ждут Bot API: Outbox.send кладёт сообщение в очередь чата
+# и сразу возвращает управление. Фоновые задачи забирают всё, что накопилось
+# в чате, склеивают подряд идущие сообщения (вердикт + следующий вопрос,
+# итог викторины + кнопка меню) в одно и отправляют с учётом лимитов:
+# токен-бакет на чат и общий на бота. На 429 ждём, сколько сказал сервер,
+# и повторяем. Для каждого чата в полёте не больше одной отправки, так что
+# порядок сообщений сохраняется.
+#
+# Бакеты чатов — OrderedDict по давности последней отправки (как в
+# throttle.Throttle), не больше MAX_CHAT_BUCKETS: при переполнении
+# выбрасывается самый давний. За это время он успел наполниться, так что
+# для его чата ничего не меняется.
+
+# Лимит Telegram на длину текста сообщения
+MAX_MESSAGE_LENGTH = 4096
+MERGE_SEPARATOR = "\n\n"
+LATENCY_WINDOW = 1024
+MAX_CHAT_BUCKETS = 10000
+
+
+class TokenBucket:
+    """Бакет с резервированием: reserve() возвращает, сколько подождать до своего токена."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now=None):
+        self._refill(time.monotonic() if now is None else now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class _Message:
+    __slots__ = ("text", "reply_markup", "queued_at")
+
+    def __init__(self, text, reply_markup, queued_at):
+        self.text = text
+        self.reply_markup = reply_markup
+        self.queued_at = queued_at
+
+
+def merge_messages(messages):
+    """
+    Склеить подряд идущие сообщения одного чата.
+
+    Сообщение можно дописать к предыдущему, если у предыдущего нет клавиатуры
+    (её нельзя перенести на другой текст) и итог влезает в лимит Telegram.
+    """
+    merged = []
+    for message in messages:
+        last = merged[-1] if merged else None
+        if (
+            last is not None
+            and last.reply_markup is None
+            and len(last.text) + len(MERGE_SEPARATOR) + len(message.text) <= MAX_MESSAGE_LENGTH
+        ):
+            merged[-1] = _Message(
+                last.text + MERGE_SEPARATOR + message.text, message.reply_markup, last.queued_at
+            )
+        else:
+            merged.append(message)
+    return merged
+
+
+class Outbox:
+    """
+    Очередь отправки с лимитами.
+
+    Args:
+        bot: telegram.Bot, через который отправляем.
+        global_rate: сообщений в секунду на всего бота.
+        chat_rate, chat_burst: скорость и запас бакета одного чата.
+        workers: сколько отправок может идти одновременно (в разные чаты).
+        max_retries: сколько раз повторять после 429.
+    """
+
+    def __init__(self, bot, global_rate=30, chat_rate=1, chat_burst=3, workers=8, max_retries=5):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        # Общий лимит бота; его же берёт рассылка (broadcast.Broadcast), чтобы делить темп с ответами
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets = collections.OrderedDict()
+        self._pending = {}
+        self._scheduled = set()
+        self._ready = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(workers)]
+
+        # Метрики
+        self.depth = 0
+        self.sent = 0
+        self.merged = 0
+        self.retried = 0
+        self.failed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self._call_ok = OUTBOUND_CALL_SECONDS.labels("ok")
+        self._call_retry = OUTBOUND_CALL_SECONDS.labels("retry_after")
+        self._call_error = OUTBOUND_CALL_SECONDS.labels("error")
+
+    def send(self, chat_id, text, reply_markup=None):
+        """Поставить сообщение в очередь чата; не ждёт отправки."""
+        self._pending.setdefault(chat_id, []).append(_Message(text, reply_markup, time.monotonic()))
+        self.depth += 1
+        if chat_id not in self._scheduled:
+            self._scheduled.add(chat_id)
+            self._ready.put_nowait(chat_id)
+
+    async def _worker(self):
+        while True:
+            chat_id = await self._ready.get()
+            if chat_id is None:
+                return
+            batch = self._pending.pop(chat_id)
+            self.depth -= len(batch)
+            messages = merge_messages(batch)
+            self.merged += len(batch) - len(messages)
+            for message in messages:
+                await self._deliver(chat_id, message)
+            if chat_id in self._pending:
+                # Пока отправляли, в чат добавились сообщения — в конец очереди
+                self._ready.put_nowait(chat_id)
+            else:
+                self._scheduled.discard(chat_id)
+
+    def _chat_bucket(self, chat_id):
+        buckets = self._chat_buckets
+        bucket = buckets.get(chat_id)
+        if bucket is None:
+            if len(buckets) >= MAX_CHAT_BUCKETS:
+                buckets.popitem(last=False)
+            bucket = buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        else:
+            buckets.move_to_end(chat_id)
+        return bucket
+
+    async def _deliver(self, chat_id, message):
+        for attempt in range(self.max_retries + 1):
+            now = time.monotonic()
+            delay = max(self._chat_bucket(chat_id).reserve(now), self.global_bucket.reserve(now))
+            if delay:
+                await asyncio.sleep(delay)
+            called = time.monotonic()
+            try:
+                await self.bot.send_message(chat_id, message.text, reply_markup=message.reply_markup)
+            except RetryAfter as exc:
+                self._call_retry.observe(time.monotonic() - called)
+                self.retried += 1
+                retry_after = getattr(exc.retry_after, "total_seconds", lambda: exc.retry_after)()
+                logger.warning("429 для чата %s, ждём %s с", chat_id, retry_after)
+                await asyncio.sleep(retry_after)
+                continue
+            except TelegramError as exc:
+                self._call_error.observe(time.monotonic() - called)
+                self.failed += 1
+                logger.warning("Не удалось отправить сообщение в чат %s: %s", chat_id, exc)
+                return
+            now = time.monotonic()
+            self._call_ok.observe(now - called)
+            latency = now - message.queued_at
+            OUTBOUND_QUEUE_SECONDS.observe(latency)
+            self.sent += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            self._latencies.append(latency)
+            return
+        self.failed += 1
+        logger.warning("Сообщение в чат %s не отправлено после %d повторов", chat_id, self.max_retries)
+
+    def stats(self):
+        """Текущие метрики очереди."""
+        recent = sorted(self._latencies)
+        return {
+            "queue_depth": self.depth,
+            "chats_waiting": len(self._scheduled),
+            "sent": self.sent,
+            "merged": self.merged,
+            "retried": self.retried,
+            "failed": self.failed,
+            "latency_avg_s": self.latency_total / self.sent if self.sent else 0.0,
+            "latency_p95_s": recent[int(0.95 * (len(recent) - 1))] if recent else 0.0,
+            "latency_max_s": self.latency_max,
+        }
+
+    async def close(self):
+        """Дождаться отправки всего, что в очереди, и остановить задачи."""
+        while self._scheduled:
+            await asyncio.sleep(0.01)
+        for _ in self._workers:
+            self._ready.put_nowait(None)
+        await asyncio.gather(*self._workers)
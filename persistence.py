@@ -0,0 +1,362 @@
+import asyncio
+import json
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from metrics import PERSISTENCE_WRITE_ROWS, PERSISTENCE_WRITE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# -------------------------
+# Поштучное хранение состояния бота
+# -------------------------
+# PicklePersistence при каждом сбросе заново сериализует user_data всех
+# игроков в один файл. Здесь каждая запись (игрок, чат, разговор) лежит
+# отдельной строкой SQLite, а пишутся только те, что изменились: Application
+# передаёт в update_user_data лишь «тронутых» пользователей, мы складываем
+# их в буфер и коммитим одной транзакцией в фоновом потоке.
+# Перезаписанные строки оставляют свободные страницы — их периодически
+# возвращает incremental_vacuum (см. compact).
+#
+# Тёплый старт: с lazy=True (по умолчанию) user_data и chat_data при запуске
+# не читаются вовсе — запись игрока поднимается из базы в refresh_user_data
+# при его первом апдейте после рестарта. Сразу читаются только состояния
+# разговоров (их ConversationHandler забирает целиком). Чтобы не разбирать
+# их построчно, при штатной остановке (flush) все разговоры доли
+# сохраняются одним снимком, а первая же запись разговора после запуска
+# снимок удаляет — после падения читаем построчно. Построчное чтение
+# тоже облегчено: целое состояние хранится числом, а не pickle, а ключ
+# "[chat_id, user_id]" разбирается без json.loads.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_data (id INTEGER PRIMARY KEY, data BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS chat_data (id INTEGER PRIMARY KEY, data BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS singletons (name TEXT PRIMARY KEY, data BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS conversations (
+    name  TEXT NOT NULL,
+    key   TEXT NOT NULL,
+    state BLOB NOT NULL,
+    PRIMARY KEY (name, key)
+);
+CREATE TABLE IF NOT EXISTS conversation_snapshots (
+    name TEXT NOT NULL,
+    part TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (name, part)
+);
+"""
+
+# Свободных страниц больше этой доли файла — пора сжимать
+COMPACT_FREE_RATIO = 0.25
+# Проверяем необходимость сжатия раз в столько коммитов
+COMPACT_CHECK_EVERY = 100
+# Через сколько секунд повторить коммит, который не удался
+COMMIT_RETRY_DELAY = 1
+
+_DELETED = object()
+
+
+def _dumps(obj):
+    return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _parse_key(text):
+    # Почти всегда это "[chat_id, user_id]" — целые числа без вложенности
+    try:
+        return tuple(map(int, text[1:-1].split(",")))
+    except ValueError:
+        return tuple(json.loads(text))
+
+
+class SQLitePersistence(BasePersistence):
+    """
+    BasePersistence, которая пишет только изменившиеся записи.
+
+    Args:
+        filepath: путь к файлу SQLite.
+        store_data: какие виды данных сохранять (как у PicklePersistence).
+        update_interval: период, с которым Application отдаёт изменения.
+        partition: (номер, всего) — загружать только игроков своей доли
+            (см. cluster.partition_of); None — всех. Файл при этом общий
+            для всех воркеров.
+        lazy: читать user_data/chat_data по одному при первом обращении,
+            а не все при запуске.
+    """
+
+    def __init__(self, filepath="bot_state.db", store_data=None, update_interval=60, partition=None, lazy=True):
+        super().__init__(store_data=store_data or PersistenceInput(), update_interval=update_interval)
+        self.filepath = filepath
+        self.partition = partition
+        self.lazy = lazy
+        # id, чьи записи уже в памяти Application (или точно отсутствуют в базе)
+        self._loaded = {"user_data": set(), "chat_data": set()}
+        # Файл может быть общим для нескольких процессов — ждём чужую запись, а не падаем
+        self._conn = sqlite3.connect(filepath, check_same_thread=False, timeout=30)
+        self._conn_lock = threading.Lock()
+        # auto_vacuum можно включить только на пустой базе — до создания таблиц
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+        self._dirty_users = {}
+        self._dirty_chats = {}
+        self._dirty_singletons = {}
+        self._dirty_conversations = {}
+        self._commit_task = None
+        self._commits = 0
+        self._conversation_names = set()
+
+    # -------------------------
+    # Чтение
+    # -------------------------
+    def _fetch_table(self, table):
+        with self._conn_lock:
+            if self.partition is None:
+                rows = self._conn.execute(f"SELECT id, data FROM {table}").fetchall()
+            else:
+                index, count = self.partition
+                rows = self._conn.execute(
+                    f"SELECT id, data FROM {table} WHERE abs(id) % ? = ?", (count, index)
+                ).fetchall()
+        return {row_id: pickle.loads(data) for row_id, data in rows}
+
+    def _owns_id(self, row_id):
+        return self.partition is None or abs(row_id) % self.partition[1] == self.partition[0]
+
+    def _owns(self, key):
+        # Ключ разговора — (chat_id, user_id); доля определяется игроком
+        return self._owns_id(key[-1])
+
+    def _fetch_singleton(self, name, default):
+        with self._conn_lock:
+            row = self._conn.execute("SELECT data FROM singletons WHERE name = ?", (name,)).fetchone()
+        return pickle.loads(row[0]) if row else default
+
+    def _fetch_row(self, table, row_id):
+        with self._conn_lock:
+            row = self._conn.execute(f"SELECT data FROM {table} WHERE id = ?", (row_id,)).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def _load_into(self, table, row_id, data):
+        loaded = self._loaded[table]
+        if row_id in loaded:
+            return
+        loaded.add(row_id)
+        stored = self._fetch_row(table, row_id)
+        if stored:
+            # В памяти могло что-то появиться до загрузки — оно новее
+            for key, value in stored.items():
+                data.setdefault(key, value)
+
+    def load_user_data(self, user_id, user_data):
+        """Дочитать запись игрока в user_data, если её ещё не поднимали из базы."""
+        if self.lazy:
+            self._load_into("user_data", user_id, user_data)
+
+    async def get_user_data(self):
+        return {} if self.lazy else self._fetch_table("user_data")
+
+    async def get_chat_data(self):
+        return {} if self.lazy else self._fetch_table("chat_data")
+
+    async def get_bot_data(self):
+        return self._fetch_singleton("bot_data", {})
+
+    async def get_callback_data(self):
+        return self._fetch_singleton("callback_data", None)
+
+    def _part(self):
+        # Снимок годится только для той же доли при том же числе воркеров
+        return "all" if self.partition is None else "%d/%d" % self.partition
+
+    def _sibling_parts(self):
+        # LIKE-шаблон долей того же разбиения; без разбиения — ничего не совпадает
+        return "" if self.partition is None else "%%/%d" % self.partition[1]
+
+    async def get_conversations(self, name):
+        self._conversation_names.add(name)
+        with self._conn_lock:
+            snapshot = self._conn.execute(
+                "SELECT data FROM conversation_snapshots WHERE name = ? AND part = ?", (name, self._part())
+            ).fetchone()
+        if snapshot is not None:
+            return pickle.loads(snapshot[0])
+        return self._fetch_conversations(name)
+
+    def _fetch_conversations(self, name):
+        with self._conn_lock:
+            rows = self._conn.execute(
+                "SELECT key, state FROM conversations WHERE name = ?", (name,)
+            ).fetchall()
+        conversations = {}
+        for key, state in rows:
+            key = _parse_key(key)
+            if self._owns(key):
+                conversations[key] = state if type(state) is int else pickle.loads(state)
+        return conversations
+
+    # -------------------------
+    # Запись: только в буфер, коммит — пачкой
+    # -------------------------
+    def _schedule_commit(self):
+        # Application обновляет всех «грязных» пользователей через asyncio.gather;
+        # задача коммита запускается после того, как все они легли в буфер
+        if self._commit_task is None or self._commit_task.done():
+            self._commit_task = asyncio.get_running_loop().create_task(self._commit_pending())
+
+    async def update_user_data(self, user_id, data):
+        # Игрок из чужой доли попадает к нам только через групповой чат
+        # (см. cluster.routing_id); его запись пишет свой воркер
+        if not self._owns_id(user_id):
+            return
+        # Пустая запись и отсутствие записи неотличимы — строку не храним
+        self._dirty_users[user_id] = data if data else _DELETED
+        self._schedule_commit()
+
+    async def update_chat_data(self, chat_id, data):
+        if not self._owns_id(chat_id):
+            return
+        self._dirty_chats[chat_id] = data if data else _DELETED
+        self._schedule_commit()
+
+    async def update_bot_data(self, data):
+        self._dirty_singletons["bot_data"] = data
+        self._schedule_commit()
+
+    async def update_callback_data(self, data):
+        self._dirty_singletons["callback_data"] = data
+        self._schedule_commit()
+
+    async def update_conversation(self, name, key, new_state):
+        self._dirty_conversations[(name, json.dumps(list(key)))] = (
+            _DELETED if new_state is None else new_state
+        )
+        self._schedule_commit()
+
+    async def drop_user_data(self, user_id):
+        self._dirty_users[user_id] = _DELETED
+        self._schedule_commit()
+
+    async def drop_chat_data(self, chat_id):
+        self._dirty_chats[chat_id] = _DELETED
+        self._schedule_commit()
+
+    async def refresh_user_data(self, user_id, user_data):
+        # Вызывается на каждый апдейт; читаем базу только в первый раз
+        self.load_user_data(user_id, user_data)
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        if self.lazy:
+            self._load_into("chat_data", chat_id, chat_data)
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    def _has_dirty(self):
+        return bool(self._dirty_users or self._dirty_chats or self._dirty_singletons or self._dirty_conversations)
+
+    async def _commit_pending(self):
+        # Пока идёт запись, в буфер могут прийти новые изменения — забираем и их
+        while self._has_dirty():
+            batch = (
+                self._dirty_users,
+                self._dirty_chats,
+                self._dirty_singletons,
+                self._dirty_conversations,
+            )
+            self._dirty_users = {}
+            self._dirty_chats = {}
+            self._dirty_singletons = {}
+            self._dirty_conversations = {}
+            try:
+                await asyncio.to_thread(self._write_batch, *batch)
+            except Exception:
+                # Например, "database is locked": возвращаем пачку в буфер (более
+                # поздние изменения тех же записей важнее) и повторяем позже
+                newer = (self._dirty_users, self._dirty_chats, self._dirty_singletons, self._dirty_conversations)
+                self._dirty_users, self._dirty_chats, self._dirty_singletons, self._dirty_conversations = [
+                    {**old, **new} for old, new in zip(batch, newer)
+                ]
+                logger.error(
+                    "Не удалось записать состояние бота, повтор через %s с", COMMIT_RETRY_DELAY, exc_info=True
+                )
+                asyncio.get_running_loop().call_later(COMMIT_RETRY_DELAY, self._schedule_commit)
+                return
+
+    def _write_batch(self, users, chats, singletons, conversations):
+        def split(items):
+            upserts = [(key, _dumps(value)) for key, value in items.items() if value is not _DELETED]
+            deletes = [(key,) for key, value in items.items() if value is _DELETED]
+            return upserts, deletes
+
+        started = time.perf_counter()
+        with self._conn_lock, self._conn:
+            for table, items in (("user_data", users), ("chat_data", chats)):
+                upserts, deletes = split(items)
+                self._conn.executemany(f"INSERT OR REPLACE INTO {table} (id, data) VALUES (?, ?)", upserts)
+                self._conn.executemany(f"DELETE FROM {table} WHERE id = ?", deletes)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO singletons (name, data) VALUES (?, ?)",
+                [(name, _dumps(value)) for name, value in singletons.items()],
+            )
+            # Снимок устарел, как только разговор поменялся. Устарели и снимки,
+            # снятые при другом числе воркеров (в них могут быть те же ключи);
+            # целы только снимки чужих долей при том же разбиении
+            self._conn.executemany(
+                "DELETE FROM conversation_snapshots WHERE name = ? AND (part = ? OR part NOT LIKE ?)",
+                [(name, self._part(), self._sibling_parts()) for name in {name for name, _ in conversations}],
+            )
+            for (name, key), state in conversations.items():
+                if state is _DELETED:
+                    self._conn.execute(
+                        "DELETE FROM conversations WHERE name = ? AND key = ?", (name, key)
+                    )
+                else:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)",
+                        (name, key, state if type(state) is int else _dumps(state)),
+                    )
+        PERSISTENCE_WRITE_SECONDS.observe(time.perf_counter() - started)
+        PERSISTENCE_WRITE_ROWS.inc(len(users) + len(chats) + len(singletons) + len(conversations))
+        self._commits += 1
+        if self._commits % COMPACT_CHECK_EVERY == 0:
+            self.compact()
+
+    def compact(self, force=False):
+        """Вернуть свободные страницы и обрезать WAL, если мусора накопилось много."""
+        with self._conn_lock:
+            free = self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+            total = self._conn.execute("PRAGMA page_count").fetchone()[0]
+            if force or (total and free / total > COMPACT_FREE_RATIO):
+                self._conn.execute("PRAGMA incremental_vacuum")
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                return True
+        return False
+
+    def save_snapshots(self):
+        """Сохранить разговоры своей доли одним снимком для быстрого следующего запуска."""
+        for name in self._conversation_names:
+            data = _dumps(self._fetch_conversations(name))
+            with self._conn_lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO conversation_snapshots (name, part, data) VALUES (?, ?, ?)",
+                    (name, self._part(), data),
+                )
+
+    async def flush(self):
+        if self._commit_task is not None:
+            await self._commit_task
+        await self._commit_pending()
+        if self._has_dirty():
+            logger.error("При остановке не записана часть состояния бота (см. ошибку выше)")
+        await asyncio.to_thread(self.save_snapshots)
+        await asyncio.to_thread(self.compact)
+        with self._conn_lock:
+            self._conn.close()
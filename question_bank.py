@@ -0,0 +1,470 @@
+import csv
+import itertools
+import json
+import logging
+import mmap
+import os
+import random
+import struct
+from array import array
+from collections.abc import Sequence
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
+
+logger = logging.getLogger(__name__)
+
+# -------------------------
+# Банк вопросов
+# -------------------------
+# Вопросы лежат в паках — файлах JSON/CSV в каталоге packs/. Каждый пак один
+# раз компилируется в бинарный индекс (packs/.cache/<имя>.qidx): таблица
+# категорий, смещения записей и сами записи в UTF-8. Индекс открывается
+# через mmap, поэтому загрузка не зависит от числа вопросов, а текст вопроса
+# декодируется только при первом обращении (и держится в LRU-кэше).
+#
+# Записи неизменяемые (frozen + slots), ответ проверяется по словарю
+# «текст варианта -> индекс» (или сразу по индексу из inline-кнопки),
+# клавиатура для каждого порядка вариантов собирается один раз. Сессия игрока хранит только номер категории
+# и array упакованных индексов (см. new_order / resolve).
+#
+# Форматы паков:
+#   JSON: {"title": "...", "questions": [{"question", "options", "answer", "explanation"}]}
+#   CSV:  category,question,answer,explanation,option1,option2,... (по строке на вопрос)
+
+PACK_EXTENSIONS = (".json", ".csv")
+CACHE_DIR = ".cache"
+# Сколько декодированных вопросов держать в памяти на пак
+DECODE_CACHE_SIZE = 4096
+# Сколько вопросов задаём за одну викторину
+QUIZ_LENGTH = 20
+# callback_data inline-кнопки ответа (см. InlineKeyboards)
+ANSWER_CALLBACK_PATTERN = r"^q:\d+:\d+:\d+$"
+
+# VQB2: вопросы с неверным числом вариантов или ответом больше не попадают в индекс
+_MAGIC = b"VQB2"
+# magic, mtime_ns исходника, размер исходника, число категорий, число вопросов
+_HEADER = struct.Struct("<4sQQII")
+# длина названия, число вопросов
+_CATEGORY = struct.Struct("<II")
+# число вариантов, индекс правильного
+_RECORD = struct.Struct("<BB")
+_LENGTH = struct.Struct("<I")
+
+# Номер перестановки вариантов хранится в младших 8 битах элемента порядка
+# (см. QuestionBank.packed): 5! = 120 помещается, 6! = 720 уже нет
+MIN_OPTIONS = 2
+MAX_OPTIONS = 5
+
+_OPTION_ORDERS = {}
+
+
+def option_orders(n):
+    """Все перестановки n вариантов ответа (общие для всех вопросов с n вариантами)."""
+    orders = _OPTION_ORDERS.get(n)
+    if orders is None:
+        orders = _OPTION_ORDERS[n] = tuple(itertools.permutations(range(n)))
+    return orders
+
+
+class Keyboards(Sequence):
+    """Клавиатуры вопроса по номеру перестановки; каждая собирается один раз."""
+
+    __slots__ = ("options", "_built")
+
+    def __init__(self, options):
+        self.options = options
+        self._built = {}
+
+    def __len__(self):
+        return len(option_orders(len(self.options)))
+
+    def __getitem__(self, order_index):
+        keyboard = self._built.get(order_index)
+        if keyboard is None:
+            order = option_orders(len(self.options))[order_index]
+            keyboard = self._built[order_index] = ReplyKeyboardMarkup(
+                [[self.options[i]] for i in order], one_time_keyboard=True, resize_keyboard=True
+            )
+        return keyboard
+
+
+class InlineKeyboards:
+    """
+    Inline-кнопки вопроса: callback_data кнопки — "q:<nonce>:<номер вопроса в викторине>:<индекс варианта>",
+    ответ проверяется по индексу, без сравнения строк. Номер — позиция в порядке сессии,
+    а не id вопроса: id сдвигаются при перезагрузке паков, позиция — нет. nonce — случайное
+    число викторины: кнопки брошенной или прошлой викторины с той же позицией не подойдут.
+    Разметка своя у каждой викторины, поэтому не кэшируется: собирается при отправке
+    по общим перестановкам (option_orders).
+    """
+
+    __slots__ = ("options",)
+
+    def __init__(self, options):
+        self.options = options
+
+    def markup(self, order_index, nonce, position):
+        order = option_orders(len(self.options))[order_index]
+        return InlineKeyboardMarkup([
+            [InlineKeyboardButton(self.options[i], callback_data=f"q:{nonce}:{position}:{i}")]
+            for i in order
+        ])
+
+
+def parse_answer_callback(data):
+    """(nonce викторины, позиция вопроса в ней, индекс варианта) из callback_data inline-кнопки."""
+    _, nonce, position, option = data.split(":")
+    return int(nonce), int(position), int(option)
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class Question:
+    id: int
+    text: str
+    options: tuple
+    answer: str
+    answer_index: int
+    explanation: str
+    # {текст варианта: его индекс в options}
+    option_index: MappingProxyType
+    # Клавиатура для каждой перестановки вариантов (option_orders)
+    keyboards: Keyboards
+    inline_keyboards: InlineKeyboards
+
+    @classmethod
+    def build(cls, question_id, text, options, answer_index, explanation):
+        options = tuple(options)
+        return cls(
+            id=question_id,
+            text=text,
+            options=options,
+            answer=options[answer_index],
+            answer_index=answer_index,
+            explanation=explanation,
+            option_index=MappingProxyType({opt: i for i, opt in enumerate(options)}),
+            keyboards=Keyboards(options),
+            inline_keyboards=InlineKeyboards(options),
+        )
+
+    def is_correct(self, reply):
+        return self.option_index.get(reply) == self.answer_index
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class Category:
+    id: int
+    title: str
+    # Последовательность Question; для паков — ленивая (PackQuestions)
+    questions: Sequence
+    # Версия содержимого (mtime исходника пака): сессия, начатая на другой
+    # версии, ссылается на вопросы по позициям, которые могли сдвинуться
+    version: int = 0
+
+
+# -------------------------
+# Чтение исходников паков
+# -------------------------
+def _read_json_pack(path):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    questions = [dict(item, where=f"вопрос {number}") for number, item in enumerate(data["questions"], 1)]
+    return [(data["title"], questions)]
+
+
+def _read_csv_pack(path):
+    categories = {}
+    with open(path, encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)  # заголовок
+        for row in reader:
+            if not row:
+                continue
+            title, question, answer, explanation, *options = row
+            categories.setdefault(title, []).append({
+                "question": question,
+                "options": [opt for opt in options if opt],
+                "answer": answer,
+                "explanation": explanation,
+                "where": f"строка {reader.line_num}",
+            })
+    return list(categories.items())
+
+
+def read_pack_source(path):
+    """
+    [(название категории, [вопросы в формате quiz_data])] из JSON или CSV.
+    У каждого вопроса есть "where" — где он в исходнике, для сообщений об ошибках.
+    """
+    if path.endswith(".csv"):
+        return _read_csv_pack(path)
+    return _read_json_pack(path)
+
+
+# -------------------------
+# Бинарный индекс пака
+# -------------------------
+def question_error(item):
+    """Что не так с вопросом из исходника пака, или None."""
+    options = item.get("options")
+    if not isinstance(options, list) or not MIN_OPTIONS <= len(options) <= MAX_OPTIONS:
+        return f"нужно от {MIN_OPTIONS} до {MAX_OPTIONS} вариантов ответа"
+    if item.get("answer") not in options:
+        return f"ответа {item.get('answer')!r} нет среди вариантов"
+    if not item.get("question"):
+        return "нет текста вопроса"
+    return None
+
+
+def _valid_categories(source_path, categories):
+    """Категории без неверных вопросов; о каждом пропущенном — предупреждение с местом в файле."""
+    result = []
+    for title, items in categories:
+        valid = []
+        for item in items:
+            error = question_error(item)
+            if error is None:
+                valid.append(item)
+            else:
+                logger.warning("%s, %s: вопрос пропущен — %s", source_path, item.get("where", "?"), error)
+        if valid:
+            result.append((title, valid))
+    return result
+
+
+def compile_pack(source_path, index_path):
+    """Перевести пак в бинарный индекс; файл заменяется атомарно."""
+    stat = os.stat(source_path)
+    categories = _valid_categories(source_path, read_pack_source(source_path))
+    n_questions = sum(len(items) for _, items in categories)
+
+    head = bytearray(_HEADER.pack(_MAGIC, stat.st_mtime_ns, stat.st_size, len(categories), n_questions))
+    for title, items in categories:
+        title_bytes = title.encode("utf-8")
+        head += _CATEGORY.pack(len(title_bytes), len(items))
+        head += title_bytes
+    head += b"\0" * (-len(head) % 8)
+
+    offsets = array("Q")
+    records = bytearray()
+    records_start = len(head) + 8 * n_questions
+    for _, items in categories:
+        for item in items:
+            offsets.append(records_start + len(records))
+            options = item["options"]
+            records += _RECORD.pack(len(options), options.index(item["answer"]))
+            for field in (item["question"], item.get("explanation") or "", *options):
+                encoded = field.encode("utf-8")
+                records += _LENGTH.pack(len(encoded))
+                records += encoded
+
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(head)
+        f.write(offsets.tobytes())
+        f.write(records)
+    os.replace(tmp_path, index_path)
+
+
+class Pack:
+    """Скомпилированный пак, открытый через mmap."""
+
+    def __init__(self, source_path, index_path):
+        self.source_path = source_path
+        self.index_path = index_path
+        with open(index_path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.source_mtime_ns, self.source_size, n_categories, n_questions = _HEADER.unpack_from(self._map)
+        if magic != _MAGIC:
+            raise ValueError(f"{index_path}: не индекс пака вопросов")
+
+        pos = _HEADER.size
+        self.categories = []
+        for _ in range(n_categories):
+            title_len, count = _CATEGORY.unpack_from(self._map, pos)
+            pos += _CATEGORY.size
+            self.categories.append((self._map[pos:pos + title_len].decode("utf-8"), count))
+            pos += title_len
+        pos += -pos % 8
+        # Смещения читаются прямо из отображённого файла, без копирования
+        self.offsets = memoryview(self._map)[pos:pos + 8 * n_questions].cast("Q")
+        self.decode = lru_cache(maxsize=DECODE_CACHE_SIZE)(self._decode)
+
+    def _decode(self, position, question_id):
+        buf = self._map
+        offset = self.offsets[position]
+        n_options, answer_index = _RECORD.unpack_from(buf, offset)
+        offset += _RECORD.size
+        fields = []
+        for _ in range(2 + n_options):
+            (length,) = _LENGTH.unpack_from(buf, offset)
+            offset += _LENGTH.size
+            fields.append(buf[offset:offset + length].decode("utf-8"))
+            offset += length
+        text, explanation, *options = fields
+        return Question.build(question_id, text, options, answer_index, explanation)
+
+    def matches_source(self, stat):
+        return self.source_mtime_ns == stat.st_mtime_ns and self.source_size == stat.st_size
+
+    @classmethod
+    def open(cls, source_path, cache_dir):
+        """Открыть индекс пака, перекомпилировав его, если исходник изменился."""
+        index_path = os.path.join(cache_dir, os.path.basename(source_path) + ".qidx")
+        stat = os.stat(source_path)
+        if os.path.exists(index_path):
+            try:
+                pack = cls(source_path, index_path)
+                if pack.matches_source(stat):
+                    return pack
+            except (ValueError, struct.error):
+                logger.warning("Индекс %s устарел или повреждён, собираем заново", index_path)
+        os.makedirs(cache_dir, exist_ok=True)
+        compile_pack(source_path, index_path)
+        logger.info("Пак %s скомпилирован", source_path)
+        return cls(source_path, index_path)
+
+
+class PackQuestions(Sequence):
+    """Вопросы одной категории пака; декодируются при обращении."""
+
+    __slots__ = ("pack", "start", "count", "first_id")
+
+    def __init__(self, pack, start, count, first_id):
+        self.pack = pack
+        self.start = start
+        self.count = count
+        self.first_id = first_id
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return self.pack.decode(self.start + index, self.first_id + index)
+
+
+class QuestionBank:
+    """Неизменяемый набор категорий; при перезагрузке паков создаётся новый банк."""
+
+    def __init__(self, categories, packs=None):
+        self.categories = MappingProxyType({c.id: c for c in categories})
+        self.by_title = MappingProxyType({c.title: c for c in categories})
+        self.packs = MappingProxyType(packs or {})
+        # Клавиатура выбора категории тоже одна на всех
+        self.category_keyboard = ReplyKeyboardMarkup(
+            [[c.title] for c in categories], one_time_keyboard=True, resize_keyboard=True
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        """Построить банк из {название категории: [{"question", "options", "answer", "explanation"}]}."""
+        categories = []
+        next_id = 0
+        for category_id, (title, items) in enumerate(data.items()):
+            questions = []
+            for item in items:
+                questions.append(Question.build(
+                    next_id, item["question"], item["options"],
+                    item["options"].index(item["answer"]), item["explanation"],
+                ))
+                next_id += 1
+            categories.append(Category(id=category_id, title=title, questions=tuple(questions)))
+        return cls(categories)
+
+    @classmethod
+    def load(cls, directory, previous=None):
+        """
+        Загрузить все паки из каталога.
+
+        Если передан previous, паки с неизменившимися исходниками берутся
+        из него без повторного открытия, а номера категорий с теми же
+        названиями сохраняются — у идущих викторин не «уезжает» категория.
+        """
+        cache_dir = os.path.join(directory, CACHE_DIR)
+        old_packs = previous.packs if previous else {}
+        old_ids = {title: c.id for title, c in previous.by_title.items()} if previous else {}
+        next_category_id = max(old_ids.values(), default=-1) + 1
+
+        packs = {}
+        categories = []
+        next_question_id = 0
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(PACK_EXTENSIONS):
+                continue
+            source_path = os.path.join(directory, name)
+            pack = old_packs.get(source_path)
+            if pack is None or not pack.matches_source(os.stat(source_path)):
+                pack = Pack.open(source_path, cache_dir)
+            packs[source_path] = pack
+
+            start = 0
+            for title, count in pack.categories:
+                category_id = old_ids.get(title)
+                if category_id is None:
+                    category_id = next_category_id
+                    next_category_id += 1
+                questions = PackQuestions(pack, start, count, next_question_id)
+                categories.append(Category(
+                    id=category_id, title=title, questions=questions, version=pack.source_mtime_ns,
+                ))
+                start += count
+                next_question_id += count
+        return cls(categories, packs)
+
+    def changed(self, directory):
+        """Изменился ли набор паков или хотя бы один исходник с момента загрузки."""
+        seen = set()
+        for name in os.listdir(directory):
+            if not name.endswith(PACK_EXTENSIONS):
+                continue
+            source_path = os.path.join(directory, name)
+            seen.add(source_path)
+            pack = self.packs.get(source_path)
+            if pack is None or not pack.matches_source(os.stat(source_path)):
+                return True
+        return seen != set(self.packs)
+
+    def __contains__(self, title):
+        return title in self.by_title
+
+    # -------------------------
+    # Компактный порядок вопросов для сессии
+    # -------------------------
+    # Элемент array — (индекс вопроса в категории << 8) | номер перестановки вариантов.
+    # В адаптивной викторине порядок заполняется по ходу игры: ещё не выбранные
+    # элементы равны UNPICKED.
+    UNPICKED = 0xFFFFFFFF
+
+    def new_order(self, category, length=QUIZ_LENGTH):
+        questions = category.questions
+        order = random.sample(range(len(questions)), min(length, len(questions)))
+        return array("I", (self.packed(category, i) for i in order))
+
+    def adaptive_order(self, category, first, length=QUIZ_LENGTH):
+        """Порядок, где выбран только первый вопрос (индекс first); остальные выбирает rating.py."""
+        order = array("I", [self.UNPICKED]) * min(length, len(category.questions))
+        order[0] = self.packed(category, first)
+        return order
+
+    @staticmethod
+    def packed(category, index):
+        """Элемент порядка для вопроса index со случайной перестановкой вариантов."""
+        return index << 8 | random.randrange(len(category.questions[index].keyboards))
+
+    def resolve(self, category_id, packed, inline=False, nonce=0, position=0):
+        """
+        (вопрос, его клавиатура) для элемента порядка из new_order; inline — с inline-кнопками
+        для вопроса на позиции position в викторине nonce (см. InlineKeyboards).
+        """
+        question = self.categories[category_id].questions[packed >> 8]
+        if inline:
+            return question, question.inline_keyboards.markup(packed & 0xFF, nonce, position)
+        return question, question.keyboards[packed & 0xFF]
@@ -0,0 +1,266 @@
+import bisect
+import math
+import random
+import threading
+from array import array
+
+# -------------------------
+# Адаптивный подбор вопросов
+# -------------------------
+# У игрока и у каждого вопроса есть рейтинг Эло. Ответ — «партия» игрока
+# с вопросом: верный ответ поднимает рейтинг игрока и опускает рейтинг
+# вопроса, неверный — наоборот, тем сильнее, чем неожиданнее исход.
+# Следующий вопрос подбирается так, чтобы игрок отвечал верно примерно
+# с вероятностью TARGET_SUCCESS: ищется вопрос с рейтингом около
+# рейтинг_игрока - TARGET_OFFSET.
+#
+# Вопросы категории разложены по корзинам рейтинга шириной BUCKET_WIDTH
+# (DifficultyIndex): поиск — bisect по отсортированным номерам непустых
+# корзин и случайный вопрос из ближайшей, обновление рейтинга — перенос
+# вопроса между корзинами за O(1). Индекс меняется на месте при каждом
+# ответе, перестраивать его не нужно.
+#
+# Рейтинг игрока живёт в user_data["rating"] и сохраняется вместе с ним.
+# Рейтинги вопросов копятся в памяти и сбрасываются в хранилище очков
+# пачкой приращений (как очки), ключ — категория и текст вопроса: id
+# вопросов позиционные и после правки пака сдвигаются. Воркеры кластера
+# видят приращения друг друга после перезапуска.
+
+DEFAULT_RATING = 1500.0
+BUCKET_WIDTH = 25
+# Желаемая доля верных ответов и соответствующий сдвиг рейтинга вопроса
+TARGET_SUCCESS = 0.7
+TARGET_OFFSET = 400 * math.log10(TARGET_SUCCESS / (1 - TARGET_SUCCESS))
+# Коэффициент K: большой у новичков (и новых вопросов), уменьшается с опытом
+PLAYER_K = (40.0, 16.0)
+QUESTION_K = (24.0, 4.0)
+K_DECAY = 20
+
+
+def expected(player_rating, question_rating):
+    """Вероятность верного ответа по Эло."""
+    return 1.0 / (1.0 + 10.0 ** ((question_rating - player_rating) / 400.0))
+
+
+def k_factor(answers, k):
+    start, floor = k
+    return max(floor, start / (1 + answers / K_DECAY))
+
+
+class DifficultyIndex:
+    """
+    Рейтинги вопросов одной категории и корзины для поиска по рейтингу.
+
+    Вопрос задаётся позицией в категории (как в QuestionBank.new_order).
+    Корзины — array позиций; slot[позиция] — место позиции в её корзине,
+    чтобы убирать её обменом с последней за O(1).
+    """
+
+    def __init__(self, size):
+        self.ratings = array("d", [DEFAULT_RATING]) * size
+        self.answers = array("I", [0]) * size
+        self._slot = array("I", range(size))
+        bucket = self._bucket(DEFAULT_RATING)
+        self._buckets = {bucket: array("I", range(size))} if size else {}
+        self._keys = [bucket] if size else []
+
+    def __len__(self):
+        return len(self.ratings)
+
+    @staticmethod
+    def _bucket(rating):
+        return int(rating // BUCKET_WIDTH)
+
+    def set(self, position, rating, answers=None):
+        old = self._bucket(self.ratings[position])
+        new = self._bucket(rating)
+        self.ratings[position] = rating
+        if answers is not None:
+            self.answers[position] = answers
+        if old == new:
+            return
+        # Убираем из старой корзины: на место позиции встаёт последняя
+        members = self._buckets[old]
+        last = members.pop()
+        if last != position:
+            slot = self._slot[position]
+            members[slot] = last
+            self._slot[last] = slot
+        if not members:
+            del self._buckets[old]
+            del self._keys[bisect.bisect_left(self._keys, old)]
+        members = self._buckets.get(new)
+        if members is None:
+            members = self._buckets[new] = array("I")
+            bisect.insort(self._keys, new)
+        self._slot[position] = len(members)
+        members.append(position)
+
+    def pick(self, target, exclude=(), rng=random):
+        """
+        Случайная позиция из ближайшей к target корзины, где есть вопрос
+        не из exclude; None — если подходящих нет.
+        """
+        keys = self._keys
+        right = bisect.bisect_left(keys, self._bucket(target))
+        left = right - 1
+        while left >= 0 or right < len(keys):
+            # Берём корзину, чья середина ближе к target
+            if right >= len(keys) or (
+                left >= 0 and target - (keys[left] + 0.5) * BUCKET_WIDTH
+                <= (keys[right] + 0.5) * BUCKET_WIDTH - target
+            ):
+                members = self._buckets[keys[left]]
+                left -= 1
+            else:
+                members = self._buckets[keys[right]]
+                right += 1
+            for _ in range(4):
+                position = members[rng.randrange(len(members))]
+                if position not in exclude:
+                    return position
+            # Корзина почти целиком из уже заданных — перебираем
+            candidates = [position for position in members if position not in exclude]
+            if candidates:
+                return rng.choice(candidates)
+        return None
+
+
+class Ratings:
+    """Индексы сложности по категориям, обновление рейтингов и их сброс в хранилище."""
+
+    def __init__(self):
+        # {название категории: DifficultyIndex}
+        self._indexes = {}
+        # Для перепривязки после перезагрузки паков: {название: Category.questions}
+        self._sources = {}
+        self._lock = threading.Lock()
+        # {(категория, текст вопроса): [позиция, приращение рейтинга, ответов]}
+        self._pending = {}
+
+    def index(self, category):
+        index = self._indexes.get(category.title)
+        if index is None:
+            index = self._indexes[category.title] = DifficultyIndex(len(category.questions))
+            self._sources[category.title] = category.questions
+        return index
+
+    @staticmethod
+    def player(user_data):
+        """(рейтинг, число ответов) игрока."""
+        return user_data.get("rating", (DEFAULT_RATING, 0))
+
+    def target(self, user_data):
+        return self.player(user_data)[0] - TARGET_OFFSET
+
+    def pick(self, user_data, category, exclude=(), rng=random):
+        """Позиция следующего вопроса категории для игрока."""
+        return self.index(category).pick(self.target(user_data), exclude, rng)
+
+    def update(self, user_data, category, position, question, correct):
+        """Пересчитать рейтинги игрока и вопроса после ответа."""
+        index = self.index(category)
+        player_rating, player_answers = self.player(user_data)
+        question_rating = index.ratings[position]
+        question_answers = index.answers[position]
+        surprise = (1.0 if correct else 0.0) - expected(player_rating, question_rating)
+
+        user_data["rating"] = (
+            player_rating + k_factor(player_answers, PLAYER_K) * surprise,
+            player_answers + 1,
+        )
+        delta = -k_factor(question_answers, QUESTION_K) * surprise
+        index.set(position, question_rating + delta, question_answers + 1)
+
+        key = (category.title, question.text)
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = [position, delta, 1]
+            else:
+                pending[0] = position
+                pending[1] += delta
+                pending[2] += 1
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self, store):
+        """Записать накопленные приращения одной пачкой. Возвращает число строк."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        rows = [
+            (title, text, position, delta, answers)
+            for (title, text), (position, delta, answers) in pending.items()
+        ]
+        try:
+            store.write_question_ratings(rows)
+        except Exception:
+            with self._lock:
+                for key, (position, delta, answers) in pending.items():
+                    current = self._pending.setdefault(key, [position, 0.0, 0])
+                    current[1] += delta
+                    current[2] += answers
+            raise
+        return len(rows)
+
+    def load(self, rows, bank, titles=None):
+        """
+        Заполнить индексы из строк хранилища (категория, текст, позиция,
+        сдвиг от DEFAULT_RATING, ответов). Позиция проверяется по тексту
+        вопроса; если пак правили и вопрос сдвинулся, он ищется по тексту
+        во всей категории, а удалённые вопросы пропускаются.
+        titles — загрузить только эти категории.
+        """
+        loaded = 0
+        moved = {}
+        for title, text, position, shift, answers in rows:
+            if titles is not None and title not in titles:
+                continue
+            category = bank.by_title.get(title)
+            if category is None:
+                continue
+            if position < len(category.questions) and category.questions[position].text == text:
+                self.index(category).set(position, DEFAULT_RATING + shift, answers)
+                loaded += 1
+            else:
+                moved.setdefault(title, []).append((text, shift, answers))
+        for title, category_rows in moved.items():
+            # Сдвинувшихся обычно немного, но искать их приходится по всей категории
+            category = bank.by_title[title]
+            positions = {question.text: i for i, question in enumerate(category.questions)}
+            index = self.index(category)
+            for text, shift, answers in category_rows:
+                position = positions.get(text)
+                if position is not None:
+                    index.set(position, DEFAULT_RATING + shift, answers)
+                    loaded += 1
+        return loaded
+
+    def rebind(self, bank):
+        """
+        После перезагрузки паков: индексы неизменившихся категорий остаются,
+        остальные сбрасываются. Возвращает названия сброшенных — их рейтинги
+        нужно перечитать из хранилища (load с titles).
+        """
+        dropped = set()
+        for title in list(self._indexes):
+            category = bank.by_title.get(title)
+            old = self._sources[title]
+            # PackQuestions пересоздаются при каждой загрузке; категория та же,
+            # если пак тот же (неизменившиеся паки переиспользуются)
+            pack = getattr(old, "pack", None)
+            same = category is not None and len(category.questions) == len(old) and (
+                category.questions is old
+                or (pack is not None and getattr(category.questions, "pack", None) is pack)
+            )
+            if same:
+                self._sources[title] = category.questions
+                continue
+            del self._indexes[title]
+            del self._sources[title]
+            dropped.add(title)
+        return dropped
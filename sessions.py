@@ -0,0 +1,66 @@
+import asyncio
+import collections
+import time
+
+# -------------------------
+# Истечение брошенных сессий
+# -------------------------
+# Игрок, который выбрал категорию и ушёл, оставляет в user_data порядок
+# вопросов и счёт раунда, а в ConversationHandler — своё состояние, и всё
+# это живёт (и сохраняется) вечно. SessionReaper помнит время последнего
+# апдейта каждого разговора в OrderedDict: touch() переносит ключ в конец,
+# поэтому в начале всегда самые давние. Периодический sweep() снимает
+# с головы только просроченные ключи — пачками по batch_size с передачей
+# управления event loop между пачками — и для каждого вызывает expire().
+# Что именно делать с сессией, решает expire (см. bot.expire_session).
+
+
+class SessionReaper:
+    """
+    Args:
+        ttl: через сколько секунд без апдейтов сессия считается брошенной.
+        expire: expire(key) -> bool, вызывается для просроченного ключа
+            разговора (chat_id, user_id); True — сессия действительно закрыта.
+        batch_size: сколько ключей разбирать без передачи управления.
+        clock: источник времени (для тестов и бенчмарков).
+    """
+
+    def __init__(self, ttl, expire, batch_size=500, clock=time.monotonic):
+        self.ttl = ttl
+        self.expire = expire
+        self.batch_size = batch_size
+        self.clock = clock
+        self._last_seen = collections.OrderedDict()
+        self.expired = 0
+
+    def __len__(self):
+        return len(self._last_seen)
+
+    def touch(self, key, now=None):
+        self._last_seen[key] = self.clock() if now is None else now
+        self._last_seen.move_to_end(key)
+
+    def forget(self, key):
+        self._last_seen.pop(key, None)
+
+    async def sweep(self, now=None):
+        """Закрыть все сессии, простоявшие дольше ttl. Возвращает число закрытых."""
+        deadline = (self.clock() if now is None else now) - self.ttl
+        last_seen = self._last_seen
+        expired = 0
+        while last_seen:
+            for _ in range(self.batch_size):
+                if not last_seen:
+                    break
+                key, seen = next(iter(last_seen.items()))
+                if seen > deadline:
+                    self.expired += expired
+                    return expired
+                del last_seen[key]
+                if self.expire(key):
+                    expired += 1
+            # Между пачками даём обработать апдейты; touch() за это время
+            # переносит ключи в конец, так что голова остаётся корректной
+            await asyncio.sleep(0)
+        self.expired += expired
+        return expired
@@ -0,0 +1,63 @@
+import contextlib
+import time
+
+# -------------------------
+# Время запуска по фазам
+# -------------------------
+# Воркеры перезапускаются часто, и всё время от старта процесса до первого
+# принятого апдейта игроки ждут ответа. STARTUP засекается при импорте этого
+# модуля — bot.py импортирует его первым — и собирает длительность фаз:
+# импорты, банк вопросов, загрузка очков, сборка обработчиков, initialize
+# (чтение разговоров из persistence), post_init. Отчёт пишется в лог, когда
+# бот начал принимать апдейты, и отдаётся метрикой quiz_startup_seconds.
+
+
+class StartupTimer:
+    """Длительности фаз запуска, в порядке их завершения."""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.started = clock()
+        self.phases = {}
+        self.ready_at = None
+        self._last = self.started
+
+    def mark(self, name):
+        """Фаза name — всё время с конца предыдущей фазы до этого момента."""
+        now = self.clock()
+        self.phases[name] = self.phases.get(name, 0.0) + now - self._last
+        self._last = now
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Фаза name — только время внутри блока with."""
+        self._last = self.clock()
+        try:
+            yield
+        finally:
+            self.mark(name)
+
+    def ready(self):
+        """Бот принимает апдейты; повторные вызовы ничего не меняют. Возвращает True в первый раз."""
+        if self.ready_at is not None:
+            return False
+        self.ready_at = self.clock()
+        return True
+
+    def elapsed(self):
+        """Секунд от старта до готовности (или до текущего момента, если ещё не готов)."""
+        return (self.ready_at if self.ready_at is not None else self.clock()) - self.started
+
+    def report(self):
+        phases = ", ".join(f"{name} {seconds * 1000:.0f} мс" for name, seconds in self.phases.items())
+        return f"{phases}; готов принимать апдейты через {self.elapsed() * 1000:.0f} мс"
+
+    def seconds(self):
+        """{(фаза,): секунды} для Gauge; "total" — до готовности."""
+        values = {(name,): seconds for name, seconds in self.phases.items()}
+        if self.ready_at is not None:
+            values[("total",)] = self.elapsed()
+        return values
+
+
+STARTUP = StartupTimer()
@@ -0,0 +1,578 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import SCORE_FLUSH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# -------------------------
+# Хранилище общего счёта игроков
+# -------------------------
+# ask_name и end_quiz не ходят в базу напрямую: изменения копятся в памяти
+# (последнее имя и сумма приращений очков на игрока) и сбрасываются одной
+# пачкой upsert-ов по таймеру. Между сбросами scoreboard в памяти остаётся
+# источником правды для чтения.
+#
+# changed_at — когда строку меняли в последний раз (time.time() пишущего):
+# воркеры кластера забирают чужие начисления только за последние секунды
+# (load_all / load_period_scores с since), а не всю таблицу.
+
+SCORES_TABLE = """
+CREATE TABLE IF NOT EXISTS scores (
+    user_id  TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    score    BIGINT NOT NULL DEFAULT 0,
+    changed_at DOUBLE PRECISION NOT NULL DEFAULT 0
+)
+"""
+
+# Рейтинги вопросов (см. rating.py): ключ — категория и текст вопроса,
+# position — подсказка, где вопрос лежит в категории, shift — рейтинг минус
+# начальный, чтобы приращения от разных воркеров складывались как очки.
+QUESTION_RATINGS_TABLE = """
+CREATE TABLE IF NOT EXISTS question_ratings (
+    category TEXT NOT NULL,
+    question TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    shift    DOUBLE PRECISION NOT NULL DEFAULT 0,
+    answers  BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (category, question)
+)
+"""
+
+# Очки за день и неделю (см. leaderboard.PeriodLeaderboards): period —
+# ключ периода ("day:2024-05-01", "week:2024-W18"). Строки прошедших
+# периодов удаляются при смене периода (prune_periods).
+PERIOD_SCORES_TABLE = """
+CREATE TABLE IF NOT EXISTS period_scores (
+    period  TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    score   BIGINT NOT NULL DEFAULT 0,
+    changed_at DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (period, user_id)
+)
+"""
+
+# Столбцы, добавленные после первых версий схемы, и индексы по ним
+ADDED_COLUMNS = (
+    ("scores", "changed_at", "DOUBLE PRECISION NOT NULL DEFAULT 0"),
+    ("period_scores", "changed_at", "DOUBLE PRECISION NOT NULL DEFAULT 0"),
+)
+CHANGED_AT_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS scores_changed_at ON scores (changed_at)",
+    "CREATE INDEX IF NOT EXISTS period_scores_changed_at ON period_scores (changed_at)",
+)
+
+# Рассылки (см. broadcast.py): blocked_users — кто заблокировал бота, им
+# больше не пишем, пока игрок снова не назовётся в викторине; broadcasts —
+# докуда дошла рассылка name (user_id последнего обработанного получателя),
+# чтобы после перезапуска продолжить с того же места.
+BLOCKED_USERS_TABLE = """
+CREATE TABLE IF NOT EXISTS blocked_users (
+    user_id    TEXT PRIMARY KEY,
+    blocked_at DOUBLE PRECISION NOT NULL
+)
+"""
+
+BROADCASTS_TABLE = """
+CREATE TABLE IF NOT EXISTS broadcasts (
+    name         TEXT PRIMARY KEY,
+    last_user_id TEXT NOT NULL,
+    sent         BIGINT NOT NULL DEFAULT 0,
+    blocked      BIGINT NOT NULL DEFAULT 0,
+    failed       BIGINT NOT NULL DEFAULT 0,
+    finished     INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+# Кто уже ответил на вопрос рассылки name (вопрос дня): очко за него
+# начисляется один раз, сколько бы раз ни нажимали кнопки. Строки старых
+# рассылок удаляются (prune_broadcast_answers).
+BROADCAST_ANSWERS_TABLE = """
+CREATE TABLE IF NOT EXISTS broadcast_answers (
+    name    TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    PRIMARY KEY (name, user_id)
+)
+"""
+
+
+class ScoreStore:
+    """
+    Базовый класс хранилища очков.
+
+    Наследники реализуют load_all() и _write_batch(); буферизация
+    и склейка изменений общие для всех бэкендов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending_names = {}
+        self._pending_scores = {}
+        # {(период, user_id): приращение}
+        self._pending_periods = {}
+
+    def set_username(self, user_id, username):
+        with self._lock:
+            self._pending_names[user_id] = username
+
+    def add_score(self, user_id, delta, periods=()):
+        """Начислить delta очков; periods — ключи периодов, в счёт которых они тоже идут."""
+        if not delta:
+            return
+        with self._lock:
+            self._pending_scores[user_id] = self._pending_scores.get(user_id, 0) + delta
+            for period in periods:
+                key = (period, user_id)
+                self._pending_periods[key] = self._pending_periods.get(key, 0) + delta
+
+    def add_scores(self, deltas, periods=()):
+        """add_score для многих игроков сразу: {user_id: приращение}."""
+        with self._lock:
+            pending = self._pending_scores
+            pending_periods = self._pending_periods
+            for user_id, delta in deltas.items():
+                if delta:
+                    pending[user_id] = pending.get(user_id, 0) + delta
+                    for period in periods:
+                        key = (period, user_id)
+                        pending_periods[key] = pending_periods.get(key, 0) + delta
+
+    def pending(self):
+        """Сколько игроков ждут записи."""
+        with self._lock:
+            return len(self._pending_names.keys() | self._pending_scores.keys())
+
+    def flush(self):
+        """Записать накопленные изменения одной транзакцией. Возвращает число строк."""
+        with self._lock:
+            names, self._pending_names = self._pending_names, {}
+            scores, self._pending_scores = self._pending_scores, {}
+            periods, self._pending_periods = self._pending_periods, {}
+        if not names and not scores and not periods:
+            return 0
+        started = time.perf_counter()
+        try:
+            self._write_batch(names, scores, periods)
+        except Exception:
+            # Возвращаем изменения в буфер, чтобы не потерять их до следующей попытки
+            with self._lock:
+                for user_id, username in names.items():
+                    self._pending_names.setdefault(user_id, username)
+                for user_id, delta in scores.items():
+                    self._pending_scores[user_id] = self._pending_scores.get(user_id, 0) + delta
+                for key, delta in periods.items():
+                    self._pending_periods[key] = self._pending_periods.get(key, 0) + delta
+            raise
+        SCORE_FLUSH_SECONDS.observe(time.perf_counter() - started)
+        return len(names.keys() | scores.keys())
+
+    def load_all(self, since=None):
+        """
+        Счёт в формате scoreboard: {user_id: {"username": ..., "score": ...}};
+        since — только строки, изменённые не раньше этого времени (time.time()).
+        """
+        raise NotImplementedError
+
+    def load_period_scores(self, periods, since=None):
+        """Очки за периоды: {ключ периода: {user_id: очки}}; since — как в load_all."""
+        raise NotImplementedError
+
+    def prune_periods(self, keep):
+        """Удалить очки всех периодов, кроме keep."""
+        raise NotImplementedError
+
+    def _write_batch(self, names, scores, periods):
+        raise NotImplementedError
+
+    def load_question_ratings(self):
+        """Строки (категория, текст вопроса, позиция, сдвиг рейтинга, ответов)."""
+        raise NotImplementedError
+
+    def write_question_ratings(self, rows):
+        """Прибавить приращения: rows — (категория, текст, позиция, Δсдвига, Δответов)."""
+        raise NotImplementedError
+
+    def recipients_after(self, after, limit):
+        """
+        До limit user_id игроков по возрастанию, строго после after (""
+        — с начала), без заблокировавших бота. Постранично по первичному
+        ключу — список всех игроков целиком не собирается.
+        """
+        raise NotImplementedError
+
+    def load_broadcast(self, name):
+        """Контрольная точка рассылки: {"last_user_id", "sent", "blocked", "failed", "finished"} или None."""
+        raise NotImplementedError
+
+    def save_broadcast(self, name, last_user_id, sent, blocked, failed, finished=False, blocked_ids=()):
+        """Записать контрольную точку и (в той же транзакции) заблокировавших бота blocked_ids."""
+        raise NotImplementedError
+
+    def record_broadcast_answer(self, name, user_id):
+        """Отметить ответ user_id на рассылку name; True — первый ответ, False — уже отвечал."""
+        raise NotImplementedError
+
+    def prune_broadcast_answers(self, before):
+        """Удалить отметки ответов рассылок, имя которых меньше before."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteScoreStore(ScoreStore):
+    """Локальный вариант хранилища: для разработки и бенчмарков без сервера БД."""
+
+    def __init__(self, path="scores.db"):
+        super().__init__()
+        self.path = path
+        # flush вызывается из отдельного потока (asyncio.to_thread)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn_lock = threading.Lock()
+        with self._conn_lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(SCORES_TABLE)
+            self._conn.execute(QUESTION_RATINGS_TABLE)
+            self._conn.execute(PERIOD_SCORES_TABLE)
+            self._conn.execute(BLOCKED_USERS_TABLE)
+            self._conn.execute(BROADCASTS_TABLE)
+            self._conn.execute(BROADCAST_ANSWERS_TABLE)
+            for table, column, definition in ADDED_COLUMNS:
+                if column not in {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}:
+                    self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            for index in CHANGED_AT_INDEXES:
+                self._conn.execute(index)
+
+    def load_all(self, since=None):
+        query, params = "SELECT user_id, username, score FROM scores", ()
+        if since is not None:
+            query, params = query + " WHERE changed_at >= ?", (since,)
+        with self._conn_lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return {user_id: {"username": username, "score": score} for user_id, username, score in rows}
+
+    def _write_batch(self, names, scores, periods):
+        now = time.time()
+        with self._conn_lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO scores (user_id, username, score, changed_at) VALUES (?, ?, 0, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET username = excluded.username, changed_at = excluded.changed_at",
+                ((user_id, username, now) for user_id, username in names.items()),
+            )
+            self._conn.executemany(
+                "INSERT INTO scores (user_id, username, score, changed_at) VALUES (?, '', ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET score = scores.score + excluded.score, "
+                "changed_at = excluded.changed_at",
+                ((user_id, delta, now) for user_id, delta in scores.items()),
+            )
+            self._conn.executemany(
+                "INSERT INTO period_scores (period, user_id, score, changed_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (period, user_id) DO UPDATE SET score = period_scores.score + excluded.score, "
+                "changed_at = excluded.changed_at",
+                ((period, user_id, delta, now) for (period, user_id), delta in periods.items()),
+            )
+            # Назвался в викторине — значит, снова читает бота
+            self._conn.executemany("DELETE FROM blocked_users WHERE user_id = ?", ((u,) for u in names))
+
+    def load_period_scores(self, periods, since=None):
+        result = {period: {} for period in periods}
+        query = "SELECT user_id, score FROM period_scores WHERE period = ?"
+        if since is not None:
+            query += " AND changed_at >= ?"
+        with self._conn_lock:
+            for period in periods:
+                params = (period,) if since is None else (period, since)
+                result[period].update(self._conn.execute(query, params).fetchall())
+        return result
+
+    def prune_periods(self, keep):
+        keep = list(keep)
+        with self._conn_lock, self._conn:
+            self._conn.execute(
+                f"DELETE FROM period_scores WHERE period NOT IN ({', '.join('?' * len(keep))})", keep
+            )
+
+    def load_question_ratings(self):
+        with self._conn_lock:
+            return self._conn.execute(
+                "SELECT category, question, position, shift, answers FROM question_ratings"
+            ).fetchall()
+
+    def write_question_ratings(self, rows):
+        with self._conn_lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO question_ratings (category, question, position, shift, answers) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (category, question) DO UPDATE SET position = excluded.position, "
+                "shift = question_ratings.shift + excluded.shift, "
+                "answers = question_ratings.answers + excluded.answers",
+                rows,
+            )
+
+    def recipients_after(self, after, limit):
+        with self._conn_lock:
+            rows = self._conn.execute(
+                "SELECT user_id FROM scores WHERE user_id > ? "
+                "AND user_id NOT IN (SELECT user_id FROM blocked_users) ORDER BY user_id LIMIT ?",
+                (after, limit),
+            ).fetchall()
+        return [user_id for user_id, in rows]
+
+    def load_broadcast(self, name):
+        with self._conn_lock:
+            row = self._conn.execute(
+                "SELECT last_user_id, sent, blocked, failed, finished FROM broadcasts WHERE name = ?", (name,)
+            ).fetchone()
+        return _broadcast_state(row)
+
+    def save_broadcast(self, name, last_user_id, sent, blocked, failed, finished=False, blocked_ids=()):
+        now = time.time()
+        with self._conn_lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO blocked_users (user_id, blocked_at) VALUES (?, ?)",
+                ((user_id, now) for user_id in blocked_ids),
+            )
+            self._conn.execute(
+                "INSERT INTO broadcasts (name, last_user_id, sent, blocked, failed, finished) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (name) DO UPDATE SET "
+                "last_user_id = excluded.last_user_id, sent = excluded.sent, blocked = excluded.blocked, "
+                "failed = excluded.failed, finished = excluded.finished",
+                (name, last_user_id, sent, blocked, failed, int(finished)),
+            )
+
+    def record_broadcast_answer(self, name, user_id):
+        with self._conn_lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO broadcast_answers (name, user_id) VALUES (?, ?)", (name, user_id)
+            )
+        return cursor.rowcount == 1
+
+    def prune_broadcast_answers(self, before):
+        with self._conn_lock, self._conn:
+            self._conn.execute("DELETE FROM broadcast_answers WHERE name < ?", (before,))
+
+    def close(self):
+        with self._conn_lock:
+            self._conn.close()
+
+
+class PostgresScoreStore(ScoreStore):
+    """Хранилище в PostgreSQL с пулом соединений и пакетными upsert-ами."""
+
+    def __init__(self, dsn, minconn=1, maxconn=4):
+        super().__init__()
+        from psycopg2.pool import ThreadedConnectionPool
+
+        self._pool = ThreadedConnectionPool(minconn, maxconn, dsn)
+        conn = self._pool.getconn()
+        try:
+            with conn, conn.cursor() as cur:
+                cur.execute(SCORES_TABLE)
+                cur.execute(QUESTION_RATINGS_TABLE)
+                cur.execute(PERIOD_SCORES_TABLE)
+                cur.execute(BLOCKED_USERS_TABLE)
+                cur.execute(BROADCASTS_TABLE)
+                cur.execute(BROADCAST_ANSWERS_TABLE)
+                for table, column, definition in ADDED_COLUMNS:
+                    cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {definition}")
+                for index in CHANGED_AT_INDEXES:
+                    cur.execute(index)
+        finally:
+            self._pool.putconn(conn)
+
+    def load_all(self, since=None):
+        conn = self._pool.getconn()
+        try:
+            with conn, conn.cursor() as cur:
+                if since is None:
+                    cur.execute("SELECT user_id, username, score FROM scores")
+                else:
+                    cur.execute("SELECT user_id, username, score FROM scores WHERE changed_at >= %s", (since,))
+                rows = cur.fetchall()
+        finally:
+            self._pool.putconn(conn)
+        return {user_id: {"username": username, "score": score} for user_id, username, score in rows}
+
+    def _write_batch(self, names, scores, periods):
+        from psycopg2.extras import execute_values
+
+        now = time.time()
+        conn = self._pool.getconn()
+        try:
+            with conn, conn.cursor() as cur:
+                if names:
+                    execute_values(
+                        cur,
+                        "INSERT INTO scores (user_id, username, score, changed_at) VALUES %s "
+                        "ON CONFLICT (user_id) DO UPDATE SET username = EXCLUDED.username, "
+                        "changed_at = EXCLUDED.changed_at",
+                        [(user_id, username, 0, now) for user_id, username in names.items()],
+                    )
+                if scores:
+                    execute_values(
+                        cur,
+                        "INSERT INTO scores (user_id, username, score, changed_at) VALUES %s "
+                        "ON CONFLICT (user_id) DO UPDATE SET score = scores.score + EXCLUDED.score, "
+                        "changed_at = EXCLUDED.changed_at",
+                        [(user_id, "", delta, now) for user_id, delta in scores.items()],
+                    )
+                if periods:
+                    execute_values(
+                        cur,
+                        "INSERT INTO period_scores (period, user_id, score, changed_at) VALUES %s "
+                        "ON CONFLICT (period, user_id) DO UPDATE SET score = period_scores.score + EXCLUDED.score, "
+                        "changed_at = EXCLUDED.changed_at",
+                        [(period, user_id, delta, now) for (period, user_id), delta in periods.items()],
+                    )
+                if names:
+                    cur.execute("DELETE FROM blocked_users WHERE user_id = ANY(%s)", (list(names),))
+        finally:
+            self._pool.putconn(conn)
+
+    def load_period_scores(self, periods, since=None):
+        result = {period: {} for period in periods}
+        conn = self._pool.getconn()
+        try:
+            with conn, conn.cursor() as cur:
+                if since is None:
+                    cur.execute(
+                        "SELECT period, user_id, score FROM period_scores WHERE period = ANY(%s)", (list(periods),)
+                    )
+                else:
+                    cur.execute(
+                        "SELECT period, user_id, score FROM period_scores WHERE period = ANY(%s) AND changed_at >= %s",
+                        (list(periods), since),
+                    )
+                for period, user_id, score in cur.fetchall():
+                    result[period][user_id] = score
+        finally:
+            self._pool.putconn(conn)
+        return result
+
+    def prune_periods(self, keep):
+        conn = self._pool.getconn()
+        try:
+            with conn, conn.cursor() as cur:
+                cur.execute("DELETE FROM period_scores WHERE NOT (period = ANY(%s))", (list(keep),))
+        finally:
+            self._pool.putconn(conn)
+
+    def load_question_ratings(self):
+        conn = self._pool.getconn()
+        try:
+            with conn, conn.cursor() as cur:
+                cur.execute("SELECT category, question, position, shift, answers FROM question_ratings")
+                return cur.fetchall()
+        finally:
+            self._pool.putconn(conn)
+
+    def write_question_ratings(self, rows):
+        from psycopg2.extras import execute_values
+
+        conn = self._pool.getconn()
+        try:
+            with conn, conn.cursor() as cur:
+                execute_values(
+                    cur,
+                    "INSERT INTO question_ratings (category, question, position, shift, answers) VALUES %s "
+                    "ON CONFLICT (category, question) DO UPDATE SET position = EXCLUDED.position, "
+                    "shift = question_ratings.shift + EXCLUDED.shift, "
+                    "answers = question_ratings.answers + EXCLUDED.answers",
+                    rows,
+                )
+        finally:
+            self._pool.putconn(conn)
+
+    def recipients_after(self, after, limit):
+        conn = self._pool.getconn()
+        try:
+            with conn, conn.cursor() as cur:
+                cur.execute(
+                    "SELECT s.user_id FROM scores s WHERE s.user_id > %s "
+                    "AND NOT EXISTS (SELECT 1 FROM blocked_users b WHERE b.user_id = s.user_id) "
+                    "ORDER BY s.user_id LIMIT %s",
+                    (after, limit),
+                )
+                return [user_id for user_id, in cur.fetchall()]
+        finally:
+            self._pool.putconn(conn)
+
+    def load_broadcast(self, name):
+        conn = self._pool.getconn()
+        try:
+            with conn, conn.cursor() as cur:
+                cur.execute(
+                    "SELECT last_user_id, sent, blocked, failed, finished FROM broadcasts WHERE name = %s", (name,)
+                )
+                row = cur.fetchone()
+        finally:
+            self._pool.putconn(conn)
+        return _broadcast_state(row)
+
+    def save_broadcast(self, name, last_user_id, sent, blocked, failed, finished=False, blocked_ids=()):
+        from psycopg2.extras import execute_values
+
+        now = time.time()
+        conn = self._pool.getconn()
+        try:
+            with conn, conn.cursor() as cur:
+                if blocked_ids:
+                    execute_values(
+                        cur,
+                        "INSERT INTO blocked_users (user_id, blocked_at) VALUES %s ON CONFLICT (user_id) DO NOTHING",
+                        [(user_id, now) for user_id in blocked_ids],
+                    )
+                cur.execute(
+                    "INSERT INTO broadcasts (name, last_user_id, sent, blocked, failed, finished) "
+                    "VALUES (%s, %s, %s, %s, %s, %s) ON CONFLICT (name) DO UPDATE SET "
+                    "last_user_id = EXCLUDED.last_user_id, sent = EXCLUDED.sent, blocked = EXCLUDED.blocked, "
+                    "failed = EXCLUDED.failed, finished = EXCLUDED.finished",
+                    (name, last_user_id, sent, blocked, failed, int(finished)),
+                )
+        finally:
+            self._pool.putconn(conn)
+
+    def record_broadcast_answer(self, name, user_id):
+        conn = self._pool.getconn()
+        try:
+            with conn, conn.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO broadcast_answers (name, user_id) VALUES (%s, %s) ON CONFLICT DO NOTHING",
+                    (name, user_id),
+                )
+                return cur.rowcount == 1
+        finally:
+            self._pool.putconn(conn)
+
+    def prune_broadcast_answers(self, before):
+        conn = self._pool.getconn()
+        try:
+            with conn, conn.cursor() as cur:
+                cur.execute("DELETE FROM broadcast_answers WHERE name < %s", (before,))
+        finally:
+            self._pool.putconn(conn)
+
+    def close(self):
+        self._pool.closeall()
+
+
+def _broadcast_state(row):
+    if row is None:
+        return None
+    last_user_id, sent, blocked, failed, finished = row
+    return {"last_user_id": last_user_id, "sent": sent, "blocked": blocked, "failed": failed, "finished": bool(finished)}
+
+
+def open_score_store():
+    """DATABASE_URL -> PostgreSQL, иначе SQLite-файл из SCORES_DB (по умолчанию scores.db)."""
+    dsn = os.environ.get("DATABASE_URL")
+    if dsn:
+        logger.info("Очки хранятся в PostgreSQL")
+        return PostgresScoreStore(dsn)
+    path = os.environ.get("SCORES_DB", "scores.db")
+    logger.info("Очки хранятся в SQLite: %s", path)
+    return SQLiteScoreStore(path)
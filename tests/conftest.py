@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Модули бота лежат в корне репозитория, как и для benchmarks/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+import bot
+from question_bank import QUIZ_LENGTH, QuestionBank
+
+QUESTIONS = 3
+
+
+@pytest.fixture
+def small_category(tmp_path, monkeypatch):
+    """Банк из одной категории, где вопросов меньше QUIZ_LENGTH, и адаптивный режим."""
+    pack = {
+        "title": "Маленькая",
+        "questions": [
+            {"question": f"Вопрос {i}?", "options": ["да", "нет"], "answer": "да", "explanation": ""}
+            for i in range(QUESTIONS)
+        ],
+    }
+    (tmp_path / "small.json").write_text(json.dumps(pack, ensure_ascii=False), encoding="utf-8")
+    bank = QuestionBank.load(str(tmp_path))
+    monkeypatch.setattr(bot, "question_bank", bank)
+    monkeypatch.setattr(bot, "ADAPTIVE_QUIZ", True)
+    monkeypatch.setattr(bot, "answer_log", None)
+    return bank.by_title["Маленькая"]
+
+
+def play(user_data):
+    """Отвечать, пока викторина не кончится; возвращает заданные позиции."""
+    asked = []
+    while user_data["current_question_index"] < len(user_data["order"]):
+        packed = user_data["order"][user_data["current_question_index"]]
+        question, _ = bot.question_bank.resolve(user_data["category"], packed)
+        asked.append(packed >> 8)
+        bot.record_answer("1", user_data, question, question.answer_index)
+    return asked
+
+
+def new_session(category, order):
+    return {"category": category.id, "order": order, "current_question_index": 0, "score_this_round": 0}
+
+
+def test_quiz_shorter_than_quiz_length(small_category):
+    assert QUESTIONS < QUIZ_LENGTH
+    first = bot.ratings.pick({}, small_category)
+    user_data = new_session(small_category, bot.question_bank.adaptive_order(small_category, first))
+    asked = play(user_data)
+    assert sorted(asked) == list(range(QUESTIONS))
+    assert user_data["score_this_round"] == QUESTIONS
+
+
+def test_quiz_ends_when_category_runs_out(small_category):
+    # Порядок длиннее категории — как после того, как пак сократили посреди викторины
+    order = bot.question_bank.adaptive_order(small_category, 0)
+    order.extend([bot.question_bank.UNPICKED] * (QUIZ_LENGTH - len(order)))
+    user_data = new_session(small_category, order)
+    asked = play(user_data)
+    assert sorted(asked) == list(range(QUESTIONS))
+    assert len(user_data["order"]) == QUESTIONS
@@ -0,0 +1,32 @@
+import pytest
+
+from analytics import HEADER, RECORD, AnswerLog, aggregate_python, category_key
+
+
+def write(path, answers):
+    log = AnswerLog(str(path))
+    for correct in answers:
+        log.record(1, "Категория", "Вопрос?", 0, correct, 1.5)
+    log.close()
+
+
+def test_log_starts_with_header_and_appends_after_reopen(tmp_path):
+    path = tmp_path / "answers.log"
+    write(path, [True, False])
+    write(path, [True])
+    assert path.stat().st_size == HEADER.size + 3 * RECORD.size
+    totals = aggregate_python([str(path)])
+    assert totals.events == 3
+    assert totals.category_correct[category_key("Категория")] == 2
+
+
+def test_refuses_to_append_to_log_without_header(tmp_path):
+    # Журнал первой версии: записи по 24 байта, без заголовка
+    path = tmp_path / "answers.log"
+    old = bytes(24 * 5)
+    path.write_bytes(old)
+    with pytest.raises(ValueError):
+        AnswerLog(str(path))
+    with pytest.raises(ValueError):
+        aggregate_python([str(path)])
+    assert path.read_bytes() == old
@@ -0,0 +1,43 @@
+import asyncio
+
+from telegram import Update
+
+import bot
+from fakebot import FakeRequest, text_update
+from storage import SQLiteScoreStore
+
+USER = 21
+
+
+def sent_texts(req):
+    return [params.get("text") for method, params, _ in req.calls if method == "sendMessage"]
+
+
+def test_conversation_states_is_live_state_of_quiz_conversation(monkeypatch):
+    """
+    bot.conversation_states() опирается на приватный ConversationHandler._conversations;
+    тест падает, если после обновления PTB атрибута нет или запись в него не меняет разговор.
+    """
+    for name in ("OUTBOX_CHAT_RATE", "OUTBOX_CHAT_BURST", "OUTBOX_GLOBAL_RATE"):
+        monkeypatch.setattr(bot, name, 10**6)
+    bot.load_scores(SQLiteScoreStore(":memory:"))
+    category = next(iter(bot.question_bank.by_title.values()))
+
+    async def main():
+        req = FakeRequest()
+        app = bot.build_application("1:x", request=req)
+        async with app:
+            await app.process_update(Update.de_json(text_update(USER, "/start"), app.bot))
+            states = bot.conversation_states()
+            assert (USER, USER) in states
+            assert states is bot.quiz_conversation._conversations
+
+            # Запись в словарь — то же, что переход разговора в это состояние
+            states[(USER, USER)] = bot.CHOOSE_CATEGORY
+            req.calls.clear()
+            await app.process_update(Update.de_json(text_update(USER, category.title), app.bot))
+            await asyncio.sleep(0.1)
+            assert states[(USER, USER)] == bot.ASK_QUESTION
+            assert bot.messages.DEFAULT.category_chosen(title=category.title) in sent_texts(req)
+
+    asyncio.run(main())
@@ -0,0 +1,62 @@
+import json
+import os
+
+import pytest
+
+import bot
+from question_bank import QuestionBank
+
+
+def write_pack(directory, name, title, questions, mtime_ns):
+    path = directory / name
+    pack = {
+        "title": title,
+        "questions": [
+            {"question": text, "options": ["да", "нет"], "answer": "да", "explanation": ""} for text in questions
+        ],
+    }
+    path.write_text(json.dumps(pack, ensure_ascii=False), encoding="utf-8")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def packs(tmp_path, monkeypatch):
+    """Два пака; банк подменяется в bot."""
+    write_pack(tmp_path, "a.json", "Правимая", ["А1?", "А2?", "А3?"], 10**18)
+    write_pack(tmp_path, "b.json", "Постоянная", ["Б1?", "Б2?"], 10**18)
+    monkeypatch.setattr(bot, "question_bank", QuestionBank.load(str(tmp_path)))
+    return tmp_path
+
+
+def start_session(title):
+    category = bot.question_bank.by_title[title]
+    return {
+        "category": category.id,
+        "category_version": category.version,
+        "order": bot.question_bank.new_order(category),
+        "current_question_index": 0,
+        "score_this_round": 0,
+    }
+
+
+def test_session_of_edited_category_is_invalidated(packs):
+    edited = start_session("Правимая")
+    kept = start_session("Постоянная")
+    kept_question, _ = bot.session_question(kept)
+
+    # Вопрос удалён из середины: позиции остальных сдвинулись
+    write_pack(packs, "a.json", "Правимая", ["А1?", "А3?", "А4?"], 2 * 10**18)
+    bot.question_bank = QuestionBank.load(str(packs), bot.question_bank)
+
+    with pytest.raises(KeyError):
+        bot.session_question(edited)
+    question, _ = bot.session_question(kept)
+    assert question.text == kept_question.text
+
+
+def test_session_without_version_is_invalidated(packs):
+    # Сессия, сохранённая до появления category_version
+    user_data = start_session("Постоянная")
+    del user_data["category_version"]
+    with pytest.raises(KeyError):
+        bot.session_question(user_data)
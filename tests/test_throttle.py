@@ -0,0 +1,36 @@
+from telegram import Update
+
+import bot
+from fakebot import callback_update, text_update
+from throttle import Throttle
+
+USER = 31
+
+
+def check(throttle, data, now):
+    return throttle.check(Update.de_json(data, None), now=now)
+
+
+def make_throttle():
+    return Throttle(rate=100, burst=100, answer_pattern=bot.THROTTLE_ANSWER_PATTERN)
+
+
+def test_same_text_answer_to_consecutive_questions_passes():
+    # У двух вопросов подряд один и тот же верный ответ, игрок отвечает быстро
+    throttle = make_throttle()
+    assert check(throttle, text_update(USER, "1945"), 0.0) is None
+    assert check(throttle, text_update(USER, "1945"), 0.2) is None
+
+
+def test_repeated_answer_button_is_duplicate_at_any_interval():
+    throttle = make_throttle()
+    assert check(throttle, callback_update(USER, USER, 1, "q:7:3:1"), 0.0) is None
+    assert check(throttle, callback_update(USER, USER, 1, "q:7:3:1"), 60.0) == "duplicate"
+    # Тот же вариант на следующем вопросе — новый ответ
+    assert check(throttle, callback_update(USER, USER, 1, "q:7:4:1"), 60.1) is None
+
+
+def test_other_buttons_are_not_deduplicated():
+    throttle = make_throttle()
+    assert check(throttle, callback_update(USER, USER, 1, "top:week"), 0.0) is None
+    assert check(throttle, callback_update(USER, USER, 1, "top:week"), 0.1) is None
@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+import pytest
+
+from webhook import SECRET_HEADER, HTTPServer, update_route
+
+SECRET = "s3cret"
+UPDATE = json.dumps({"update_id": 1}).encode()
+
+
+async def post(port, headers):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    head = "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+    writer.write(
+        f"POST /telegram HTTP/1.1\r\nContent-Length: {len(UPDATE)}\r\n{head}Connection: close\r\n\r\n".encode()
+        + UPDATE
+    )
+    status = int((await reader.readline()).split()[1])
+    writer.close()
+    return status
+
+
+def run_requests(headers_list):
+    received = []
+
+    async def sink(data):
+        received.append(data)
+
+    async def main():
+        server = HTTPServer({"/telegram": update_route(sink, SECRET)})
+        port = await server.start("127.0.0.1", 0)
+        try:
+            return [await post(port, headers) for headers in headers_list]
+        finally:
+            await server.stop()
+
+    return asyncio.run(main()), received
+
+
+def test_update_without_secret_is_forbidden():
+    statuses, received = run_requests([{}, {SECRET_HEADER: "wrong"}])
+    assert statuses == [403, 403]
+    assert received == []
+
+
+def test_update_with_secret_is_accepted():
+    statuses, received = run_requests([{SECRET_HEADER: SECRET}])
+    assert statuses == [200]
+    assert received == [{"update_id": 1}]
+
+
+@pytest.mark.parametrize("secret", [None, ""])
+def test_route_requires_secret(secret):
+    with pytest.raises(ValueError):
+        update_route(lambda data: None, secret)
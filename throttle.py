@@ -0,0 +1,129 @@
+import collections
+import re
+import time
+
+from telegram import Update
+from telegram.ext import Application
+
+from metrics import UPDATES_DROPPED
+
+# -------------------------
+# Защита от флуда
+# -------------------------
+# Скрипт, засыпающий бота сообщениями, иначе проходит весь путь апдейта:
+# контекст, user_data (и запись в persistence), ConversationHandler,
+# обработчик и ответ — и отнимает event loop у остальных игроков.
+# Throttle проверяет апдейт до всего этого (ThrottledApplication.process_update)
+# и отбрасывает:
+#
+# * слишком длинные тексты (size) — ни кнопки, ни ответы, ни имя такими
+#   не бывают;
+# * повторное нажатие той же кнопки ответа (duplicate) — двойные нажатия.
+#   Кнопкой ответа считается callback_data, подходящая под answer_pattern:
+#   в ней уже есть позиция вопроса и вариант, так что повтор — дубль при
+#   любом интервале. Тексты так не отсеиваются: два вопроса подряд могут
+#   иметь одинаковый верный ответ, и быстрый игрок отвечает на оба;
+#   зациклившиеся скрипты останавливает бакет;
+# * всё сверх токен-бакета игрока: burst апдейтов сразу и rate в секунду
+#   дальше (rate).
+#
+# Состояние игроков — OrderedDict по давности последнего апдейта (как
+# в SessionReaper), не больше max_users записей: при переполнении
+# выбрасываются самые давние. Их бакеты всё равно успели наполниться,
+# так что для них ничего не меняется. Отброшенные апдейты считаются
+# в метрике quiz_updates_dropped_total по причинам.
+
+DROP_REASONS = ("size", "duplicate", "rate")
+
+
+class _UserState:
+    __slots__ = ("tokens", "updated", "last_answer")
+
+    def __init__(self, tokens, now):
+        self.tokens = tokens
+        self.updated = now
+        self.last_answer = None
+
+
+class Throttle:
+    """
+    Args:
+        rate: сколько апдейтов в секунду игрок может присылать долго.
+        burst: сколько апдейтов подряд пропускается сразу.
+        max_users: сколько игроков помнить.
+        max_text: максимальная длина текста сообщения.
+        answer_pattern: регулярное выражение callback_data кнопок ответа
+            (с позицией вопроса и вариантом); None — дубли не отсеивать.
+        clock: источник времени (для бенчмарков).
+    """
+
+    def __init__(self, rate=1.0, burst=10, max_users=100_000, max_text=512,
+                 answer_pattern=None, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_users = max_users
+        self.max_text = max_text
+        self.answer_pattern = re.compile(answer_pattern) if answer_pattern else None
+        self.clock = clock
+        self._users = collections.OrderedDict()
+        self._dropped = {reason: UPDATES_DROPPED.labels(reason) for reason in DROP_REASONS}
+
+    def __len__(self):
+        return len(self._users)
+
+    def check(self, update, now=None):
+        """Причина отбросить апдейт (одна из DROP_REASONS) или None — пропустить."""
+        user = update.effective_user
+        if user is None:
+            return None
+        message = update.message or update.edited_message
+        answer = None
+        if message is not None:
+            if message.text is not None and len(message.text) > self.max_text:
+                return self._drop("size")
+        elif update.callback_query is not None and self.answer_pattern is not None:
+            data = update.callback_query.data
+            if data is not None and self.answer_pattern.match(data):
+                answer = data
+
+        now = self.clock() if now is None else now
+        users = self._users
+        state = users.get(user.id)
+        if state is None:
+            if len(users) >= self.max_users:
+                users.popitem(last=False)
+            state = users[user.id] = _UserState(self.burst, now)
+        else:
+            users.move_to_end(user.id)
+            if answer is not None and answer == state.last_answer:
+                return self._drop("duplicate")
+            state.tokens = min(self.burst, state.tokens + (now - state.updated) * self.rate)
+            state.updated = now
+        if state.tokens < 1:
+            return self._drop("rate")
+        state.tokens -= 1
+        if answer is not None:
+            state.last_answer = answer
+        return None
+
+    def _drop(self, reason):
+        self._dropped[reason].value += 1
+        return reason
+
+    def dropped(self):
+        """{причина: сколько апдейтов отброшено}."""
+        return {reason: child.value for reason, child in self._dropped.items()}
+
+
+class ThrottledApplication(Application):
+    """Application, который пропускает апдейты через Throttle до обработчиков."""
+
+    def __init__(self, *, throttle, **kwargs):
+        super().__init__(**kwargs)
+        self.throttle = throttle
+
+    async def process_update(self, update):
+        # Отброшенный апдейт не доходит ни до context, ни до user_data и persistence
+        if isinstance(update, Update) and self.throttle.check(update) is not None:
+            return
+        await super().process_update(update)
@@ -0,0 +1,183 @@
+import asyncio
+import contextlib
+import hmac
+import json
+import logging
+import signal
+
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+# -------------------------
+# Webhook-режим
+# -------------------------
+# Небольшой HTTP-сервер на asyncio (без tornado/aiohttp): Telegram присылает
+# Update POST-запросом, мы сверяем секрет из заголовка
+# X-Telegram-Bot-Api-Secret-Token и кладём Update в очередь Application —
+# дальше его обрабатывает тот же ConversationHandler, что и при polling.
+# Без секрета webhook не запускается: иначе любой, кто знает адрес,
+# мог бы присылать поддельные апдейты. Запрос без заголовка или с чужим
+# секретом получает 403.
+#
+# Проверить локально можно, отправив записанный Update:
+#   curl -X POST localhost:8443/telegram \
+#        -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET" \
+#        -H "Content-Type: application/json" -d @update.json
+
+MAX_BODY_SIZE = 1 << 20
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+}
+
+
+class HTTPServer:
+    """
+    Минимальный HTTP/1.1-сервер с keep-alive.
+
+    routes: {путь: async handler(method, headers, body) -> (status, content_type, body)}
+    """
+
+    def __init__(self, routes):
+        self.routes = routes
+        self._server = None
+
+    async def start(self, host, port):
+        self._server = await asyncio.start_server(self._serve, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_SIZE:
+                    await self._respond(writer, 413, "text/plain", b"")
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                handler = self.routes.get(path.split("?", 1)[0])
+                if handler is None:
+                    status, content_type, payload = 404, "text/plain", b""
+                else:
+                    status, content_type, payload = await handler(method, headers, body)
+                await self._respond(writer, status, content_type, payload)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, content_type, payload):
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(payload)}\r\n\r\n".encode("latin-1") + payload
+        )
+        await writer.drain()
+
+
+def update_route(sink, secret_token):
+    """Обработчик POST с Update от Telegram; sink — async-функция, получающая JSON апдейта."""
+    if not secret_token:
+        raise ValueError("webhook без секрета принимал бы апдейты от кого угодно: задайте WEBHOOK_SECRET")
+
+    async def handle(method, headers, body):
+        if method != "POST":
+            return 405, "text/plain", b""
+        if not hmac.compare_digest(
+            headers.get(SECRET_HEADER, "").encode(), secret_token.encode()
+        ):
+            return 403, "text/plain", b""
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return 400, "text/plain", b""
+        if not isinstance(data, dict) or "update_id" not in data:
+            return 400, "text/plain", b""
+        await sink(data)
+        return 200, "text/plain", b"OK"
+
+    return handle
+
+
+def stop_signal():
+    """Event, который взводится по SIGINT/SIGTERM."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    return stop
+
+
+@contextlib.asynccontextmanager
+async def running(application):
+    """Запуск и остановка Application с теми же хуками, что и в run_polling."""
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    try:
+        yield application
+    finally:
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+async def run_webhook(application, listen, port, url_path, secret_token, webhook_url=None, routes=None):
+    """
+    Запустить Application в webhook-режиме до SIGINT/SIGTERM.
+
+    Если webhook_url не задан, set_webhook не вызывается — удобно для
+    локальной проверки, когда апдейты присылаем сами.
+    """
+    async def to_application(data):
+        await application.update_queue.put(Update.de_json(data, application.bot))
+
+    all_routes = {"/" + url_path.lstrip("/"): update_route(to_application, secret_token)}
+    all_routes.update(routes or {})
+    server = HTTPServer(all_routes)
+    stop = stop_signal()
+
+    async with running(application):
+        # Сначала слушаем: после перезапуска webhook уже зарегистрирован,
+        # и Telegram шлёт апдейты, не дожидаясь set_webhook
+        bound_port = await server.start(listen, port)
+        logger.info("Webhook слушает %s:%d%s", listen, bound_port, "/" + url_path.lstrip("/"))
+        try:
+            if webhook_url:
+                await application.bot.set_webhook(
+                    webhook_url, secret_token=secret_token, allowed_updates=Update.ALL_TYPES
+                )
+            await stop.wait()
+        finally:
+            await server.stop()